@@ -5,6 +5,10 @@ Usage details can be displayed by passing command line argument `--help`.
 
 Note: All information contents calculated are bit-wise, i.e. in (information-)bit per (binary-)bit.
 v1.2 改为无扩展二元信道
+v1.3 增加稀疏噪声模式，只生成翻转比特的位置
+v1.4 增加内存映射模式，分块原地传输大于内存的文件
+v1.5 增加多错误传递概率扫描模式，一次读入输出全部概率，可选公共随机数
+v1.6 噪声可由计数器随机数（Philox）按 (seed, p, 偏移) 重新生成，或直接使用噪声文件
 模块输入
 	信道输入消息序列文件
     错误传递概率p
@@ -15,6 +19,7 @@ v1.2 改为无扩展二元信道
 
 # Standard library
 import os.path
+import shutil
 import argparse
 
 # Non-standard library
@@ -22,10 +27,11 @@ import numpy as np
 
 __author__ = "Chen, Jin; "
 __email__ = "miracle@stu2022.jnu.edu.cn; "
-__version__ = "1.2"
+__version__ = "1.6"
 
 
 bit_counts = np.float32(bytearray(map(int.bit_count, range(256))))
+MODES = ('dense', 'sparse', 'philox')
 
 def generate(ones):
     probs = []
@@ -39,13 +45,48 @@ def generate(ones):
 def main(input_path, output_path, noises, **kwgs):
     input_paths = path_split(input_path)
     output_paths = path_split(output_path)
-    ones = tuple(map(float, noises.split(',')))
-    probs = generate(ones)
-
-    for input_path, noise, output_path, prob in zip(input_paths, ones, output_paths, probs):
+    items = noises.split(',')
+    ones, options = zip(*map(parse_noise, items))
+    # philox 噪声的阈值直接由解析出的 p 计算，不经过 float32 的字节概率分布
+    options = [dict(option, p=one) for one, option in zip(ones, options)]
+    probs = [None if one is None else prob for one, prob in zip(ones, generate(one or 0. for one in ones))]
+
+    if kwgs.get('sweep'):
+        # 每个输入对应连续的 len(ones) 个输出
+        output_paths = list(output_paths)
+        for i, input_path in enumerate(input_paths):
+            sweep_paths = output_paths[i * len(ones):(i + 1) * len(ones)]
+            if len(sweep_paths) != len(ones):
+                raise ValueError("Sweep needs %d output paths for each input." % len(ones))
+            if kwgs.get('message_state'):
+                print('Sweeping INPUT "%s" with NOISE %s...' % (input_path, noises))
+            sweep_flow(input_path, sweep_paths, ones, **dict(kwgs, options=options))
+        return
+
+    for input_path, noise, output_path, prob, option in zip(input_paths, items, output_paths, probs, options):
         if kwgs.get('message_state'):
-            print('Processing INPUT "%s" OUTPUT "%s" with NOISE %.3f...' % (input_path, output_path, noise))
-        work_flow(input_path, output_path, prob, **kwgs)
+            print('Processing INPUT "%s" OUTPUT "%s" with NOISE %s...' % (input_path, output_path, noise.strip()))
+        work_flow(input_path, output_path, prob, **dict(kwgs, **option))
+
+
+def parse_noise(noise) -> (float, dict):
+    """
+    解析一项噪声描述，可以是：
+        错误传递概率p，如 0.01；
+        计数器随机数描述 philox:SEED:p，噪声由 (SEED, p, 字节偏移) 确定，不需要噪声文件；
+        已有的噪声文件路径，直接与信道输入异或。
+
+    Returns:
+        (float, dict): 错误传递概率（噪声文件为 None）和覆盖 work_flow 参数的选项。
+    """
+    noise = noise.strip().replace('"', '').replace("'", "")
+    if noise.startswith('philox:'):
+        _, seed, p = noise.split(':')
+        return float(p), dict(mode='philox', seed=int(seed, 0))
+    try:
+        return float(noise), {}
+    except ValueError:
+        return None, dict(mode='file', noise_path=noise)
 
 
 def path_split(path):
@@ -53,9 +94,12 @@ def path_split(path):
 
 
 def work_flow(input_path, output_path, prob, **kwgs):
+    noise_path = kwgs.get('noise_path')
     if kwgs.get('base_path'):
         input_path = os.path.join(kwgs['base_path'], input_path)
         output_path = os.path.join(kwgs['base_path'], output_path)
+        if noise_path:
+            noise_path = os.path.join(kwgs['base_path'], noise_path)
     if kwgs.get('message_state') == 1:
         print('\tInput path:', input_path)
         print('\tOutput path:', output_path)
@@ -63,19 +107,213 @@ def work_flow(input_path, output_path, prob, **kwgs):
         raise RuntimeError("input_path must be an exist file.")
     if os.path.exists(output_path) and not os.path.isfile(output_path):
         raise RuntimeError("output_path must be a file, not a folder.")
+    if noise_path and not os.path.isfile(noise_path):
+        raise RuntimeError("noise_path must be an exist file.")
 
     if kwgs.get('message_state') == 1:
         print()
+    pad = kwgs.get('pad', (0,0,0,0))
+    options = dict(mode=kwgs.get('mode', 'dense'), seed=kwgs.get('seed') or 0, noise_path=noise_path,
+                   p=kwgs.get('p'))
+    if kwgs.get('mmap'):
+        mmap_error_channel(input_path, output_path, prob, pad, chunk=kwgs.get('chunk') or 1 << 24, **options)
+        return
     arr = read_input(input_path)
-    noise = random_sequence(prob, len(arr))
-    pad_left, v1, pad_right, v2 = kwgs.get('pad', (0,0,0,0))
+    out = apply_noise(arr, prob, pad, **options)
+    write_output(output_path, out)
+
+
+def apply_noise(arr, prob, pad=(0,0,0,0), mode='dense', offset=0, seed=0, noise_path=None, p=None) -> np.ndarray:
+    """
+    将噪声原地异或到 arr 上。
+
+    Parameters:
+        arr (numpy.ndarray): 信源X，将被原地修改。
+        prob (numpy.ndarray): 8次扩展的噪声字节概率分布（'file' 模式不使用）。
+        pad (tuple): (pad-left, value-left, pad-right, value-right)，padding区域的噪声取常数值。
+        mode (str): 噪声模式，'dense'、'sparse'、'philox' 或 'file'。
+        offset (int): arr 在整个信道输入文件中的字节偏移，'philox' 和 'file' 模式按偏移取噪声。
+        seed (int): 'philox' 模式的密钥。
+        noise_path (str): 'file' 模式的噪声文件路径。
+        p (float): 'philox' 模式的比特错误传递概率，None 时由 prob 还原（float32 的 prob 会使阈值略有偏差）。
+
+    Returns:
+        numpy.ndarray: 信道输出的信源Y（即 arr）。
+    """
+    if mode == 'sparse':
+        return sparse_error_channel(arr, calc_prob1(prob), pad)
+    if mode == 'dense':
+        noise = random_sequence(prob, len(arr))
+    elif mode == 'philox':
+        noise = philox_noise(seed, calc_prob1(prob) if p is None else p, offset, len(arr))
+    elif mode == 'file':
+        noise = np.fromfile(noise_path, dtype=np.uint8, count=len(arr), offset=offset)
+        if len(noise) < len(arr):
+            raise ValueError("Noise file is shorter than the channel input.")
+    else:
+        raise ValueError("Unknown noise mode: %s." % mode)
+    pad_left, v1, pad_right, v2 = pad
     if pad_left:
         noise[:pad_left] = v1
     if pad_right:
         noise[-pad_right:] = v2
+    return np.bitwise_xor(arr, noise, out=arr)
 
-    out = generate_error_channel(arr, noise)
-    write_output(output_path, out)
+
+def mmap_error_channel(input_path, output_path, prob, pad=(0,0,0,0), mode='dense', chunk=1 << 24,
+                       **options) -> None:
+    """
+    内存映射传输：先用操作系统的复制功能把输入复制为输出文件，再把输出文件映射到内存，
+    逐块原地异或噪声。内存占用只与块大小有关，可以处理大于内存的文件。
+
+    Parameters:
+        input_path (str): 信道输入文件路径。
+        output_path (str): 信道输出文件路径。
+        prob (numpy.ndarray): 8次扩展的噪声字节概率分布。
+        pad (tuple): (pad-left, value-left, pad-right, value-right)，按整个文件的首尾计算。
+        mode (str): 噪声模式，见 apply_noise。
+        chunk (int): 每块的字节数。
+        options: 传给 apply_noise 的 seed、noise_path、p。
+    """
+    shutil.copyfile(input_path, output_path)
+    size = os.path.getsize(output_path)
+    if size == 0:
+        return
+    out = np.memmap(output_path, dtype=np.uint8, mode='r+')
+    for start in range(0, size, chunk):
+        stop = min(start + chunk, size)
+        apply_noise(out[start:stop], prob, chunk_pad(pad, start, stop, size), mode, start, **options)
+    out.flush()
+    del out
+
+
+def chunk_pad(pad, start, stop, size) -> tuple:
+    """将整个文件首尾的padding换算到 [start, stop) 块内。"""
+    pad_left, v1, pad_right, v2 = pad
+    left = min(max(pad_left - start, 0), stop - start)
+    right = min(max(stop - (size - pad_right), 0), stop - start) if pad_right else 0
+    return left, v1, right, v2
+
+
+def sweep_error_channel(input_path, output_paths, ones, pad=(0,0,0,0), mode='dense', common=False,
+                        chunk=1 << 22, options=None) -> None:
+    """
+    扫描模式：分块读入一次输入文件，对每个错误传递概率各写出一个输出文件。
+
+    common=True 时使用公共随机数：所有概率共用同一组随机数，只是判决阈值不同，
+    随机数的开销与概率个数无关，且低概率的错误位置是高概率错误位置的子集，误码率曲线的方差更小。
+
+    Parameters:
+        input_path (str): 信道输入文件路径。
+        output_paths (list): 与 ones 一一对应的输出文件路径。
+        ones (tuple): 各比特错误传递概率。
+        pad (tuple): (pad-left, value-left, pad-right, value-right)，按整个文件的首尾计算。
+        mode (str): 噪声模式，见 apply_noise。
+        common (bool): 是否使用公共随机数。
+        chunk (int): 每块的字节数。
+        options (list): 与 ones 对应的 apply_noise 选项（parse_noise 的结果），可覆盖 mode。
+    """
+    size = os.path.getsize(input_path)
+    options = [dict(dict(mode=mode), **option) for option in (options or [{}] * len(ones))]
+    # philox 噪声本身就是公共随机数
+    common = common and mode != 'philox'
+    if common and any(option['mode'] != mode for option in options):
+        raise ValueError("Common random numbers only apply to plain error rates.")
+    probs = [None if one is None else prob for one, prob in zip(ones, generate(one or 0. for one in ones))]
+    out_files = [open(path, 'wb') for path in output_paths]
+    try:
+        with open(input_path, 'rb') as in_file:
+            for start in range(0, size, chunk):
+                data = np.fromfile(in_file, dtype=np.uint8, count=chunk)
+                local = chunk_pad(pad, start, start + len(data), size)
+                if common:
+                    outs = common_error_channel(data, ones, local, mode)
+                else:
+                    outs = (apply_noise(data.copy(), prob, local, offset=start, **option)
+                            for prob, option in zip(probs, options))
+                for out_file, out in zip(out_files, outs):
+                    out_file.write(memoryview(out))
+    finally:
+        for out_file in out_files:
+            out_file.close()
+
+
+def common_error_channel(data, ones, pad=(0,0,0,0), mode='dense'):
+    """
+    公共随机数噪声：对同一段输入，依次产生各错误传递概率下的信道输出。
+
+    dense 模式为每个比特生成一个32位随机整数，与各概率的阈值比较；
+    sparse 模式按最大概率生成翻转位置，并给每个位置附加 [0, p_max) 上的均匀随机数，
+    概率 p 下只翻转随机数小于 p 的位置。
+
+    Parameters:
+        data (numpy.ndarray): 信源X，不会被修改。
+        ones (tuple): 各比特错误传递概率。
+        pad (tuple): (pad-left, value-left, pad-right, value-right)。
+        mode (str): 噪声模式，'dense' 或 'sparse'。
+
+    Returns:
+        generator: 依次产生与 ones 对应的信道输出。
+    """
+    pad_left, v1, pad_right, v2 = pad
+    n = len(data)
+    if mode == 'sparse':
+        p_max = max(ones)
+        positions = np.concatenate([np.zeros(0, dtype=np.int64)] +
+                                   list(flip_positions((n - pad_left - pad_right) * 8, p_max)))
+        marks = np.random.uniform(size=len(positions)) * p_max
+    elif mode == 'dense':
+        symbol_random = np.random.randint(0, 1 << 32, size=n * 8, dtype=np.uint32)
+    else:
+        raise ValueError("Unknown noise mode: %s." % mode)
+
+    for p in ones:
+        if mode == 'sparse':
+            out = data.copy()
+            body = out[pad_left:n - pad_right]
+            flips = positions[marks < p]
+            np.bitwise_xor.at(body, flips >> 3, np.uint8(0x80) >> (flips & 7).astype(np.uint8))
+        else:
+            if p >= 1.:
+                noise = np.full(n, 0xFF, dtype=np.uint8)
+            else:
+                threshold = np.uint32(min(round(p * (1 << 32)), (1 << 32) - 1))
+                noise = np.packbits(symbol_random < threshold)
+            noise[:pad_left] = 0
+            noise[n - pad_right:] = 0
+            out = np.bitwise_xor(data, noise)
+        if pad_left and v1:
+            out[:pad_left] ^= np.uint8(v1)
+        if pad_right and v2:
+            out[-pad_right:] ^= np.uint8(v2)
+        yield out
+
+
+def sweep_flow(input_path, output_paths, ones, **kwgs):
+    options = kwgs.get('options') or [{}] * len(ones)
+    if kwgs.get('base_path'):
+        input_path = os.path.join(kwgs['base_path'], input_path)
+        output_paths = [os.path.join(kwgs['base_path'], path) for path in output_paths]
+        options = [dict(option, noise_path=os.path.join(kwgs['base_path'], option['noise_path']))
+                   if option.get('noise_path') else option for option in options]
+    if kwgs.get('message_state') == 1:
+        print('\tInput path:', input_path)
+        for output_path in output_paths:
+            print('\tOutput path:', output_path)
+    if not os.path.isfile(input_path):
+        raise RuntimeError("input_path must be an exist file.")
+    for output_path in output_paths:
+        if os.path.exists(output_path) and not os.path.isfile(output_path):
+            raise RuntimeError("output_path must be a file, not a folder.")
+    for option in options:
+        if option.get('noise_path') and not os.path.isfile(option['noise_path']):
+            raise RuntimeError("noise_path must be an exist file.")
+
+    if kwgs.get('message_state') == 1:
+        print()
+    options = [dict(dict(seed=kwgs.get('seed') or 0), **option) for option in options]
+    sweep_error_channel(input_path, output_paths, ones, kwgs.get('pad', (0,0,0,0)), kwgs.get('mode', 'dense'),
+                        kwgs.get('common', False), kwgs.get('chunk') or 1 << 22, options)
 
 
 def read_input(input_path) -> np.ndarray:
@@ -131,6 +369,92 @@ def generate_error_channel(arr, noise) -> np.ndarray:
     return out
 
 
+def calc_prob1(prob) -> float:
+    """由8次扩展的噪声字节概率分布还原比特错误传递概率p。"""
+    prob = np.asarray(prob, dtype=np.float64)
+    return float((prob * bit_counts).sum() / prob.sum() / 8)
+
+
+def philox_noise(seed, p, offset, length) -> np.ndarray:
+    """
+    计数器随机数噪声：第 i 个字节的噪声只由 Philox 第 i 个计数器块（4个uint64，即8个uint32）决定，
+    每个uint32与阈值 p·2**32 比较得到1个比特。任意字节区间都可以独立、并行地重新生成，
+    不同 p 共用同一组随机数（公共随机数）。
+
+    Parameters:
+        seed (int): Philox 密钥（0 <= seed < 2**128）。
+        p (float): 比特错误传递概率。
+        offset (int): 起始字节偏移。
+        length (int): 噪声字节数。
+
+    Returns:
+        numpy.ndarray: 噪声字节序列。
+    """
+    if p <= 0.:
+        return np.zeros(length, dtype=np.uint8)
+    if p >= 1.:
+        return np.full(length, 0xFF, dtype=np.uint8)
+    threshold = np.uint32(min(round(p * (1 << 32)), (1 << 32) - 1))
+    symbol_random = np.random.Philox(key=seed, counter=offset).random_raw(length * 4)
+    return np.packbits(symbol_random.view(np.uint32) < threshold)
+
+
+def sparse_error_channel(arr, p, pad=(0,0,0,0), rng=None) -> np.ndarray:
+    """
+    稀疏噪声：不生成完整的噪声字节，只按几何分布的间隔抽取需要翻转的比特位置，直接在 arr 上原地异或，
+    开销为 O(p·N)。p>0.5 时先整体取反，再以 1-p 翻转。padding区域与噪声序列的padding一致，异或常数值。
+
+    Parameters:
+        arr (numpy.ndarray): 信源X，将被原地修改。
+        p (float): 比特错误传递概率。
+        pad (tuple): (pad-left, value-left, pad-right, value-right)。
+        rng (numpy.random.Generator): 随机数生成器，None 表示使用 np.random 的全局状态。
+
+    Returns:
+        numpy.ndarray: 信道输出的信源Y（即 arr）。
+    """
+    pad_left, v1, pad_right, v2 = pad
+    body = arr[pad_left:len(arr) - pad_right]
+    if p > 0.5:
+        np.invert(body, out=body)
+        p = 1. - p
+    for positions in flip_positions(len(body) * 8, p, rng):
+        np.bitwise_xor.at(body, positions >> 3, np.uint8(0x80) >> (positions & 7).astype(np.uint8))
+    if pad_left and v1:
+        arr[:pad_left] ^= np.uint8(v1)
+    if pad_right and v2:
+        arr[-pad_right:] ^= np.uint8(v2)
+    return arr
+
+
+def flip_positions(total_bits, p, rng=None, batch=1 << 20):
+    """
+    按几何分布的间隔逐批生成 [0, total_bits) 内的翻转比特位置（高位在前编号）。
+
+    Parameters:
+        total_bits (int): 比特总数。
+        p (float): 比特翻转概率。
+        rng (numpy.random.Generator): 随机数生成器。
+        batch (int): 每批最多生成的位置数量。
+
+    Returns:
+        generator: 每次产生一个递增的 int64 位置数组。
+    """
+    if p <= 0. or total_bits <= 0:
+        return
+    rng = np.random if rng is None else rng
+    position = -1
+    while True:
+        expect = (total_bits - position) * p
+        size = int(min(expect + 6 * np.sqrt(expect) + 16, batch))
+        positions = position + np.cumsum(rng.geometric(p, size=size))
+        inside = positions[positions < total_bits]
+        yield inside
+        if len(inside) < size:
+            return
+        position = inside[-1]
+
+
 def write_output(output_path, sequence) -> None:
     """
 
@@ -147,9 +471,23 @@ def parse_sys_args() -> dict:
     """
     parser = argparse.ArgumentParser(description="Process some commands for byteChannel.")
     parser.add_argument('INPUT', nargs='?', help='Input file path')
-    parser.add_argument('p', nargs='?', help='Probability of Error-Rate.')
+    parser.add_argument('p', nargs='?', help='Probability of Error-Rate, philox:SEED:p, or a noise file path.')
     parser.add_argument('OUTPUT', nargs='?', help='Output file path')
     parser.add_argument('-d', '--dir', type=str, help='Base directory path')
+    parser.add_argument('-p', '--pad', type=lambda string: tuple(map(int, string[1:-1].split(','))), default=(0,0,0,0),
+                        help='Noise of the two side is a const value, like (pad-left,value,pad-right,value).')
+    parser.add_argument('--seed', type=int, default=0, help='Key of the philox noise mode (default: 0)')
+    parser.add_argument('-m', '--mode', choices=MODES, default='dense', help='Noise mode, sparse only draws '
+                        'the flipped bit positions (default: dense)')
+    parser.add_argument('--mmap', action='store_true', help='Copy INPUT to OUTPUT and add noise in place '
+                        'through a memory map, chunk by chunk')
+    parser.add_argument('--sweep', action='store_true', help='Read each INPUT once and write one OUTPUT per '
+                        'error rate in p')
+    parser.add_argument('--common', action='store_true', help='Use common random numbers for all error rates '
+                        'in --sweep')
+    parser.add_argument('--chunk', type=int, help='Chunk size in bytes for --mmap and --sweep '
+                        '(default: 16 MiB and 4 MiB)')
+    parser.add_argument('-b', '--bench', action='store_true', help='Compare throughput of noise modes')
     parser.add_argument('-O', action='store_true', help='Full prompt output')
     parser.add_argument('-S', action='store_true', help='Weak prompt output')
     parser.add_argument('-t', '--test', action='store_true', help='Check test flow and state')
@@ -160,6 +498,14 @@ def parse_sys_args() -> dict:
         noises=args.p,
         output_path=args.OUTPUT,
         base_path=args.dir,
+        mode=args.mode,
+        pad=args.pad,
+        seed=args.seed,
+        mmap=args.mmap,
+        chunk=args.chunk,
+        sweep=args.sweep,
+        common=args.common,
+        bench=args.bench,
         message_state=1 if args.O else 2 if args.S else 0,
         test_flow=args.test,
         show_version=args.version,
@@ -176,6 +522,10 @@ if __name__ == "__main__":
         import byteChannelTest
         byteChannelTest.test_flow()
 
+    if kwgs['bench']:
+        import byteChannelTest
+        byteChannelTest.benchmark()
+
     if kwgs['base_path']:
         if not os.path.exists(kwgs['base_path']) or os.path.isfile(kwgs['base_path']):
             raise RuntimeError("base-path must be an exist folder.")
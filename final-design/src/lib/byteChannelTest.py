@@ -1,9 +1,10 @@
 import os
+import shutil
 import byteChannel
 import numpy as np
 
 
-def quick_test(input_path, output_path, noise) -> bool:
+def quick_test(input_path, output_path, noise, mode='dense') -> bool:
     """
     快速测试生成符号序列的概率分布是否符合给定的概率分布。
 
@@ -11,7 +12,7 @@ def quick_test(input_path, output_path, noise) -> bool:
         bool: 测试是否通过。
     """
 
-    byteChannel.main(input_path, output_path, str(noise))
+    byteChannel.main(input_path, output_path, str(noise), mode=mode)
     input_data = byteChannel.read_input(input_path)
     output_data = byteChannel.read_input(output_path)
     # 逐位比较并统计不同位的数量
@@ -128,8 +129,21 @@ def test_flow(msg_len=10000) -> None:
         for j, noise in enumerate(noises):
             print(f"Processing files:H(X) {file_names[i]} and p {noise}")
             all_tests_passed &= quick_test(file1, output_file, noise)
+    for i, file1 in enumerate(files):
+        for noise in [0, 0.001, 0.01, 0.5, 0.99, 1]:
+            print(f"Processing files:H(X) {file_names[i]} and p {noise} (sparse)")
+            all_tests_passed &= quick_test(file1, output_file, noise, mode='sparse')
     delete_temp_file(output_file)
 
+    print("Processing memory-mapped transmission")
+    all_tests_passed &= mmap_test()
+
+    print("Processing multi-error-rate sweep")
+    all_tests_passed &= sweep_test()
+
+    print("Processing counter-based noise")
+    all_tests_passed &= philox_test()
+
     # 删除所有输出文件
     for file in files:
         delete_temp_file(file)
@@ -138,5 +152,146 @@ def test_flow(msg_len=10000) -> None:
         print("All passed.")
 
 
+def mmap_test(msg_len=100000, chunk=4096) -> bool:
+    """
+    检查内存映射分块传输与整体传输在相同随机种子下输出完全相同（dense模式，含padding），
+    以及 sparse 模式下padding区域不受噪声影响。
+
+    Returns:
+        bool: 测试是否通过。
+    """
+    input_path, whole_path, mmap_path = 'temp_input.bin', 'temp_whole.bin', 'temp_mmap.bin'
+    byteChannel.write_output(input_path, np.random.randint(0, 256, size=msg_len, dtype=np.uint8))
+    passed = True
+    for mode in byteChannel.MODES:
+        for path, mmap in ((whole_path, False), (mmap_path, True)):
+            np.random.seed(2024)
+            byteChannel.main(input_path, path, '0.01', mode=mode, mmap=mmap, chunk=chunk, pad=(chunk + 7, 0, 5, 0))
+        source, whole, mapped = (byteChannel.read_input(path) for path in (input_path, whole_path, mmap_path))
+        if mode == 'dense' and not np.array_equal(whole, mapped):
+            print("mmap output differs from whole output")
+            passed = False
+        if (source[:chunk + 7] != mapped[:chunk + 7]).any() or (source[-5:] != mapped[-5:]).any():
+            print("mmap padding error (%s)" % mode)
+            passed = False
+        error_rate = np.unpackbits(source ^ mapped).mean()
+        if abs(error_rate - 0.01) > 2e-3:
+            print("mmap error rate %.5f (%s)" % (error_rate, mode))
+            passed = False
+    for path in (input_path, whole_path, mmap_path):
+        os.remove(path)
+    return passed
+
+
+def sweep_test(msg_len=200000, chunk=65536) -> bool:
+    """
+    检查扫描模式各输出的误码率和padding；公共随机数时低概率的错误比特必须是高概率错误比特的子集。
+
+    Returns:
+        bool: 测试是否通过。
+    """
+    input_path = 'temp_input.bin'
+    noises = (0.001, 0.01, 0.1, 1.)
+    output_paths = ['temp_sweep_%d.bin' % i for i in range(len(noises))]
+    source = np.random.randint(0, 256, size=msg_len, dtype=np.uint8)
+    byteChannel.write_output(input_path, source)
+    passed = True
+    for mode in byteChannel.MODES:
+        for common in (False, True):
+            byteChannel.main(input_path, ';'.join(output_paths), ','.join(map(str, noises)), sweep=True,
+                             mode=mode, common=common, chunk=chunk, pad=(10, 0, 10, 0))
+            errors = [source ^ byteChannel.read_input(path) for path in output_paths]
+            for noise, error in zip(noises, errors):
+                error_rate = np.unpackbits(error[10:-10]).mean()
+                if abs(error_rate - noise) > max(noise * 0.2, 1e-3) or error[:10].any() or error[-10:].any():
+                    print("sweep error rate %.5f for p=%g (%s, common=%s)" % (error_rate, noise, mode, common))
+                    passed = False
+            if common and any((low & ~high).any() for low, high in zip(errors, errors[1:])):
+                print("common random numbers are not coupled (%s)" % mode)
+                passed = False
+    for path in [input_path] + output_paths:
+        os.remove(path)
+    return passed
+
+
+def philox_test(msg_len=100000) -> bool:
+    """
+    检查计数器随机数噪声：任意区间可独立重新生成、整体与分块传输结果相同，
+    以及噪声文件与 philox 描述得到相同的信道输出。
+
+    Returns:
+        bool: 测试是否通过。
+    """
+    passed = True
+    noise = byteChannel.philox_noise(7, 0.01, 0, msg_len)
+    for start, stop in ((0, 1), (12345, 23456), (msg_len - 3, msg_len)):
+        if not np.array_equal(noise[start:stop], byteChannel.philox_noise(7, 0.01, start, stop - start)):
+            print("philox noise of [%d, %d) is not reproducible" % (start, stop))
+            passed = False
+
+    input_path, noise_path, whole_path, mmap_path, file_path = (
+        'temp_input.bin', 'temp_noise.bin', 'temp_whole.bin', 'temp_mmap.bin', 'temp_file.bin')
+    source = np.random.randint(0, 256, size=msg_len, dtype=np.uint8)
+    byteChannel.write_output(input_path, source)
+    byteChannel.write_output(noise_path, noise)
+    byteChannel.main(input_path, whole_path, 'philox:7:0.01')
+    byteChannel.main(input_path, mmap_path, '0.01', mode='philox', seed=7, mmap=True, chunk=4096)
+    byteChannel.main(input_path, file_path, noise_path, mmap=True, chunk=4096)
+    for path in (whole_path, mmap_path, file_path):
+        if not np.array_equal(byteChannel.read_input(path), source ^ noise):
+            print("philox output differs: %s" % path)
+            passed = False
+    # 阈值由描述中的 p 直接计算：这些 p 经 float32 字节概率分布还原后阈值会偏移
+    for p in (0.02, 0.03, 0.1, 0.3):
+        noise = byteChannel.philox_noise(7, p, 0, msg_len)
+        byteChannel.main(input_path, whole_path, 'philox:7:%g' % p)
+        byteChannel.main(input_path, mmap_path, '%g' % p, mode='philox', seed=7, mmap=True, chunk=4096)
+        byteChannel.main(input_path, file_path + ';temp_sweep.bin', 'philox:7:%g,philox:7:0' % p, sweep=True,
+                         chunk=4096)
+        for path in (whole_path, mmap_path, file_path):
+            if not np.array_equal(byteChannel.read_input(path), source ^ noise):
+                print("philox output differs at p=%g: %s" % (p, path))
+                passed = False
+    # 扫描模式的相对噪声文件路径与输入输出一样相对于 base_path
+    base_path = 'temp_dir'
+    os.makedirs(base_path, exist_ok=True)
+    shutil.copyfile(input_path, os.path.join(base_path, input_path))
+    noise = np.random.randint(0, 256, size=msg_len, dtype=np.uint8)  # 与当前目录下的同名噪声文件不同
+    byteChannel.write_output(os.path.join(base_path, noise_path), noise)
+    byteChannel.main(input_path, whole_path + ';' + file_path, '0,' + noise_path, sweep=True, base_path=base_path)
+    if not np.array_equal(byteChannel.read_input(os.path.join(base_path, file_path)), source ^ noise):
+        print("sweep noise file is not resolved against base_path")
+        passed = False
+    shutil.rmtree(base_path)
+    for path in (input_path, noise_path, whole_path, mmap_path, file_path, 'temp_sweep.bin'):
+        os.remove(path)
+    return passed
+
+
+def benchmark(msg_len=1 << 24, repeat=3) -> None:
+    """
+    比较 dense 与 sparse 两种噪声模式在不同错误传递概率下的吞吐量（MB/s），不含文件读写。
+
+    Parameters:
+        msg_len (int): 信道输入的长度（字节）。
+        repeat (int): 重复次数，取最快一次。
+    """
+    import time
+    data = np.random.randint(0, 256, size=msg_len, dtype=np.uint8)
+    for p in [0.01, 0.001, 0.0001]:
+        prob = byteChannel.generate([p])[0]
+        for mode in byteChannel.MODES:
+            best = np.inf
+            for _ in range(repeat):
+                arr = data.copy()
+                start = time.perf_counter()
+                if mode == 'dense':
+                    byteChannel.generate_error_channel(arr, byteChannel.random_sequence(prob, msg_len))
+                else:
+                    byteChannel.apply_noise(arr, prob, mode=mode)
+                best = min(best, time.perf_counter() - start)
+            print("p=%-7g %-7s %9.1f MB/s" % (p, mode, msg_len / best / 2**20))
+
+
 if __name__ == '__main__':
     test_flow()
\ No newline at end of file
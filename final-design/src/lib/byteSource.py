@@ -6,6 +6,11 @@
 
 v1.3 增加padding功能
 v1.4 改为无扩展二元信源
+v1.5 增加alias采样方法（Vose别名表）
+v1.6 增加bernoulli采样方法（直接生成二元比特）及分布检验
+v1.7 增加分块流式生成，内存占用与消息长度无关
+v1.8 增加随机种子（SeedSequence.spawn）和多进程并行生成多个文件
+v1.9 输出直接写出数组缓冲区，padding单独写在文件首尾
 模块输入
 	信源消息概率分布P(0)
 	消息序列的大小（字节）
@@ -13,14 +18,16 @@ v1.4 改为无扩展二元信源
 	信源输出消息序列文件
 
 """
-__version__ = '1.4'
+__version__ = '1.9'
 
 import os
 import argparse
 import numpy as np
 import csv
+from concurrent.futures import ProcessPoolExecutor
 
 bit_counts = np.float32(bytearray(map(int.bit_count, range(256))))
+METHODS = ('searchsorted', 'alias', 'bernoulli')
 
 def generate(ones):
     probs = []
@@ -34,12 +41,33 @@ def generate(ones):
 def main(prob0s, output_path, msg_length, **kwgs):
     ones = [1.-float(p0) for p0 in prob0s.split(',')]
     prob0s = generate(ones)
-    output_paths = path_split(output_path)
-
-    for (prob, output_path) in zip(prob0s, output_paths):
-        if kwgs['message_state']:
-            print('Processing "%s" ...' % output_path)
-        work_flow(prob, output_path, msg_length, **kwgs)
+    output_paths = list(path_split(output_path))
+    jobs = list(zip(prob0s, output_paths))
+    workers = kwgs.get('workers') or 1
+
+    # 每个输出文件使用由主种子派生的独立随机数流，输出只取决于种子和文件序号，与进程数无关
+    if kwgs.get('seed') is not None or workers > 1:
+        seed_seq = np.random.SeedSequence(kwgs.get('seed'))
+        if kwgs['message_state'] == 1:
+            print('Seed entropy:', seed_seq.entropy)
+        seeds = seed_seq.spawn(len(jobs))
+    else:
+        seeds = [None] * len(jobs)
+
+    if workers == 1:
+        for (prob, output_path), seed in zip(jobs, seeds):
+            if kwgs['message_state']:
+                print('Processing "%s" ...' % output_path)
+            work_flow(prob, output_path, msg_length, **dict(kwgs, seed=seed))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(work_flow, prob, output_path, msg_length, **dict(kwgs, seed=seed))
+                   for (prob, output_path), seed in zip(jobs, seeds)]
+        for (prob, output_path), future in zip(jobs, futures):
+            future.result()
+            if kwgs['message_state']:
+                print('Finished "%s"' % output_path)
 
 
 def work_flow(symbol_prob, output_path, msg_length, **kwgs):
@@ -53,14 +81,27 @@ def work_flow(symbol_prob, output_path, msg_length, **kwgs):
     if msg_length<=0:
         raise ValueError("Message length must be a positive number.")
 
-    msg = random_sequence(symbol_prob, msg_length)
-    pad_left, v1, pad_right, v2 = kwgs.get('pad', (0,0,0,0))
-    if pad_left or pad_right:
-        msg = np.pad(msg, (pad_left, pad_right), constant_values=(v1, v2))
+    seed = kwgs.get('seed')
+    rng = None if seed is None else np.random.default_rng(seed)
+    sampler = make_sampler(symbol_prob, kwgs.get('method', 'searchsorted'), rng)
+    pad = kwgs.get('pad', (0,0,0,0))
+    if kwgs.get('chunk'):
+        counts = stream_output(output_path, sampler, msg_length, kwgs['chunk'], pad)
+    else:
+        msg = sampler(msg_length)
+        counts = np.bincount(msg, minlength=256) if kwgs.get('check') else None
+        write_output(output_path, msg, pad)
+
+    if kwgs.get('check'):
+        chi2, critical = check_distribution(counts, symbol_prob)
+        if kwgs['message_state'] == 1:
+            print('\tChi-square=%.2f, critical=%.2f' % (chi2, critical))
+        if chi2 > critical:
+            print('[WARNING] Output distribution of "%s" does not match the PMF (chi-square %.2f > %.2f).'
+                  % (output_path, chi2, critical))
 
     if kwgs['message_state'] == 1:
         print()
-    write_output(output_path, msg)
 
 
 def path_split(path):
@@ -93,40 +134,308 @@ def read_input(input_path) -> np.ndarray:
     return symbol_prob
 
 
-def write_output(output_path, sequence):
+def write_output(output_path, sequence, pad=(0,0,0,0)):
     """
-    将生成的符号序列保存为二进制文件。
+    将生成的符号序列保存为二进制文件。数组直接从其缓冲区写出，不再复制；
+    padding作为首尾两段单独写入，不重新分配消息数组。
 
     Parameters:
         output_path (str): 输出文件的路径。
         sequence (numpy.ndarray): 生成的符号序列。
+        pad (tuple): (pad-left, value-left, pad-right, value-right)。
+    """
+    pad_left, v1, pad_right, v2 = pad
+    # uint8 连续数组不会产生复制
+    sequence = np.ascontiguousarray(sequence, dtype=np.uint8)
+    with open(output_path, 'wb') as out_file:
+        write_padding(out_file, v1, pad_left)
+        out_file.write(memoryview(sequence))
+        write_padding(out_file, v2, pad_right)
+
+
+def write_padding(out_file, value, count, block=1 << 20):
+    """
+    向文件写入 count 个取值为 value 的字节，每次最多写 block 字节。
+
+    Parameters:
+        out_file (io.BufferedWriter): 已打开的输出文件。
+        value (int): padding的字节值。
+        count (int): padding的字节数。
+        block (int): 每次写入的最大字节数。
+    """
+    if count <= 0:
+        return
+    fill = bytes([value]) * min(count, block)
+    for start in range(0, count, block):
+        out_file.write(fill[:min(block, count - start)])
+
+
+def stream_output(output_path, sampler, msg_len, chunk, pad=(0,0,0,0)) -> np.ndarray:
+    """
+    分块生成符号序列并依次写入文件，内存占用只与块大小有关。padding在文件首尾单独写入。
+
+    Parameters:
+        output_path (str): 输出文件的路径。
+        sampler (callable): make_sampler 生成的采样函数。
+        msg_len (int): 生成的消息长度（符号数量，不含padding）。
+        chunk (int): 每块的符号数量。
+        pad (tuple): (pad-left, value-left, pad-right, value-right)。
+
+    Returns:
+        numpy.ndarray: 各符号的出现次数（不含padding）。
     """
+    pad_left, v1, pad_right, v2 = pad
+    counts = np.zeros(256, dtype=np.int64)
+    msg_len, chunk = int(msg_len), int(chunk)
     with open(output_path, 'wb') as out_file:
-        # 将符号序列转换为字节形式并写入文件
-        out_file.write(bytearray(sequence))
+        write_padding(out_file, v1, pad_left)
+        for start in range(0, msg_len, chunk):
+            msg = sampler(min(chunk, msg_len - start))
+            counts += np.bincount(msg, minlength=256)
+            out_file.write(memoryview(msg))
+        write_padding(out_file, v2, pad_right)
+    return counts
 
 
-def random_sequence(symbol_prob, msg_len) -> np.ndarray:
+def make_sampler(symbol_prob, method='searchsorted', rng=None):
     """
-    使用 np.searchsorted 生成符合指定概率分布的随机序列（蒙特卡罗法）
+    按采样方法对概率分布做一次预处理（累积分布、别名表或比特概率），返回可重复调用的采样函数。
 
     Parameters:
         symbol_prob (numpy.ndarray): 符号的概率分布。
-        msg_len (int): 生成的消息长度（符号数量）。
+        method (str): 采样方法，'searchsorted'（累积分布查找）、'alias'（别名表）
+            或 'bernoulli'（直接生成二元比特，仅适用于无扩展二元信源）。
+        rng (numpy.random.Generator): 随机数生成器，None 表示使用 np.random 的全局状态。
 
     Returns:
-        numpy.ndarray: 生成的符号序列。
+        callable: 输入消息长度，输出 uint8 符号序列。
     """
+    if method == 'alias':
+        table = alias_table(symbol_prob)
+        return lambda msg_len: alias_sequence(table, msg_len, rng)
+    if method == 'bernoulli':
+        one = binary_prob1(symbol_prob)
+        return lambda msg_len: bernoulli_sequence(one, msg_len, rng=rng)
+    if method != 'searchsorted':
+        raise ValueError("Unknown sampling method: %s." % method)
+
     # 计算累积概率分布 F(i)
     symbol_cumsum = symbol_prob.cumsum()
+    return lambda msg_len: searchsorted_sequence(symbol_cumsum, msg_len, rng)
+
+
+def random_sequence(symbol_prob, msg_len, method='searchsorted', rng=None) -> np.ndarray:
+    """
+    生成符合指定概率分布的随机序列（蒙特卡罗法）
+
+    Parameters:
+        symbol_prob (numpy.ndarray): 符号的概率分布。
+        msg_len (int): 生成的消息长度（符号数量）。
+        method (str): 采样方法，见 make_sampler。
+        rng (numpy.random.Generator): 随机数生成器，None 表示使用 np.random 的全局状态。
+
+    Returns:
+        numpy.ndarray: 生成的符号序列。
+    """
+    return make_sampler(symbol_prob, method, rng)(msg_len)
+
+
+def random_uint32(size, rng=None) -> np.ndarray:
+    """生成 uint32 均匀随机整数，rng 为 None 时使用 np.random 的全局状态。"""
+    if rng is None:
+        return np.random.randint(0, 1 << 32, size=size, dtype=np.uint32)
+    return rng.integers(0, 1 << 32, size=size, dtype=np.uint32)
+
+
+def searchsorted_sequence(symbol_cumsum, msg_len, rng=None) -> np.ndarray:
+    """
+    使用 np.searchsorted 生成随机序列。
 
+    Parameters:
+        symbol_cumsum (numpy.ndarray): 符号的累积概率分布。
+        msg_len (int): 生成的消息长度（符号数量）。
+        rng (numpy.random.Generator): 随机数生成器。
+
+    Returns:
+        numpy.ndarray: 生成的符号序列。
+    """
     # 生成符合均匀分布的随机数，并通过累积概率分布查找对应符号
     msg_len = int(msg_len)
-    symbol_random = np.random.uniform(size=msg_len)
+    symbol_random = (np.random if rng is None else rng).uniform(size=msg_len)
     msg = np.searchsorted(symbol_cumsum, symbol_random)
     return msg.astype(np.uint8)
 
 
+def alias_table(symbol_prob) -> (np.ndarray, np.ndarray):
+    """
+    使用 Vose 算法构建256元概率分布的别名表，每个概率分布只需构建一次。
+
+    每一列的概率为1/256，列内以阈值划分为本符号和别名符号两部分，阈值以2**24为满量程。
+
+    Parameters:
+        symbol_prob (numpy.ndarray): 符号的概率分布。
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): 各列的阈值（uint32）和别名符号（uint8）。
+    """
+    n = len(symbol_prob)
+    if n != 256:
+        raise ValueError("Alias table only supports 256 symbols, but got %d." % n)
+    q = np.asarray(symbol_prob, dtype=np.float64)
+    q = q * (n / q.sum())
+    alias = np.arange(n, dtype=np.uint8)
+    small = [i for i in range(n) if q[i] < 1.]
+    large = [i for i in range(n) if q[i] >= 1.]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        q[l] = (q[l] + q[s]) - 1.
+        (small if q[l] < 1. else large).append(l)
+    # 剩余的列只因舍入误差而未满，直接视为满列
+    q[small + large] = 1.
+    threshold = np.minimum(np.round(q * (1 << 24)), 1 << 24).astype(np.uint32)
+    return threshold, alias
+
+
+def alias_sequence(table, msg_len, rng=None) -> np.ndarray:
+    """
+    使用别名表生成随机序列，每个符号只需一个32位随机整数和两次查表。
+
+    随机整数的低8位选择列，高24位与该列阈值比较，决定输出本符号或别名符号。
+
+    Parameters:
+        table ((numpy.ndarray, numpy.ndarray)): alias_table 生成的别名表。
+        msg_len (int): 生成的消息长度（符号数量）。
+        rng (numpy.random.Generator): 随机数生成器。
+
+    Returns:
+        numpy.ndarray: 生成的符号序列。
+    """
+    threshold, alias = table
+    symbol_random = random_uint32(int(msg_len), rng)
+    column = symbol_random.astype(np.uint8)
+    symbol_random >>= 8
+    keep = symbol_random < threshold[column]
+    return np.where(keep, column, alias[column])
+
+
+def binary_prob1(symbol_prob) -> float:
+    """
+    从256元概率分布中还原二元信源的P(1)，并检查该分布确实是8次无扩展二元信源。
+
+    Parameters:
+        symbol_prob (numpy.ndarray): 符号的概率分布。
+
+    Returns:
+        float: 比特1的概率。
+    """
+    symbol_prob = np.asarray(symbol_prob, dtype=np.float64)
+    symbol_prob = symbol_prob / symbol_prob.sum()
+    one = float((symbol_prob * bit_counts).sum() / 8)
+    if not np.allclose(symbol_prob, generate([one])[0], rtol=1e-3, atol=1e-7):
+        raise ValueError("bernoulli method requires a PMF built by generate().")
+    return one
+
+
+def bernoulli_sequence(one, msg_len, chunk=1 << 20, rng=None) -> np.ndarray:
+    """
+    直接生成P(1)=one的二元比特流，每8个比特按高位在前打包为1字节，与 generate() 的256元分布等价。
+
+    P(1)接近0或1时使用几何分布跳跃采样，只生成少数比特的位置；
+    否则将32位随机整数与固定阈值比较得到比特，再用 np.packbits 分块打包。
+
+    Parameters:
+        one (float): 比特1的概率。
+        msg_len (int): 生成的消息长度（字节）。
+        chunk (int): 阈值比较法每块的字节数，限制临时内存。
+        rng (numpy.random.Generator): 随机数生成器。
+
+    Returns:
+        numpy.ndarray: 生成的字节序列。
+    """
+    msg_len = int(msg_len)
+    if one <= 0.:
+        return np.zeros(msg_len, dtype=np.uint8)
+    if one >= 1.:
+        return np.full(msg_len, 0xFF, dtype=np.uint8)
+    if min(one, 1. - one) < 1 / 32:
+        return geometric_sequence(one, msg_len, rng)
+
+    threshold = np.uint32(min(round(one * (1 << 32)), (1 << 32) - 1))
+    msg = np.empty(msg_len, dtype=np.uint8)
+    for start in range(0, msg_len, chunk):
+        stop = min(start + chunk, msg_len)
+        bits = random_uint32((stop - start) * 8, rng) < threshold
+        msg[start:stop] = np.packbits(bits)
+    return msg
+
+
+def geometric_sequence(one, msg_len, rng=None) -> np.ndarray:
+    """
+    几何分布跳跃采样：相邻两个少数比特之间的间隔服从几何分布，只生成这些比特的位置，
+    开销为 O(p·N)。
+
+    Parameters:
+        one (float): 比特1的概率。
+        msg_len (int): 生成的消息长度（字节）。
+        rng (numpy.random.Generator): 随机数生成器。
+
+    Returns:
+        numpy.ndarray: 生成的字节序列。
+    """
+    rng = np.random if rng is None else rng
+    invert = one > 0.5
+    p = 1. - one if invert else one
+    msg = np.zeros(msg_len, dtype=np.uint8)
+    total_bits = msg_len * 8
+    position = -1
+    while True:
+        expect = (total_bits - position) * p
+        gaps = rng.geometric(p, size=int(expect + 6 * np.sqrt(expect) + 16))
+        positions = position + np.cumsum(gaps)
+        positions = positions[positions < total_bits]
+        np.bitwise_or.at(msg, positions >> 3, np.uint8(0x80) >> (positions & 7).astype(np.uint8))
+        if len(positions) < len(gaps):
+            break
+        position = positions[-1]
+    if invert:
+        np.invert(msg, out=msg)
+    return msg
+
+
+def check_distribution(counts, symbol_prob, z=3.090) -> (float, float):
+    """
+    卡方拟合优度检验：生成序列的字节频数是否符合给定的概率分布（即 searchsorted 方法的抽样分布）。
+    期望频数小于5的符号合并为一组。
+
+    Parameters:
+        counts (numpy.ndarray): 生成序列中各符号的出现次数，如 np.bincount(msg, minlength=256)。
+        symbol_prob (numpy.ndarray): 符号的概率分布。
+        z (float): 标准正态分布上分位点，默认3.090即显著性水平0.001。
+
+    Returns:
+        (float, float): 卡方统计量和临界值，统计量不超过临界值即通过检验。
+    """
+    symbol_prob = np.asarray(symbol_prob, dtype=np.float64)
+    observed = np.asarray(counts, dtype=np.float64)
+    expected = symbol_prob / symbol_prob.sum() * observed.sum()
+    rare = expected < 5
+    observed = np.append(observed[~rare], observed[rare].sum())
+    expected = np.append(expected[~rare], expected[rare].sum())
+    if expected[-1] == 0:
+        observed, expected = observed[:-1], expected[:-1]
+    used = expected > 0
+    if (observed[~used] > 0).any():
+        return np.inf, 0.
+    chi2 = ((observed[used] - expected[used]) ** 2 / expected[used]).sum()
+    dof = used.sum() - 1
+    if dof <= 0:
+        return chi2, 0.
+    # Wilson-Hilferty 近似卡方分布的上分位点
+    critical = dof * (1 - 2 / (9 * dof) + z * np.sqrt(2 / (9 * dof))) ** 3
+    return chi2, critical
+
+
 def parse_sys_args() -> dict:
     """
     Parse command line arguments using argparse and return a dictionary of arguments.
@@ -139,9 +448,18 @@ def parse_sys_args() -> dict:
                         'like (pad-left,bool,pad-right,bool).')
     parser.add_argument('-d', '--dir', type=str, help='Base directory path')
     parser.add_argument('--depth', type=int, default=1, help='Folder traversal depth (default: 1)')
+    parser.add_argument('-m', '--method', choices=METHODS, default='searchsorted',
+                        help='Sampling method (default: searchsorted)')
+    parser.add_argument('--chunk', type=int, default=0, help='Generate and write in chunks of this many bytes '
+                        '(default: 0, whole message at once)')
+    parser.add_argument('-s', '--seed', type=int, help='Seed of the random number generator')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='Number of processes generating files '
+                        'concurrently (default: 1)')
+    parser.add_argument('-c', '--check', action='store_true', help='Chi-square check output distribution against the PMF')
     parser.add_argument('-O', action='store_true', help='Full prompt output')
     parser.add_argument('-S', action='store_true', help='Weak prompt output')
     parser.add_argument('-t', '--test', action='store_true', help='Check test flow and state')
+    parser.add_argument('-b', '--bench', action='store_true', help='Compare throughput of sampling methods')
     parser.add_argument('-v', '--version', action='store_true', help='Show version information')
 
     args = parser.parse_args()
@@ -151,8 +469,14 @@ def parse_sys_args() -> dict:
         output_path=args.output_path,
         base_path=args.dir,
         pad=args.p,
+        method=args.method,
+        check=args.check,
+        chunk=args.chunk,
+        seed=args.seed,
+        workers=args.workers,
         show_version=args.version,
         test_flow=args.test,
+        bench=args.bench,
         message_state=1 if args.O else 2 if args.S else 0,
         depth=args.depth,
         msg_length=args.msg_length,
@@ -169,6 +493,10 @@ if __name__ == "__main__":
         import byteSourceTest
         byteSourceTest.test_flow()
 
+    if kwgs['bench']:
+        import byteSourceTest
+        byteSourceTest.benchmark()
+
     if kwgs['base_path']:
         if not os.path.exists(kwgs['base_path']) or os.path.isfile(kwgs['base_path']):
             raise RuntimeError("base-path must be an exist folder.")
@@ -17,6 +17,55 @@ Header  |header_size  : uint16, number of bytes for header
 ________|word
 Payload |encoded-data : many unit8
 
+Version 2 header (canonical Huffman codes, only the code lengths are stored):
+
+Header  |header_size  : uint16, number of bytes for header
+        |marker       : uint8, 0 (a version 1 codebook always has 256 symbols, so this byte is 255 there)
+        |version      : uint8, 2
+        |source_len   : uint64, number of symbols in source
+________|word_len     : 256*uint8, number of bits for the codeword of symbol 0..255, 0 if not in codebook
+Payload |encoded-data : many unit8
+
+Version 3 header (length-limited canonical Huffman codes, the decoder uses a single-level table of max_len bits
+if max_len <= 16):
+
+Header  |header_size  : uint16, number of bytes for header
+        |marker       : uint8, 0
+        |version      : uint8, 3
+        |max_len      : uint8, maximum number of bits for a codeword
+        |source_len   : uint64, number of symbols in source
+________|word_len     : 256*uint8, as in version 2
+Payload |encoded-data : many unit8
+
+Version 4 header (block mode: blocks of block_size source bytes are encoded independently, each padded to whole bytes):
+
+Header  |header_size  : uint16, number of bytes for header (without the index)
+        |marker       : uint8, 0
+        |version      : uint8, 4
+        |max_len      : uint8, maximum number of bits for a codeword, 0 if not limited
+        |source_len   : uint64, number of symbols in source
+        |block_size   : uint64, number of source symbols per block (the last block may be shorter)
+________|word_len     : 256*uint8, as in version 2
+Index   |block_end    : ceil(source_len/block_size)*uint64, byte offset of the end of each block in the payload
+Payload |encoded-data : many unit8, the encoded blocks one after another
+
+Version 5 header (k-th order extension: every k source bytes form one symbol, the first byte most significant,
+the last symbol is padded; canonical Huffman codes over the 256**k symbols):
+
+Header  |header_size  : uint16, number of bytes for the fixed part of the header
+        |marker       : uint8, 0
+        |version      : uint8, 5
+        |order        : uint8, k (1..3)
+        |max_len      : uint8, maximum number of bits for a codeword
+        |mode         : uint8, 0 if the codebook is the byte PMF, 1 if it lists the code lengths
+        |source_len   : uint64, number of bytes in source
+________|book_len     : uint32, number of bytes of the codebook
+Codebook|pmf          : mode 0: 256*float64, probability of bytes 0..255, the code is built from its k-th extension
+        |count        : mode 1: uint32, number of symbols with a codeword
+        |symbol       :         count*uint32, symbols in increasing order
+________|word_len     :         count*uint8, number of bits for the codeword of each symbol
+Payload |encoded-data : many unit8
+
 Note: This program is intended for use in course, Principle of Information and Coding Theory.
 
 """
@@ -25,6 +74,8 @@ import csv
 import io
 import os
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # Non-standard library
 import numpy as np
@@ -35,13 +86,38 @@ __author__ = "Guo, Jiangling"
 __email__ = "tguojiangling@jnu.edu.cn"
 __version__ = "20201111.1702"
 
+TABLE_BITS = 12  # 版本1、2文件头的解码查找表位数（更长的码字查二级表）
+MAX_TABLE_BITS = 16  # 解码查找表位数的上限
+BLOCK_VERSION = 4  # 分块编码的文件头版本
+EXTENSION_VERSION = 5  # k 阶扩展信源编码的文件头版本
+EXTENSION_MAX_LENGTH = 32  # 扩展编码默认的最大码长（3 阶扩展的霍夫曼码长可达七八十位）
+EXTENSION_TABLE_BITS = 16  # 扩展编码解码查找表位数
+BENCHMARKS = ('codec', 'construction', 'limit', 'blocks', 'extension', 'all')  # -b 可选的基准测试（见 byteSourceCoderTest）
+
+# 已构建的编解码器缓存，以 PMF 文件（编码）或文件头码本（解码）内容的哈希为键；用 set_cache 启用磁盘缓存
+codec_cache = dahuffman.CodecCache()
+
 
-def main(command, *, PMF=None, INPUT=None, OUTPUT=None, SOURCE=None, verbose=False):
+def set_cache(directory=None, maxsize=32, max_files=256):
+    """
+    替换编解码器缓存：directory 为磁盘缓存目录（None 只在进程内缓存），maxsize 和 max_files 为内存和磁盘的条目上限。
+    """
+    global codec_cache
+    codec_cache = dahuffman.CodecCache(directory, maxsize=maxsize, max_files=max_files)
+    return codec_cache
+
+
+def main(command, *, PMF=None, INPUT=None, OUTPUT=None, SOURCE=None, verbose=False, header=2, max_length=None,
+         cache=None, block_size=None, workers=1, block=None, chunk=1 << 20, order=1, measure=False):
+    if cache is not None:
+        set_cache(cache)
     # Execute based on sub-command
     if command == 'encode':
         if verbose:
             print('Encoding %s (PMF=%s) ...' % (os.path.basename(INPUT), os.path.basename(PMF)))
-        (source_len, encoded_len) = encode(PMF, INPUT, OUTPUT)
+        (source_len, encoded_len) = encode(PMF, INPUT, OUTPUT, version=header, max_length=max_length,
+                                           block_size=block_size, workers=workers, chunk=chunk, order=order,
+                                           measure=measure)
         if verbose:
             print(f'\t Source len: {source_len} B')
             print(f'\tEncoded len: {encoded_len} B')
@@ -50,64 +126,402 @@ def main(command, *, PMF=None, INPUT=None, OUTPUT=None, SOURCE=None, verbose=Fal
     elif command == 'decode':
         if verbose:
             print('Decoding %s ...' % os.path.basename(INPUT))
-        (encoded_len, decoded_len) = decode(INPUT, OUTPUT)
+        if block is not None:
+            # 随机访问：只解码分块文件中的一块
+            decoded = decode_block(INPUT, block)
+            decoded.tofile(OUTPUT)
+            if verbose:
+                print(f'\tBlock {block}: {len(decoded)} B')
+            return
+        (encoded_len, decoded_len) = decode(INPUT, OUTPUT, workers=workers, chunk=chunk)
         if verbose:
             print(f'\tEncoded len: {encoded_len} B')
             print(f'\tDecoded len: {decoded_len} B')
 
     elif command == 'compare':
         if verbose:
-            print('Comparing source "%s" and decoded "%s" ...' % (os.path.basename(args.SOURCE), os.path.basename(args.OUTPUT)))
+            print('Comparing source "%s" and decoded "%s" ...' % (os.path.basename(SOURCE), os.path.basename(OUTPUT)))
         compare_file(SOURCE, OUTPUT)
         if verbose:
             print('')
 
 
 # 编码函数
-def encode(pmf_file_name, in_file_name, out_file_name, byteorder = 'little'):
+def encode(pmf_file_name, in_file_name, out_file_name, byteorder = 'little', method='array', version=2, max_length=None,
+           block_size=None, workers=1, chunk=None, order=1, measure=False):
+    # 扩展信源编码：每 order 个字节合为一个符号，概率由 PMF 文件计算或由数据统计
+    if order != 1 or measure:
+        return encode_extension(pmf_file_name, in_file_name, out_file_name, byteorder, order, max_length, measure)
+    # 分块模式：各块独立编码（可并行），文件头后附块索引
+    if block_size is not None:
+        return encode_blocks(pmf_file_name, in_file_name, out_file_name, byteorder, method, max_length,
+                             block_size, workers)
+    # 流式编码：按 chunk 字节读取信源、逐段写出编码数据，内存只与 chunk 有关
+    if chunk is not None:
+        return encode_chunked(pmf_file_name, in_file_name, out_file_name, byteorder, method, version, max_length,
+                              chunk)
     # 从输入文件读取源数据
     source = np.fromfile(in_file_name, dtype='uint8')  ## 读取输入文件，数据格式为uint8
     if len(source) == 0:
         open(out_file_name, 'wb').close()
         return 0, 0
+    # 限制最大码长时使用版本3文件头，记录最大码长，解码器只需一级查找表
+    if max_length is not None and version == 2:
+        version = 3
+    # 同一 PMF 文件内容只解析和构建一次编码器
+    with open(pmf_file_name, 'rb') as pmf_file:
+        pmf_bytes = pmf_file.read()
+    codec = load_codec(pmf_bytes, version, max_length)
+    encoded = encode_payload(codec, source, method)
+
+    header = make_header(codec, len(source), byteorder, version, max_length)
+
+    # 打开输出文件并写入头部和编码后的数据
+    with open(out_file_name, 'wb') as out_file:
+        out_file.write(header)  # 写入头部
+        out_file.write(encoded)  # 写入编码数据
+
+    return (len(source), len(encoded))  # 返回源数据的长度和编码后的数据长度
+
+
+def encode_chunked(pmf_file_name, in_file_name, out_file_name, byteorder='little', method='array', version=2,
+                   max_length=None, chunk=1 << 20):
+    """
+    流式编码：源数据长度取自文件大小，文件头先写出；信源按 chunk 字节读取，不足一字节的比特留到下一段，
+    编码结果与一次读入整个文件相同。
+    """
+    if method != 'array':
+        raise ValueError("Chunked encoding needs method 'array', got %s." % method)
+    source_len = os.path.getsize(in_file_name)
+    if source_len == 0:
+        open(out_file_name, 'wb').close()
+        return 0, 0
+    if max_length is not None and version == 2:
+        version = 3
+    with open(pmf_file_name, 'rb') as pmf_file:
+        pmf_bytes = pmf_file.read()
+    codec = load_codec(pmf_bytes, version, max_length)
+    header = make_header(codec, source_len, byteorder, version, max_length)
+
+    encoded_len = 0
+    with open(in_file_name, 'rb') as in_file, open(out_file_name, 'wb') as out_file:
+        out_file.write(header)
+        sources = (np.frombuffer(data, dtype=np.uint8) for data in read_chunks(in_file, chunk))
+        for encoded in codec.encode_array_stream(sources):
+            out_file.write(encoded)
+            encoded_len += len(encoded)
+
+    return (source_len, encoded_len)
+
+
+def read_chunks(in_file, chunk=1 << 20):
+    """
+    从当前位置起按 chunk 字节读取文件直到结尾。
+    """
+    return iter(lambda: in_file.read(chunk), b'')
+
+
+def encode_blocks(pmf_file_name, in_file_name, out_file_name, byteorder='little', method='array', max_length=None,
+                  block_size=1 << 20, workers=1):
+    """
+    分块编码：信源按 block_size 字节分块，各块用同一码本独立编码并补齐到整字节，由 workers 个进程并行编码，
+    按顺序写入文件，文件头后的索引记录每块结束的字节偏移，解码时可并行解码或随机访问任意一块。
+    """
+    source_len = os.path.getsize(in_file_name)
+    if source_len == 0:
+        open(out_file_name, 'wb').close()
+        return 0, 0
+    if block_size < 1:
+        raise ValueError("Block size must be positive, got %d." % block_size)
+    with open(pmf_file_name, 'rb') as pmf_file:
+        pmf_bytes = pmf_file.read()
+    codec = load_codec(pmf_bytes, BLOCK_VERSION, max_length)
+    header = make_header(codec, source_len, byteorder, BLOCK_VERSION, max_length, block_size)
+    starts = range(0, source_len, block_size)
+    ends = np.zeros(len(starts), dtype=index_dtype(byteorder))
+    jobs = ((pmf_bytes, max_length, in_file_name, start, min(start + block_size, source_len), method)
+            for start in starts)
+
+    with open(out_file_name, 'wb') as out_file:
+        out_file.write(header)
+        out_file.write(bytes(ends.nbytes))  # 索引占位，编码完成后回填
+        offset = 0
+        for k, encoded in enumerate(map_blocks(encode_block, jobs, workers)):
+            out_file.write(encoded)
+            offset += len(encoded)
+            ends[k] = offset
+        out_file.seek(len(header))
+        out_file.write(ends.tobytes())
+
+    return (source_len, offset)
+
+
+def encode_extension(pmf_file_name, in_file_name, out_file_name, byteorder='little', order=2, max_length=None,
+                     measure=False):
+    """
+    k 阶扩展信源编码（版本5文件头）：每 order 个字节打包为一个符号，用 256**order 个符号的范式霍夫曼码编码。
+    measure 为 False 时符号概率是 PMF 文件中字节概率的 order 次扩展（独立同分布），文件头只保存字节 PMF；
+    为 True 时由数据统计符号频数，文件头保存出现符号的码长（pmf_file_name 不使用）。
+    """
+    if not 1 <= order <= 3:
+        raise ValueError("Extension order must be 1..3, got %d." % order)
+    source = np.fromfile(in_file_name, dtype=np.uint8)
+    if len(source) == 0:
+        open(out_file_name, 'wb').close()
+        return 0, 0
+    max_length = max_length or EXTENSION_MAX_LENGTH
+    if not 1 <= max_length <= 255:
+        raise ValueError("Maximum code length must be 1..255 (stored as uint8), got %d." % max_length)
+    if measure:
+        symbols = pack_symbols(source, order)
+        codec = dahuffman.CanonicalCodec.from_weights(np.bincount(symbols, minlength=256 ** order),
+                                                      max_length=max_length)
+        coded = np.flatnonzero(codec.lengths)
+        codebook = (len(coded).to_bytes(4, byteorder) + coded.astype(symbol_dtype(byteorder)).tobytes()
+                    + codec.lengths[coded].tobytes())
+    else:
+        with open(pmf_file_name, 'rb') as pmf_file:
+            pmf = read_pmf(pmf_file.read())
+        # 补齐最后一个符号用概率最大的字节，保证其有码字
+        symbols = pack_symbols(source, order, fill=int(np.argmax(pmf)))
+        codebook = pmf.astype(float_dtype(byteorder)).tobytes()
+        codec = load_extension_codec(codebook, byteorder, order, max_length, 0)
+    encoded = codec.encode_array(symbols)
+
+    header = bytearray(2)
+    header.extend((0, EXTENSION_VERSION, order, max_length, int(measure)))
+    header.extend(len(source).to_bytes(8, byteorder))
+    header.extend(len(codebook).to_bytes(4, byteorder))
+    header[0:2] = len(header).to_bytes(2, byteorder)
+
+    with open(out_file_name, 'wb') as out_file:
+        out_file.write(header)
+        out_file.write(codebook)
+        out_file.write(encoded)
+
+    return (len(source), len(encoded))
+
+
+def pack_symbols(source, order, fill=0) -> np.ndarray:
+    """
+    每 order 个字节打包为一个符号（第一个字节为最高位），不足 order 个字节的最后一个符号用 fill 补齐。
+    """
+    source = np.asarray(source, dtype=np.uint8)
+    padded = np.full(-(-len(source) // order) * order, fill, dtype=np.uint8)
+    padded[:len(source)] = source
+    padded = padded.reshape(-1, order)
+    symbols = padded[:, 0].astype(np.uint32)
+    for column in range(1, order):
+        symbols <<= 8
+        symbols |= padded[:, column]
+    return symbols
+
+
+def unpack_symbols(symbols, order, source_len) -> np.ndarray:
+    """
+    pack_symbols 的逆运算，返回前 source_len 个字节。
+    """
+    data = np.asarray(symbols, dtype='>u4').view(np.uint8).reshape(-1, 4)
+    return data[:, 4 - order:].ravel()[:source_len]
+
+
+def extension_pmf(pmf, order) -> np.ndarray:
+    """
+    独立同分布字节的 order 次扩展：256**order 个符号的概率，符号的第一个字节为最高位。
+    """
+    weights = np.asarray(pmf, dtype=np.float64)
+    for k in range(order - 1):
+        weights = np.multiply.outer(weights, pmf).ravel()
+    return weights
+
+
+def symbol_dtype(byteorder='little'):
+    return np.dtype('<u4' if byteorder == 'little' else '>u4')
+
+
+def float_dtype(byteorder='little'):
+    return np.dtype('<f8' if byteorder == 'little' else '>f8')
+
+
+def load_extension_codec(codebook, byteorder='little', order=2, max_length=EXTENSION_MAX_LENGTH, mode=0):
+    """
+    取得版本5码本对应的编解码器：以码本内容哈希为键查缓存（编码和解码共用），未命中时构建。
+    """
+    key = codec_cache.content_key(b'extension', codebook, byteorder, order, max_length, mode)
+    return codec_cache.get(key, lambda: build_extension_codec(codebook, byteorder, order, max_length, mode))
+
+
+def build_extension_codec(codebook, byteorder='little', order=2, max_length=EXTENSION_MAX_LENGTH, mode=0):
+    if mode == 0:
+        pmf = np.frombuffer(codebook, dtype=float_dtype(byteorder))
+        # 与单字节编码一样，概率为 0 的字节也要有码字：扩展概率取一个极小的正数下限，码长由 max_length 限制
+        weights = np.maximum(extension_pmf(pmf, order), np.finfo(np.float64).tiny)
+        return dahuffman.CanonicalCodec.from_weights(weights, max_length=max_length)
+    elif mode == 1:
+        count = int.from_bytes(codebook[:4], byteorder)
+        coded = np.frombuffer(codebook, dtype=symbol_dtype(byteorder), count=count, offset=4)
+        lengths = np.zeros(256 ** order, dtype=np.uint8)
+        lengths[coded] = np.frombuffer(codebook, dtype=np.uint8, count=count, offset=4 + 4 * count)
+        return dahuffman.CanonicalCodec(lengths)
+    else:
+        raise ValueError("Unknown codebook mode: %d." % mode)
+
+
+def encode_block(pmf_bytes, max_length, in_file_name, start, stop, method='array') -> bytes:
+    """
+    编码信源字节 [start, stop)，只读取这一块；编码器从本进程的缓存获取。
+    """
+    codec = load_codec(pmf_bytes, BLOCK_VERSION, max_length)
+    source = np.fromfile(in_file_name, dtype=np.uint8, count=stop - start, offset=start)
+    return encode_payload(codec, source, method)
+
+
+def map_blocks(func, jobs, workers=1):
+    """
+    按顺序产生 func(*job) 的结果，workers 个进程并行计算（0 或 None 为全部核），
+    同时进行的任务不超过 2*workers 个，内存不随块数增长。
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for job in jobs:
+            yield func(*job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = deque()
+        for job in jobs:
+            futures.append(executor.submit(func, *job))
+            if len(futures) >= 2 * workers:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def encode_payload(codec, source, method='array') -> bytes:
+    if method == 'array':
+        return codec.encode_array(source)  # 向量化查表编码，与逐符号编码的结果逐比特相同
+    elif method == 'streaming':
+        return codec.encode(source)  # 使用霍夫曼编码器对源数据进行编码
+    else:
+        raise ValueError("Unknown encode method: %s." % method)
+
+
+def index_dtype(byteorder='little'):
+    return np.dtype('<u8' if byteorder == 'little' else '>u8')
+
+
+def load_codec(pmf_bytes, version=2, max_length=None) -> HuffmanCodec:
+    """
+    取得 PMF 文件内容对应的编码器：以内容哈希为键查缓存，未命中时构建。
+    """
+    key = codec_cache.content_key(b'encode', pmf_bytes, version >= 2, max_length)
+    return codec_cache.get(key, lambda: build_codec(pmf_bytes, version, max_length))
+
+
+def build_codec(pmf_bytes, version=2, max_length=None) -> HuffmanCodec:
+    """
+    由 PMF 文件内容构建霍夫曼编码器。
+    """
     # 读取概率质量函数文件，构建符号的概率字典
-    with open(pmf_file_name, newline='') as csv_file:
-        pmf = {np.uint8(row): 0. for row in range(256)}
-        # 读取符号和概率，形成字典
-        for row in csv.reader(csv_file):
-            pmf[np.uint8(row[0])] = float(row[1])
+    pmf = {np.uint8(symbol): p for symbol, p in enumerate(read_pmf(pmf_bytes).tolist())}
     # if not np.isclose(sum(pmf.values()), 0, 1e-5):
     #     raise ValueError("PMF must have summary close to 1, but got %.8f." % sum(pmf.values()))
-    codec = HuffmanCodec.from_frequencies(pmf)  # 使用给定的频率表构建霍夫曼编码器
-
-    encoded = codec.encode(source)  # 使用霍夫曼编码器对源数据进行编码
-
+    # 使用给定的频率表构建霍夫曼编码器，版本2使用范式霍夫曼码，文件头只需保存码长
+    return HuffmanCodec.from_frequencies(pmf, canonical=(version >= 2), max_length=max_length)
+
+
+def read_pmf(pmf_bytes) -> np.ndarray:
+    """
+    解析 PMF 文件内容（每行：符号,概率），返回 256 个字节的概率，未列出的字节为 0。
+    """
+    pmf = np.zeros(256)
+    # 读取符号和概率
+    for row in csv.reader(io.StringIO(pmf_bytes.decode(), newline='')):
+        pmf[np.uint8(row[0])] = float(row[1])
+    return pmf
+
+
+def make_header(codec, source_len, byteorder='little', version=2, max_length=None, block_size=None) -> bytearray:
+    """
+    构建文件头：版本1保存每个符号的码长和码字，版本2（范式霍夫曼码）只保存256个码长，
+    版本3在版本2的基础上记录最大码长，版本4（分块）再记录块大小（块索引另行写在文件头之后）。
+    """
     # 获取霍夫曼编码器的码本
     codebook = codec.get_code_table()
     # 设置字节序（小端字节序）
     # 构建文件头部：头部包含码本信息
     header = bytearray(2)  # 头部初始化（2字节）
-    header.append(len(codebook) - 1)  # 符号计数（符号个数减去1）
-    header.extend(len(source).to_bytes(4, byteorder))  # 源数据长度（4字节表示）
-
-    # 遍历码本，添加每个符号对应的编码信息到头部
-    for symbol, (word_len, word) in codebook.items():
-        word_bytes = int(np.ceil(word_len / 8))  # 计算编码的字节长度
-        header.append(symbol)  # 添加符号
-        header.append(word_len)  # 添加编码长度（单位：bit）
-        header.extend(word.to_bytes(word_bytes, byteorder))  # 添加编码字节
+    if version in (2, 3, BLOCK_VERSION):
+        header.extend((0, version))  # 标记和版本号
+        if version == 3:
+            header.append(max_length)  # 最大码长
+        elif version == BLOCK_VERSION:
+            header.append(max_length or 0)  # 最大码长，0 表示不限
+        header.extend(source_len.to_bytes(8, byteorder))  # 源数据长度（8字节表示）
+        if version == BLOCK_VERSION:
+            header.extend(block_size.to_bytes(8, byteorder))  # 块大小（8字节表示）
+        lengths = bytearray(256)
+        for symbol, (word_len, word) in codebook.items():
+            lengths[symbol] = word_len
+        header.extend(lengths)
+    elif version == 1:
+        header.append(len(codebook) - 1)  # 符号计数（符号个数减去1）
+        header.extend(source_len.to_bytes(4, byteorder))  # 源数据长度（4字节表示）
+
+        # 遍历码本，添加每个符号对应的编码信息到头部
+        for symbol, (word_len, word) in codebook.items():
+            word_bytes = int(np.ceil(word_len / 8))  # 计算编码的字节长度
+            header.append(symbol)  # 添加符号
+            header.append(word_len)  # 添加编码长度（单位：bit）
+            header.extend(word.to_bytes(word_bytes, byteorder))  # 添加编码字节
+    else:
+        raise ValueError("Unknown header version: %s." % version)
     header[0:2] = len(header).to_bytes(2, byteorder)  # 更新头部的大小信息（前2字节为头部长度）
+    return header
+
+
+def read_header(header, byteorder='little') -> (HuffmanCodec, int, int, int):
+    """
+    解析文件头（不含前2字节的头部大小），返回解码器、源数据长度、查找表位数和块大小（非分块格式为 None）。
+    """
+    header = io.BytesIO(header)
+    symbol_count = header.read(1)[0]  # 读取符号计数（版本2为标记0）
+    if symbol_count == 0:
+        version = header.read(1)[0]
+        if version not in (2, 3, BLOCK_VERSION):
+            raise ValueError("Unknown header version: %d." % version)
+        table_bits = header.read(1)[0] if version != 2 else 0  # 版本3、4：一级查找表覆盖全部码字
+        # 查找表最多 MAX_TABLE_BITS 位，更长的最大码长由二级表解码
+        table_bits = min(table_bits, MAX_TABLE_BITS) or TABLE_BITS
+        source_len = int.from_bytes(header.read(8), byteorder)  # 读取源数据长度
+        block_size = int.from_bytes(header.read(8), byteorder) if version == BLOCK_VERSION else None
+        lengths = header.read(256)
+        # 由码长重建范式霍夫曼码，相同码本的解码器（及其查找表）从缓存复用
+        codec = codec_cache.get(codec_cache.content_key(b'decode', lengths), lambda: HuffmanCodec.from_lengths(
+            {np.uint8(symbol): lengths[symbol] for symbol in range(256)}))
+        return codec, source_len, table_bits, block_size
 
-    # 打开输出文件并写入头部和编码后的数据
-    with open(out_file_name, 'wb') as out_file:
-        out_file.write(header)  # 写入头部
-        out_file.write(encoded)  # 写入编码数据
+    # 解析码本信息
+    source_len = int.from_bytes(header.read(4), byteorder)  # 读取源数据长度
+    codebook_bytes = header.read()
 
-    return (len(source), len(encoded))  # 返回源数据的长度和编码后的数据长度
+    def build():
+        codebook = {}
+        words = io.BytesIO(codebook_bytes)
+        # 读取每个符号的编码信息并更新码本
+        for k in range(symbol_count + 1):
+            symbol = np.uint8(words.read(1)[0])  # 读取符号
+            word_len = words.read(1)[0]  # 读取编码长度（单位：bit）
+            word_bytes = int(np.ceil(word_len / 8))  # 计算编码字节长度
+            word = int.from_bytes(words.read(word_bytes), byteorder)  # 读取编码字节并转换为整数
+            codebook[symbol] = (word_len, word)  # 将符号和编码信息添加到码本中
+        return HuffmanCodec(codebook)
+
+    codec = codec_cache.get(codec_cache.content_key(b'decode', symbol_count, byteorder, codebook_bytes), build)
+    return codec, source_len, TABLE_BITS, None
 
 
 # 解码函数
-def decode(in_file_name, out_file_name, byteorder = 'little'):
+def decode(in_file_name, out_file_name, byteorder = 'little', method='table', workers=1, chunk=None):
     # 字节序
     # 打开输入文件进行读取
     with open(in_file_name, 'rb') as in_file:
@@ -117,30 +531,131 @@ def decode(in_file_name, out_file_name, byteorder = 'little'):
             return 0, 0
         in_file.seek(0, 0)
         header_size = int.from_bytes(in_file.read(2), byteorder)  # 读取头部的大小
-        header = io.BytesIO(in_file.read(header_size - 2))  # 读取头部数据（去掉前2字节）
-        encoded = in_file.read()  # 读取编码后的数据
-
-    # 解析码本信息
-    codebook = {}
-    symbol_count = header.read(1)[0]  # 读取符号计数
-    source_len = int.from_bytes(header.read(4), byteorder)  # 读取源数据长度
-
-    # 读取每个符号的编码信息并更新码本
-    for k in range(symbol_count + 1):
-        symbol = np.uint8(header.read(1)[0])  # 读取符号
-        word_len = header.read(1)[0]  # 读取编码长度（单位：bit）
-        word_bytes = int(np.ceil(word_len / 8))  # 计算编码字节长度
-        word = int.from_bytes(header.read(word_bytes), byteorder)  # 读取编码字节并转换为整数
-        codebook[symbol] = (word_len, word)  # 将符号和编码信息添加到码本中
-
-    # 使用霍夫曼解码器进行解码
-    codec = HuffmanCodec(codebook)
-    decoded = np.asarray(codec.decode(encoded))[:source_len]  # 解码并截取源数据长度
+        header = in_file.read(header_size - 2)  # 读取头部数据（去掉前2字节）
+        if header[:2] == bytes((0, EXTENSION_VERSION)):
+            return decode_extension(in_file, header, out_file_name, byteorder)
+        # 解析码本信息，使用霍夫曼解码器进行解码
+        codec, source_len, table_bits, block_size = read_header(header, byteorder)
+        if block_size is None and chunk is not None:
+            # 流式解码：按 chunk 字节读取编码数据，解码结果写入预先分配的源数据长度的输出文件
+            return decode_chunked(in_file, codec, source_len, table_bits, out_file_name, method, chunk)
+        if block_size is None:
+            encoded = in_file.read()  # 读取编码后的数据
+    if block_size is not None:
+        return decode_blocks(in_file_name, out_file_name, byteorder, method, workers)
+
+    decoded = decode_payload(codec, encoded, source_len, table_bits, method)
     decoded.tofile(out_file_name)  # 将解码后的数据写入输出文件
 
     return (len(encoded), len(decoded))  # 返回编码数据的长度和解码后的数据长度
 
 
+def decode_extension(in_file, header, out_file_name, byteorder='little'):
+    """
+    解码版本5文件（in_file 位于固定文件头之后）：重建（或从缓存取得）码本，解码符号并拆回字节。
+    """
+    order, max_length, mode = header[2:5]
+    source_len = int.from_bytes(header[5:13], byteorder)
+    book_len = int.from_bytes(header[13:17], byteorder)
+    codec = load_extension_codec(in_file.read(book_len), byteorder, order, max_length, mode)
+    encoded = in_file.read()
+    symbols = codec.decode_array(encoded, -(-source_len // order), bits=EXTENSION_TABLE_BITS)
+    decoded = unpack_symbols(symbols, order, source_len)
+    decoded.tofile(out_file_name)
+    return (len(encoded), len(decoded))
+
+
+def decode_chunked(in_file, codec, source_len, table_bits, out_file_name, method='table', chunk=1 << 20):
+    """
+    从 in_file 的当前位置流式解码到输出文件：输出文件用 memmap 映射为 source_len 字节，逐段填入，
+    内存只与 chunk 有关。返回 (编码数据长度, 解码长度)。
+    """
+    if method != 'table':
+        raise ValueError("Chunked decoding needs method 'table', got %s." % method)
+    start = in_file.tell()
+    with open(out_file_name, 'wb') as out_file:
+        out_file.truncate(source_len)
+    decoded_len = 0
+    if source_len:
+        decoded = np.memmap(out_file_name, dtype=np.uint8, mode='r+', shape=(source_len,))
+        for symbols in codec.decode_table_stream(read_chunks(in_file, chunk), bits=table_bits, count=source_len):
+            decoded[decoded_len:decoded_len + len(symbols)] = np.frombuffer(symbols, dtype=np.uint8)
+            decoded_len += len(symbols)
+        decoded.flush()
+        del decoded
+    return (in_file.tell() - start, decoded_len)
+
+
+def decode_payload(codec, encoded, count, table_bits=TABLE_BITS, method='table') -> np.ndarray:
+    if method == 'table':
+        # 多比特查表解码，每次查表得到一个或多个完整符号，解码到源数据长度为止
+        return np.frombuffer(codec.decode_table(encoded, concat=bytes, count=count, bits=table_bits), dtype=np.uint8)
+    elif method == 'bitwise':
+        return np.asarray(codec.decode(encoded), dtype=np.uint8)[:count]  # 解码并截取源数据长度
+    else:
+        raise ValueError("Unknown decode method: %s." % method)
+
+
+def read_block_index(in_file, byteorder='little'):
+    """
+    读取分块文件的文件头和块索引，返回 (解码器, 源数据长度, 查找表位数, 块大小, 各块在文件中的起止偏移)。
+    """
+    in_file.seek(0)
+    header_size = int.from_bytes(in_file.read(2), byteorder)
+    codec, source_len, table_bits, block_size = read_header(in_file.read(header_size - 2), byteorder)
+    if block_size is None:
+        raise ValueError("Not a block-mode encoded file.")
+    count = -(-source_len // block_size)
+    ends = np.frombuffer(in_file.read(count * 8), dtype=index_dtype(byteorder)).astype(np.int64)
+    bounds = header_size + count * 8 + np.concatenate(([0], ends))
+    return codec, source_len, table_bits, block_size, bounds
+
+
+def decode_blocks(in_file_name, out_file_name, byteorder='little', method='table', workers=1):
+    """
+    并行解码分块文件：输出文件预先分配为源数据长度，workers 个进程各解码一段连续的块，写入输出文件中对应的位置。
+    """
+    with open(in_file_name, 'rb') as in_file:
+        codec, source_len, table_bits, block_size, bounds = read_block_index(in_file, byteorder)
+    with open(out_file_name, 'wb') as out_file:
+        out_file.truncate(source_len)
+    blocks = len(bounds) - 1
+    ranges = max(1, min(workers or os.cpu_count() or 1, blocks))
+    jobs = ((blocks * k // ranges, blocks * (k + 1) // ranges, in_file_name, out_file_name, byteorder, method)
+            for k in range(ranges))
+    for _ in map_blocks(decode_block_range, jobs, workers):
+        pass
+    return (int(bounds[-1] - bounds[0]), source_len)
+
+
+def decode_block_range(first, last, in_file_name, out_file_name, byteorder='little', method='table'):
+    """
+    解码第 [first, last) 块，写入输出文件中对应的位置。
+    """
+    with open(in_file_name, 'rb') as in_file, open(out_file_name, 'r+b') as out_file:
+        codec, source_len, table_bits, block_size, bounds = read_block_index(in_file, byteorder)
+        for k in range(first, last):
+            in_file.seek(bounds[k])
+            encoded = in_file.read(bounds[k + 1] - bounds[k])
+            count = min(block_size, source_len - k * block_size)
+            out_file.seek(k * block_size)
+            decode_payload(codec, encoded, count, table_bits, method).tofile(out_file)
+
+
+def decode_block(in_file_name, index, byteorder='little', method='table') -> np.ndarray:
+    """
+    随机访问：只读取文件头、块索引和第 index 块的编码数据，返回这一块的源数据。
+    """
+    with open(in_file_name, 'rb') as in_file:
+        codec, source_len, table_bits, block_size, bounds = read_block_index(in_file, byteorder)
+        if not 0 <= index < len(bounds) - 1:
+            raise IndexError("Block %d out of range (%d blocks)." % (index, len(bounds) - 1))
+        in_file.seek(bounds[index])
+        encoded = in_file.read(bounds[index + 1] - bounds[index])
+    count = min(block_size, source_len - index * block_size)
+    return decode_payload(codec, encoded, count, table_bits, method)
+
+
 # 文件比较函数，比较两个文件的差异
 def compare_file(file_name_1, file_name_2):
     """Compare two files and count number of different bytes."""
@@ -165,6 +680,21 @@ def test_flow():
     exit(0)
 
 
+def bench_flow(name='codec'):
+    import byteSourceCoderTest
+    benchmarks = dict(
+        codec=byteSourceCoderTest.benchmark,
+        construction=byteSourceCoderTest.benchmark_construction,
+        limit=byteSourceCoderTest.limit_report,
+        blocks=byteSourceCoderTest.benchmark_blocks,
+        extension=byteSourceCoderTest.benchmark_extension,
+    )
+    for key in (benchmarks if name == 'all' else [name]):
+        print('\nbenchmark %s:' % key)
+        benchmarks[key]()
+    exit(0)
+
+
 def parse_cmd_args():
     parser = argparse.ArgumentParser(description="Lossless source coder for encoding and decoding.")
     subparsers = parser.add_subparsers(dest='command', help='Sub-command to run (encode or decode)')
@@ -174,11 +704,23 @@ def parse_cmd_args():
     parser_encode.add_argument('PMF', nargs='?', help='Path to probability mass function CSV file')
     parser_encode.add_argument('INPUT', nargs='?', help='Path to the encoder input file')
     parser_encode.add_argument('OUTPUT', nargs='?', help='Path to the encoder output file')
+    parser_encode.add_argument('--header', type=int, choices=(1, 2), default=2,
+                               help='Header version, 1 stores the codewords, 2 only the canonical code lengths (default: 2)')
+    parser_encode.add_argument('-L', '--max-length', type=int, default=None,
+                               help='Limit codewords to L bits (package-merge), written as header version 3')
+    parser_encode.add_argument('--block-size', type=int, default=None,
+                               help='Encode blocks of this many source bytes independently (header version 4)')
+    parser_encode.add_argument('-k', '--order', type=int, choices=(1, 2, 3), default=1,
+                               help='Code every k source bytes as one symbol (k-th order extension, header version 5)')
+    parser_encode.add_argument('--measure', action='store_true',
+                               help='Build the extension code from symbol counts of the input instead of the PMF')
 
     # Decode sub-command
     parser_decode = subparsers.add_parser('decode', help='Decode an encoded file')
     parser_decode.add_argument('INPUT',  nargs='?', help='Path to the decoder input file')
     parser_decode.add_argument('OUTPUT',  nargs='?', help='Path to the decoder output file')
+    parser_decode.add_argument('--block', type=int, default=None,
+                               help='Decode only this block of a block-mode file (random access)')
 
     # Compare sub-command
     parser_compare = subparsers.add_parser('compare', help='Compare source file and decoded file')
@@ -186,19 +728,40 @@ def parse_cmd_args():
     parser_compare.add_argument('OUTPUT',  nargs='?', help='Path to the decoded file')
 
     parser.add_argument('-t', '--test', action='store_true', help='Check test flow and state')
+    parser.add_argument('-b', '--bench', nargs='?', const='codec', choices=BENCHMARKS, default=None,
+                        help='Run a benchmark: codec (throughput of coding methods, default), construction '
+                             '(code table construction time), limit (cost of length-limited codes), blocks '
+                             '(block mode vs single stream), extension (k-th order extension coding), or all')
     parser.add_argument('-v', '--verbose', action='store_true', help='Show message')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='Number of processes for block-mode encoding and decoding, 0 for all cores (default: 1)')
+    parser.add_argument('--chunk', type=int, default=1 << 20,
+                        help='Bytes read at a time when encoding and decoding a single stream (default: 1 MiB)')
+    parser.add_argument('--cache', metavar='DIR', default=None,
+                        help='Directory of the on-disk codec cache (default: in-process only)')
 
     args = parser.parse_args()
     if args.test:
         test_flow()
+    if args.bench:
+        bench_flow(args.bench)
 
     return dict(
         command=args.command,
-        PMF=args.PMF,
-        INPUT=args.INPUT,
+        PMF=getattr(args, 'PMF', None),
+        INPUT=getattr(args, 'INPUT', None),
         OUTPUT=args.OUTPUT,
-        SOURCE=args.SOURCE,
+        SOURCE=getattr(args, 'SOURCE', None),
         verbose=args.verbose,
+        header=getattr(args, 'header', 2),
+        max_length=getattr(args, 'max_length', None),
+        cache=args.cache,
+        block_size=getattr(args, 'block_size', None),
+        workers=args.workers,
+        block=getattr(args, 'block', None),
+        chunk=args.chunk,
+        order=getattr(args, 'order', 1),
+        measure=getattr(args, 'measure', False),
     )
 
 
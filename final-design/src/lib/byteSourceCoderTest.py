@@ -1,8 +1,15 @@
 import os
 import csv
+import shutil
+import time
+import tracemalloc
 import numpy as np
-from byteSourceCoder import encode, decode, compare_file
+import dahuffman
+from dahuffman_no_EOF import HuffmanCodec
+import byteSourceCoder
+from byteSourceCoder import encode, decode, decode_block, compare_file
 import calcCodecInfo
+from byteSource import generate
 
 
 # 测试模块
@@ -31,6 +38,12 @@ def read_header_size(path):
         return int.from_bytes(f.read(2), 'little')
 
 
+def write_pmf(path, pmf):
+    # PMF 文件：每行为 符号,概率
+    with open(path, 'w', newline='') as f:
+        csv.writer(f, quoting=csv.QUOTE_NONE).writerows((i, pmf[i]) for i in range(len(pmf)))
+
+
 class NAMESPACE:
     test_data_dir: str='.'
     pmf_file_name: str
@@ -135,12 +148,304 @@ def test_flow():
             assert requal(float(result[6]),8.0, 0)
         assert diff_total==0, "源文件和解码文件应完全相同"
 
+    def test_table_decoder(self):
+        # 查表解码与逐比特解码结果相同（含超过查表位数的长码字、EOF 符号和非字节符号）
+        skewed = generate([0.9])[0].astype(np.float64)
+        for pmf in (skewed, np.full(256, 1 / 256), np.r_[skewed[:200], np.zeros(56)]):
+            pmf = pmf / pmf.sum()
+            codec = HuffmanCodec.from_frequencies({np.uint8(i): float(pmf[i]) for i in range(256)})
+            source = np.random.choice(256, size=10000, p=pmf).astype(np.uint8)
+            encoded = codec.encode(source)
+            expected = list(codec.decode(encoded))
+            for k in (1, 8, 12, 16):
+                assert list(codec.decode_table(encoded, bits=k)) == expected
+                assert bytes(codec.decode_table(encoded, bits=k, count=len(source))) == source.tobytes()
+        text = 'abracadabra, hello world' * 20
+        codec = dahuffman.HuffmanCodec.from_data(text)
+        assert codec.decode_table(codec.encode(text), bits=3) == text
+        # 文件解码的两种方法结果相同
+        source = np.random.choice(256, size=10000, p=skewed / skewed.sum()).astype(np.uint8)
+        source.tofile(self.source_file_name)
+        write_pmf(self.pmf_file_name, skewed)
+        encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name)
+        for method in ('table', 'bitwise'):
+            decode(self.encoded_file_name, self.decoded_file_name, method=method)
+            assert compare_file(self.source_file_name, self.decoded_file_name) == 0
+
+    def test_array_encoder(self):
+        # 向量化编码与逐符号编码的输出逐比特相同（含超过56比特、需要分段的长码字和末尾的填充）
+        skewed = generate([0.9])[0].astype(np.float64)
+        for pmf in (skewed, np.full(256, 1 / 256), np.r_[skewed[:200], np.zeros(56)]):
+            pmf = pmf / pmf.sum()
+            codec = HuffmanCodec.from_frequencies({np.uint8(i): float(pmf[i]) for i in range(256)})
+            source = np.random.choice(256, size=10000, p=pmf).astype(np.uint8)
+            source[:256] = np.arange(256)
+            for n in (10000, 9, 1, 0):
+                assert codec.encode_array(source[:n]) == codec.encode(source[:n])
+        codec = dahuffman.HuffmanCodec.from_frequencies({i: 1 / (i + 1) ** 2 for i in range(1000)})
+        source = np.random.randint(0, 1000, size=5000)
+        assert codec.encode_array(source) == codec.encode(source.tolist())
+        # 只有一个符号的字母表：码长为 0，编码为空，按符号个数解码
+        codec = HuffmanCodec.from_frequencies({np.uint8(0): 1.0})
+        for n in (0, 1, 100):
+            source = np.zeros(n, dtype=np.uint8)
+            assert codec.encode_array(source) == codec.encode(source) == b''
+            assert codec.decode_table(b'', concat=bytes, count=n) == source.tobytes()
+            assert b''.join(codec.decode_table_stream([b''], count=n)) == source.tobytes()
+        encoded = []
+        for method in ('array', 'streaming'):
+            encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name, method=method)
+            with open(self.encoded_file_name, 'rb') as f:
+                encoded.append(f.read())
+        assert encoded[0] == encoded[1]
+
+    def test_canonical_header(self):
+        # 范式霍夫曼码：码长与原霍夫曼码相同，文件头只保存码长；两种文件头版本都能解码
+        skewed = generate([0.9])[0].astype(np.float64)
+        pmf = {np.uint8(i): float(skewed[i]) for i in range(256)}
+        codec = HuffmanCodec.from_frequencies(pmf)
+        canonical = HuffmanCodec.from_frequencies(pmf, canonical=True)
+        lengths = {s: b for s, (b, v) in canonical.get_code_table().items()}
+        assert lengths == {s: b for s, (b, v) in codec.get_code_table().items()}
+        assert HuffmanCodec.from_lengths(lengths).get_code_table() == canonical.get_code_table()
+        words = sorted(bin(v)[2:].zfill(b) for b, v in canonical.get_code_table().values())
+        assert all(not b.startswith(a) for a, b in zip(words, words[1:]))  # 前缀码
+
+        source = np.random.choice(256, size=1000, p=skewed / skewed.sum()).astype(np.uint8)
+        source.tofile(self.source_file_name)
+        write_pmf(self.pmf_file_name, skewed)
+        header_sizes = []
+        for version in (1, 2):
+            encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name, version=version)
+            header_sizes.append(read_header_size(self.encoded_file_name))
+            for method in ('table', 'bitwise'):
+                decode(self.encoded_file_name, self.decoded_file_name, method=method)
+                assert compare_file(self.source_file_name, self.decoded_file_name) == 0
+        print('header size: %d B (codewords), %d B (canonical)' % tuple(header_sizes))
+        assert header_sizes[1] == 2 + 2 + 8 + 256 < header_sizes[0]
+
+    def test_sort_construction(self):
+        # 排序 + 双队列构造：平均码长与堆构造相同（最优），码字为范式码，可正确编解码
+        for n in (2, 3, 256, 5000):
+            weights = np.random.rand(n) ** 3
+            pmf = {i: float(weights[i]) for i in range(n)}
+            costs = []
+            for method in ('heap', 'sort'):
+                table = dahuffman.HuffmanCodec.from_frequencies(pmf, method=method).get_code_table()
+                costs.append(sum(f * table[s][0] for s, f in pmf.items()))
+            assert abs(costs[0] - costs[1]) <= 1e-9 * costs[0]
+            lengths = dahuffman.huffman_code_lengths(weights)
+            assert (2.0 ** -lengths.astype(float)).sum() == 1  # 满二叉树
+        codec = dahuffman.HuffmanCodec.from_frequencies(pmf, method='sort')
+        assert codec.get_code_table() == dahuffman.canonical_code_table(
+            {s: b for s, (b, v) in codec.get_code_table().items()})
+        source = np.random.randint(0, n, size=2000).tolist()
+        assert codec.decode(codec.encode(source)) == source
+        assert list(dahuffman.huffman_code_lengths([1, 2, 4, 8])) == [3, 3, 2, 1]
+
+    def test_length_limited(self):
+        # 限长霍夫曼码：码长不超过 L，满足 Kraft 等式，L 足够大时与无约束霍夫曼码等长；版本3文件头记录 L
+        assert list(dahuffman.limited_code_lengths([1, 2, 4, 8], 2)) == [2, 2, 2, 2]
+        assert list(dahuffman.limited_code_lengths([1, 2, 4, 8], 3)) == [3, 3, 2, 1]
+        skewed = generate([0.9])[0].astype(np.float64)
+        weights = np.r_[skewed[:200], np.zeros(56)]
+        free = dahuffman.huffman_code_lengths(weights)
+        assert free.max() > 16
+        for max_length in (8, 12, 16):
+            lengths = dahuffman.limited_code_lengths(weights, max_length)
+            assert lengths.max() <= max_length and (2.0 ** -lengths.astype(float)).sum() == 1
+            assert (weights * lengths).sum() >= (weights * free).sum()
+        assert np.array_equal(dahuffman.limited_code_lengths(skewed, 64), dahuffman.huffman_code_lengths(skewed))
+        try:
+            dahuffman.limited_code_lengths(skewed, 7)
+            assert False
+        except ValueError:
+            pass
+
+        source = np.random.choice(256, size=2000, p=skewed / skewed.sum()).astype(np.uint8)
+        source[:200] = np.arange(200)
+        source.tofile(self.source_file_name)
+        write_pmf(self.pmf_file_name, weights)
+        encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name, max_length=12)
+        assert read_header_size(self.encoded_file_name) == 2 + 2 + 1 + 8 + 256
+        with open(self.encoded_file_name, 'rb') as f:
+            assert f.read(5)[2:] == bytes((0, 3, 12))
+        for method in ('table', 'bitwise'):
+            decode(self.encoded_file_name, self.decoded_file_name, method=method)
+            assert compare_file(self.source_file_name, self.decoded_file_name) == 0
+        # L 超过查找表位数上限时，解码用 16 位一级表加二级表
+        for max_length in (17, 20, 24):
+            for options in (dict(), dict(chunk=100), dict(block_size=500)):
+                encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name, max_length=max_length,
+                       **options)
+                decode(self.encoded_file_name, self.decoded_file_name, chunk=options.get('chunk'))
+                assert compare_file(self.source_file_name, self.decoded_file_name) == 0
+
+    def test_codec_cache(self):
+        # 编解码器缓存：二进制码表文件可还原码表；同一 PMF 只构建一次；磁盘缓存跨进程复用并按 LRU 淘汰
+        codec = HuffmanCodec.from_frequencies({np.uint8(i): float(i + 1) for i in range(256)}, canonical=True)
+        path = os.path.join(self.test_data_dir, '_codec.tmp')
+        codec.save(path, binary=True)
+        loaded = dahuffman.PrefixCodec.load(path)
+        assert type(loaded) is HuffmanCodec and list(loaded.get_code_table()) == list(codec.get_code_table())
+        assert loaded.get_code_table() == codec.get_code_table()
+        os.remove(path)
+
+        cache_dir = os.path.join(self.test_data_dir, '_cache')
+        cache = byteSourceCoder.set_cache(cache_dir, maxsize=2, max_files=2)
+        np.random.randint(0, 256, size=1000).astype(np.uint8).tofile(self.source_file_name)
+        pmfs = [np.random.rand(256) for _ in range(3)]
+        for k in (0, 1, 2, 0, 0):
+            write_pmf(self.pmf_file_name, pmfs[k])
+            encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name)
+            decode(self.encoded_file_name, self.decoded_file_name)
+            assert compare_file(self.source_file_name, self.decoded_file_name) == 0
+        # 编码、解码各 4 次未命中（第 4 次时 PMF 0 已被挤出内存和磁盘），第 5 次均命中内存
+        assert (cache.misses, cache.hits, cache.disk_hits) == (8, 2, 0)
+        assert len(os.listdir(cache_dir)) == 2
+        cache.clear()  # 模拟新进程：只剩磁盘缓存
+        encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name)
+        decode(self.encoded_file_name, self.decoded_file_name)
+        assert cache.disk_hits == 2 and compare_file(self.source_file_name, self.decoded_file_name) == 0
+        byteSourceCoder.set_cache()
+        shutil.rmtree(cache_dir)
+
+    def test_block_mode(self):
+        # 分块编码：各块独立编码，并行编解码结果与串行相同，可随机访问任意一块；整流格式仍可解码
+        skewed = generate([0.9])[0].astype(np.float64)
+        write_pmf(self.pmf_file_name, skewed)
+        source = np.random.choice(256, size=10000, p=skewed / skewed.sum()).astype(np.uint8)
+        source.tofile(self.source_file_name)
+        for block_size, max_length in ((1000, None), (3333, 12), (1 << 20, None)):
+            encoded = []
+            for workers in (1, 2):
+                (source_len, encoded_len) = encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name,
+                                                   block_size=block_size, max_length=max_length, workers=workers)
+                with open(self.encoded_file_name, 'rb') as f:
+                    encoded.append(f.read())
+                assert source_len == len(source)
+                decode(self.encoded_file_name, self.decoded_file_name, workers=workers)
+                assert compare_file(self.source_file_name, self.decoded_file_name) == 0
+            assert encoded[0] == encoded[1]
+            blocks = -(-len(source) // block_size)
+            assert len(encoded[0]) == read_header_size(self.encoded_file_name) + 8 * blocks + encoded_len
+            for k in (blocks - 1, 0, blocks // 2):
+                assert np.array_equal(decode_block(self.encoded_file_name, k), source[k * block_size:][:block_size])
+        decode(self.encoded_file_name, self.decoded_file_name, method='bitwise')
+        assert compare_file(self.source_file_name, self.decoded_file_name) == 0
+        try:
+            decode_block(self.encoded_file_name, 1)
+            assert False
+        except IndexError:
+            pass
+
+    def test_chunked(self):
+        # 流式编解码：结果与整文件编解码逐字节相同，各种 chunk 大小（含 1 字节）都能跨段衔接；内存只与 chunk 有关
+        skewed = generate([0.9])[0].astype(np.float64)
+        write_pmf(self.pmf_file_name, skewed)
+        source = np.random.choice(256, size=5000, p=skewed / skewed.sum()).astype(np.uint8)
+        source.tofile(self.source_file_name)
+        for version, max_length in ((1, None), (2, None), (2, 12)):
+            encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name, version=version,
+                   max_length=max_length)
+            with open(self.encoded_file_name, 'rb') as f:
+                whole = f.read()
+            for chunk in (1, 7, 4096):
+                encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name, version=version,
+                       max_length=max_length, chunk=chunk)
+                with open(self.encoded_file_name, 'rb') as f:
+                    assert f.read() == whole
+                (encoded_len, decoded_len) = decode(self.encoded_file_name, self.decoded_file_name, chunk=chunk)
+                assert decoded_len == len(source) and encoded_len == len(whole) - read_header_size(self.encoded_file_name)
+                assert compare_file(self.source_file_name, self.decoded_file_name) == 0
+
+        source = np.random.choice(256, size=1 << 22, p=skewed / skewed.sum()).astype(np.uint8)
+        source.tofile(self.source_file_name)
+        chunk = 1 << 14
+        peaks = []
+        for step in ('encode', 'decode'):
+            tracemalloc.start()
+            if step == 'encode':
+                encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name, chunk=chunk)
+            else:
+                decode(self.encoded_file_name, self.decoded_file_name, chunk=chunk)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        print('peak memory (4 MiB source, 16 KiB chunks): encode %d KiB, decode %d KiB' % tuple(p >> 10 for p in peaks))
+        assert max(peaks) < 100 * chunk < len(source) // 2  # 每个分段符号几十字节的临时数组，与文件大小无关
+        assert compare_file(self.source_file_name, self.decoded_file_name) == 0
+
+    def test_extension(self):
+        # k 阶扩展编码：打包/拆包互逆，PMF 扩展或统计频数建码都能还原（含长度不是 k 的倍数的信源），
+        # 扩展 PMF 的平均码长随 k 不增，且不低于熵；k=1 的 PMF 扩展与单字节范式霍夫曼码码长相同
+        pmf = generate([0.9])[0].astype(np.float64)
+        write_pmf(self.pmf_file_name, pmf)
+        source = np.random.choice(256, size=3001, p=pmf / pmf.sum()).astype(np.uint8)
+        for k in (1, 2, 3):
+            symbols = byteSourceCoder.pack_symbols(source, k)
+            assert len(symbols) == -(-len(source) // k) and symbols.max() < 256 ** k
+            assert np.array_equal(byteSourceCoder.unpack_symbols(symbols, k, len(source)), source)
+        assert requal(byteSourceCoder.extension_pmf(pmf, 3).sum(), pmf.sum() ** 3)
+        weights = pmf / pmf.sum()
+        entropy = -np.sum(weights * np.log2(weights))
+        means = []
+        for k in (1, 2):
+            codec = dahuffman.CanonicalCodec.from_weights(byteSourceCoder.extension_pmf(weights, k))
+            means.append(np.dot(byteSourceCoder.extension_pmf(weights, k), codec.lengths) / k)
+            assert entropy <= means[-1] < entropy + 1 / k
+        assert means[1] <= means[0]
+        reference = HuffmanCodec.from_frequencies({np.uint8(i): weights[i] for i in range(256)}, canonical=True)
+        lengths = dahuffman.CanonicalCodec.from_weights(weights).lengths
+        assert sorted(lengths.tolist()) == sorted(b for b, v in reference.get_code_table().values())
+        for size in (1, 2, 1000, len(source)):
+            source[:size].tofile(self.source_file_name)
+            for k, measure, max_length in ((1, False, None), (2, False, None), (2, True, 12), (3, True, None)):
+                (source_len, encoded_len) = encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name,
+                                                   order=k, measure=measure, max_length=max_length)
+                assert source_len == size
+                (encoded_len2, decoded_len) = decode(self.encoded_file_name, self.decoded_file_name)
+                assert (encoded_len2, decoded_len) == (encoded_len, size)
+                assert compare_file(self.source_file_name, self.decoded_file_name) == 0
+        for options in (dict(order=4), dict(order=2, max_length=300)):
+            try:
+                encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name, **options)
+                assert False
+            except ValueError:
+                pass
+        # PMF 中概率为 0 的字节出现在信源中：与单字节编码一样可以编码
+        pmf[5] = 0.
+        write_pmf(self.pmf_file_name, pmf)
+        source[:3] = 5
+        source.tofile(self.source_file_name)
+        for k in (1, 2):
+            encode(self.pmf_file_name, self.source_file_name, self.encoded_file_name, order=k)
+            decode(self.encoded_file_name, self.decoded_file_name)
+            assert compare_file(self.source_file_name, self.decoded_file_name) == 0
+
     print('\ntest_uniform_distribution:'.title())
     test_uniform_distribution(namespace)
     print('\ntest_empty_file:'.title())
     test_empty_file(namespace)
     print('\ntest_unmapped_distribution:'.title())
     test_unmapped_distribution(namespace)
+    print('\ntest_table_decoder:'.title())
+    test_table_decoder(namespace)
+    print('\ntest_array_encoder:'.title())
+    test_array_encoder(namespace)
+    print('\ntest_canonical_header:'.title())
+    test_canonical_header(namespace)
+    print('\ntest_sort_construction:'.title())
+    test_sort_construction(namespace)
+    print('\ntest_length_limited:'.title())
+    test_length_limited(namespace)
+    print('\ntest_codec_cache:'.title())
+    test_codec_cache(namespace)
+    print('\ntest_block_mode:'.title())
+    test_block_mode(namespace)
+    print('\ntest_chunked:'.title())
+    test_chunked(namespace)
+    print('\ntest_extension:'.title())
+    test_extension(namespace)
     # 删除临时文件
     if os.path.exists(namespace.encoded_file_name):
         os.remove(namespace.encoded_file_name)
@@ -154,5 +459,143 @@ def test_flow():
         os.remove(namespace.csv_file_name)
 
 
+def benchmark(msg_len=1 << 18, repeat=3):
+    """
+    比较编码、解码方法的吞吐量（信源 MB/s），不含文件读写。
+    """
+    for p0 in (0.1, 0.5):
+        pmf = generate([1 - p0])[0].astype(np.float64)
+        pmf /= pmf.sum()
+        codec = HuffmanCodec.from_frequencies({np.uint8(i): float(pmf[i]) for i in range(256)})
+        source = np.random.choice(256, size=msg_len, p=pmf).astype(np.uint8)
+        encoded = codec.encode(source)
+        methods = {
+            'encode streaming': lambda: codec.encode(source),
+            'encode array': lambda: codec.encode_array(source),
+            'bitwise': lambda: codec.decode(encoded),
+            'table-8': lambda: codec.decode_table(encoded, bits=8, count=msg_len),
+            'table-12': lambda: codec.decode_table(encoded, bits=12, count=msg_len),
+            'table-16': lambda: codec.decode_table(encoded, bits=16, count=msg_len),
+        }
+        for name, method in methods.items():
+            method()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                method()
+            elapsed = (time.perf_counter() - start) / repeat
+            print('p0=%.1f %-16s %7.2f MB/s' % (p0, name if name.startswith('encode') else 'decode ' + name,
+                                                msg_len / elapsed / 1e6))
+
+
+def benchmark_construction(sizes=(1 << 8, 10 ** 4, 10 ** 5, 10 ** 6)):
+    """
+    比较大字母表霍夫曼码表的构造时间：堆合并（仅到 1e5）与排序 + 双队列。
+    """
+    for n in sizes:
+        pmf = dict(enumerate(np.random.rand(n).tolist()))
+        for method in ('heap', 'sort'):
+            if method == 'heap' and n > 10 ** 5:
+                continue
+            start = time.perf_counter()
+            dahuffman.HuffmanCodec.from_frequencies(pmf, method=method)
+            print('n=%-8d %-5s %8.3f s' % (n, method, time.perf_counter() - start))
+
+
+def limit_report(msg_len=1 << 18, max_lengths=(None, 16, 12, 10, 8)):
+    """
+    限长霍夫曼码的代价：平均码长（比特/字节）相对无约束霍夫曼码的增加，以及一级查找表解码的吞吐量。
+    PMF 由 byteSource.generate 给出，包括概率为 0 的符号所在的 byteSourceCoder 码表。
+    """
+    for p0 in (0.05, 0.1, 0.3):
+        pmf = {np.uint8(i): float(p) for i, p in enumerate(generate([1 - p0])[0])}
+        source = np.random.choice(256, size=msg_len, p=np.array(list(pmf.values())) / sum(pmf.values()))
+        source = source.astype(np.uint8)
+        free = None
+        for max_length in max_lengths:
+            codec = HuffmanCodec.from_frequencies(pmf, canonical=True, max_length=max_length)
+            table = codec.get_code_table()
+            mean = sum(p * table[s][0] for s, p in pmf.items()) / sum(pmf.values())
+            free = free or mean
+            encoded = codec.encode_array(source)
+            bits = max_length or 12
+            codec.decode_table(encoded, bits=bits, count=msg_len)
+            start = time.perf_counter()
+            codec.decode_table(encoded, bits=bits, count=msg_len)
+            elapsed = time.perf_counter() - start
+            print('p0=%.2f L=%-4s max %2d bits  %.4f bit/B  +%.3f%%  decode table-%d %6.2f MB/s' % (
+                p0, max_length or '-', max(b for b, v in table.values()), mean, (mean / free - 1) * 100,
+                bits, msg_len / elapsed / 1e6))
+
+
+def benchmark_blocks(msg_len=1 << 24, block_size=1 << 20, workers=(1, 0), test_data_dir='.'):
+    """
+    分块模式与整流格式的文件编解码吞吐量（信源 MB/s）和文件大小。workers 为 0 时使用全部核。
+    """
+    pmf = generate([0.9])[0].astype(np.float64)
+    pmf_file_name = os.path.join(test_data_dir, '_bench_pmf.csv')
+    source_file_name = os.path.join(test_data_dir, '_bench_source.tmp')
+    encoded_file_name = os.path.join(test_data_dir, '_bench_encoded.tmp')
+    decoded_file_name = os.path.join(test_data_dir, '_bench_decoded.tmp')
+    write_pmf(pmf_file_name, pmf)
+    np.random.choice(256, size=msg_len, p=pmf / pmf.sum()).astype(np.uint8).tofile(source_file_name)
+    for name, options in [('stream', {})] + [('blocks j=%d' % j, dict(block_size=block_size, workers=j))
+                                             for j in workers]:
+        start = time.perf_counter()
+        encode(pmf_file_name, source_file_name, encoded_file_name, **options)
+        encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        decode(encoded_file_name, decoded_file_name, workers=options.get('workers', 1))
+        decode_time = time.perf_counter() - start
+        assert compare_file(source_file_name, decoded_file_name) == 0
+        print('%-12s %10d B  encode %6.2f MB/s  decode %6.2f MB/s' % (
+            name, os.path.getsize(encoded_file_name), msg_len / encode_time / 1e6, msg_len / decode_time / 1e6))
+    for file_name in (pmf_file_name, source_file_name, encoded_file_name, decoded_file_name):
+        os.remove(file_name)
+
+
+def benchmark_extension(msg_len=1 << 20, orders=(1, 2, 3), test_data_dir='.'):
+    """
+    k 阶扩展编码（版本5文件头）的压缩比（不含文件头）、文件编解码吞吐量（信源 MB/s）和建码时间，压缩比的极限为 1/H(p0)。
+    PMF 由 byteSource.generate 给出；analytic 为 PMF 的 k 次扩展，measured 为数据中统计的符号频数。
+    """
+    p0 = 0.1
+    pmf = generate([1 - p0])[0].astype(np.float64)
+    pmf_file_name = os.path.join(test_data_dir, '_bench_pmf.csv')
+    source_file_name = os.path.join(test_data_dir, '_bench_source.tmp')
+    encoded_file_name = os.path.join(test_data_dir, '_bench_encoded.tmp')
+    decoded_file_name = os.path.join(test_data_dir, '_bench_decoded.tmp')
+    write_pmf(pmf_file_name, pmf)
+    np.random.choice(256, size=msg_len, p=pmf / pmf.sum()).astype(np.uint8).tofile(source_file_name)
+    entropy = -(p0 * np.log2(p0) + (1 - p0) * np.log2(1 - p0))
+    print('p0=%.1f  bound 1/H(p0) = %.4f' % (p0, 1 / entropy))
+    for k in orders:
+        for measure in (False, True):
+            byteSourceCoder.codec_cache.clear()
+            start = time.perf_counter()
+            if measure:
+                symbols = byteSourceCoder.pack_symbols(np.fromfile(source_file_name, dtype=np.uint8), k)
+                dahuffman.CanonicalCodec.from_weights(np.bincount(symbols, minlength=256 ** k),
+                                                      max_length=byteSourceCoder.EXTENSION_MAX_LENGTH)
+            else:
+                # 与编码时的缓存键相同，编码直接取用已构建的码本
+                byteSourceCoder.load_extension_codec(pmf.astype('<f8').tobytes(), 'little', k,
+                                                     byteSourceCoder.EXTENSION_MAX_LENGTH, 0)
+            build_time = time.perf_counter() - start
+            start = time.perf_counter()
+            (source_len, encoded_len) = encode(pmf_file_name, source_file_name, encoded_file_name, order=k,
+                                               measure=measure)
+            encode_time = time.perf_counter() - start
+            start = time.perf_counter()
+            decode(encoded_file_name, decoded_file_name)
+            decode_time = time.perf_counter() - start
+            assert compare_file(source_file_name, decoded_file_name) == 0
+            print('k=%d %-8s ratio %.4f (file %.4f)  build %6.3f s  encode %6.2f MB/s  decode %6.2f MB/s' % (
+                k, 'measured' if measure else 'analytic', source_len / encoded_len,
+                source_len / os.path.getsize(encoded_file_name), build_time, msg_len / encode_time / 1e6,
+                msg_len / decode_time / 1e6))
+    for file_name in (pmf_file_name, source_file_name, encoded_file_name, decoded_file_name):
+        os.remove(file_name)
+
+
 if __name__ == '__main__':
     test_flow()
@@ -5,7 +5,7 @@ import numpy as np
 
 
 
-def quick_test(symbol_prob, p0, hx, redund, msg_len=100000, num_tests=2):
+def quick_test(symbol_prob, p0, hx, redund, msg_len=100000, num_tests=2, method='searchsorted'):
     """
     快速测试生成符号序列的概率分布是否符合给定的概率分布。
 
@@ -13,6 +13,7 @@ def quick_test(symbol_prob, p0, hx, redund, msg_len=100000, num_tests=2):
         symbol_prob (numpy.ndarray): 符号的概率分布。
         msg_len (int): 生成的消息长度（符号数量）。
         num_tests (int): 测试的轮数。
+        method (str): 采样方法。
 
     Returns:
         bool: 测试是否通过。
@@ -28,7 +29,7 @@ def quick_test(symbol_prob, p0, hx, redund, msg_len=100000, num_tests=2):
 
     for _ in range(num_tests):
         # 调用算法函数生成符号序列
-        byteSource.work_flow(symbol_prob, temp_output_path, msg_len, message_state=0)
+        byteSource.work_flow(symbol_prob, temp_output_path, msg_len, message_state=0, method=method)
 
         arr, x_size = calcDMSInfo.read_input(temp_output_path)
         assert msg_len == x_size, 'Except to %d but %s' % (msg_len,x_size)
@@ -65,6 +66,159 @@ def quick_test(symbol_prob, p0, hx, redund, msg_len=100000, num_tests=2):
     return True
 
 
+def compare_methods(symbol_prob, method='alias', msg_len=1000000, alpha=1e-3) -> bool:
+    """
+    卡方检验 method 与 searchsorted 两种采样方法输出的符号频数是否来自同一分布。
+
+    Parameters:
+        symbol_prob (numpy.ndarray): 符号的概率分布。
+        method (str): 与 searchsorted 比较的采样方法。
+        msg_len (int): 每种方法生成的消息长度。
+        alpha (float): 显著性水平。
+
+    Returns:
+        bool: 测试是否通过。
+    """
+    counts = [np.bincount(byteSource.random_sequence(symbol_prob, msg_len, method), minlength=256)
+              for method in ('searchsorted', method)]
+    observed = np.float64(counts)
+    used = observed.sum(axis=0) > 0
+    observed = observed[:, used]
+    expected = observed.sum(axis=0) / 2
+    chi2 = ((observed - expected) ** 2 / expected).sum()
+    dof = used.sum() - 1
+    # Wilson-Hilferty 近似卡方分布的上分位点
+    z = {1e-2: 2.326, 1e-3: 3.090, 1e-4: 3.719}[alpha]
+    critical = dof * (1 - 2 / (9 * dof) + z * np.sqrt(2 / (9 * dof))) ** 3 if dof else 0.
+    if chi2 > critical:
+        print("Chi-square between methods: %.2f > %.2f (dof=%d)" % (chi2, critical, dof))
+        return False
+    return True
+
+
+def stream_test(msg_len=100000, chunk=4096) -> bool:
+    """
+    检查分块流式生成与整体生成在相同随机种子下输出完全相同（含padding）。
+
+    Parameters:
+        msg_len (int): 生成的消息长度。
+        chunk (int): 每块的符号数量，取不整除 msg_len 的值以覆盖最后一个不完整块。
+
+    Returns:
+        bool: 测试是否通过。
+    """
+    prob = byteSource.generate([0.9])[0]
+    paths = ["temp_whole.bin", "temp_stream.bin"]
+    for path, chunk_size in zip(paths, (0, chunk)):
+        np.random.seed(2024)
+        byteSource.work_flow(prob, path, msg_len, message_state=0, chunk=chunk_size, pad=(5, 0, 3, 255))
+    whole, stream = (np.fromfile(path, dtype=np.uint8) for path in paths)
+    for path in paths:
+        os.remove(path)
+    if len(stream) != msg_len + 8 or (stream[:5] != 0).any() or (stream[-3:] != 255).any():
+        print("Stream padding error")
+        return False
+    if not np.array_equal(whole, stream):
+        print("Stream output differs from whole output")
+        return False
+    return True
+
+
+def seed_test(msg_len=50000) -> bool:
+    """
+    检查指定种子时多文件输出可复现，且与并行进程数无关。
+
+    Returns:
+        bool: 测试是否通过。
+    """
+    p0s = '0.1,0.5,0.9'
+    outputs = []
+    for workers in (1, 3):
+        paths = ['temp_seed_%d_%d.bin' % (workers, i) for i in range(3)]
+        byteSource.main(p0s, ';'.join(paths), msg_len, message_state=0, seed=2024, workers=workers, method='alias')
+        outputs.append([np.fromfile(path, dtype=np.uint8) for path in paths])
+        for path in paths:
+            os.remove(path)
+    if not all(np.array_equal(a, b) for a, b in zip(*outputs)):
+        print("Outputs differ between worker counts")
+        return False
+    if np.array_equal(outputs[0][0][:1000], outputs[0][1][:1000]):
+        print("Files share the same random stream")
+        return False
+    return True
+
+
+def memory_benchmark(msg_len=1 << 30, pad=(16, 0, 16, 255)):
+    """
+    比较写出 msg_len 字节消息（含padding）时，旧写法（np.pad + bytearray）与 write_output 的峰值常驻内存（RSS）。
+    每种写法在单独的子进程中运行，报告写出过程使 ru_maxrss 增加的量（不含消息数组本身）。
+
+    Parameters:
+        msg_len (int): 消息长度（字节），默认1 GB。
+        pad (tuple): (pad-left, value-left, pad-right, value-right)。
+    """
+    import subprocess
+    import sys
+    try:
+        import resource  # 仅类 Unix 系统提供
+    except ImportError:
+        print("memory benchmark needs the resource module (Unix only)")
+        return
+    # 子进程的工作目录是本模块所在目录，临时文件用绝对路径，由父进程删除
+    temp_output_path = os.path.abspath("temp_memory.bin")
+    try:
+        for name, mode in (('np.pad + bytearray', 'legacy'), ('write_output', 'write_output')):
+            code = 'import byteSourceTest; byteSourceTest.peak_write_rss(%r, %d, %r, %r)' % (
+                mode, msg_len, tuple(pad), temp_output_path)
+            result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+            print("%-20s peak RSS +%10.1f MB" % (name, float(result.stdout) / 2**20))
+    finally:
+        if os.path.exists(temp_output_path):
+            os.remove(temp_output_path)
+
+
+def peak_write_rss(mode, msg_len, pad, path) -> None:
+    """
+    memory_benchmark 的子进程：生成消息后按 mode 写出，打印写出前后峰值常驻内存之差（字节）。
+    """
+    import resource
+    import sys
+    # Linux 上 ru_maxrss 以 KB 计，macOS 上以字节计
+    unit = 1 if sys.platform == 'darwin' else 1024
+    msg = np.ones(msg_len, dtype=np.uint8)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if mode == 'legacy':
+        padded = np.pad(msg, (pad[0], pad[2]), constant_values=(pad[1], pad[3]))
+        with open(path, 'wb') as out_file:
+            out_file.write(bytearray(padded))
+    else:
+        byteSource.write_output(path, msg, pad)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print((after - before) * unit)
+
+
+def benchmark(msg_len=1 << 26, repeat=3):
+    """
+    比较各采样方法的吞吐量（MB/s），以及写出同样长度消息的峰值内存（见 memory_benchmark）。
+
+    Parameters:
+        msg_len (int): 每次生成的消息长度（字节）。
+        repeat (int): 重复次数，取最快一次。
+    """
+    import time
+    for p0 in [0.1, 0.5, 0.99]:
+        prob = byteSource.generate([1. - p0])[0]
+        for method in byteSource.METHODS:
+            best = np.inf
+            for _ in range(repeat):
+                start = time.perf_counter()
+                byteSource.random_sequence(prob, msg_len, method)
+                best = min(best, time.perf_counter() - start)
+            print("p0=%.2f %-12s %8.1f MB/s" % (p0, method, msg_len / best / 2**20))
+    memory_benchmark(msg_len)
+
+
 def test_flow():
     all_tests_passed = True
 
@@ -108,6 +262,34 @@ def test_flow():
             all_tests_passed = False
             print(f"Seed {seed} test failed.")
 
+    # 别名表和二元比特采样方法
+    for method in ['alias', 'bernoulli']:
+        print(f"Testing {method} sampling method:")
+        for p0 in [0.1, 0.5, 0.99]:
+            prob = byteSource.generate([1. - p0])[0]
+            if quick_test(prob, p0, calcDMSInfo.calc_entropy(np.float32([p0, 1-p0])),
+                          calcDMSInfo.calc_redundancy(p0), method=method) and compare_methods(prob, method):
+                print(f"{method} p0={p0} test passed.")
+            else:
+                all_tests_passed = False
+                print(f"{method} p0={p0} test failed.")
+
+    # 分块流式生成
+    print("Testing chunked streaming generation:")
+    if stream_test(chunk=3000):
+        print("Streaming test passed.")
+    else:
+        all_tests_passed = False
+        print("Streaming test failed.")
+
+    # 随机种子与多进程
+    print("Testing seeded parallel generation:")
+    if seed_test():
+        print("Seed test passed.")
+    else:
+        all_tests_passed = False
+        print("Seed test failed.")
+
     # 检查是否所有测试都通过
     if all_tests_passed:
         print("all pass")
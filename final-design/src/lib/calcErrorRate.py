@@ -10,6 +10,8 @@ Header  |LEN  : uint8, code length n, must be odd number and 2 < n < 10
 Payload |codeword sequence : many uint
 End |pad : some bits as 0
 
+Files with a version 2 header (see repetitionCoder, 64-bit source length) are also accepted.
+
 Note: This program is intended for use in course, Principle of Information and Coding Theory.
 2.4.	信道编解码指标计算
 模块输入
@@ -33,6 +35,8 @@ import math
 
 # Non-standard library
 import numpy as np
+from repetitionCoder import parse_header, HEADER_V2_SIZE
+from byteChannel import flip_positions
 
 
 __author__ = "Zhang, Pengyang; Chen, Jin; "
@@ -49,6 +53,10 @@ def main():
     parser.add_argument('DECODE', nargs='?', help='path to input file 3 (after decoding)')
     parser.add_argument('RESULT', nargs='?', help='path to the result CSV file')
     parser.add_argument('--header', action='store_true', help='Disable consider the header')
+    parser.add_argument('--simulate', type=lambda string: (int(string.split(':')[0]), float(string.split(':')[1])),
+                        metavar='LEN:p', help='Write DECODE by sampling Binomial(LEN, p) flips per SOURCE bit, '
+                                              'instead of comparing files (ENCODE and RESULT are ignored)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the --simulate mode')
 
     parser.add_argument('-t', '--test', action='store_true', help='Check test flow and state')
     parser.add_argument('-v', '--verbose', action='store_true', help='Show message')
@@ -58,8 +66,17 @@ def main():
         return test()
 
     SOURCE = path_split(args.SOURCE)
-    ENCODE = path_split(args.ENCODE)
     DECODE = path_split(args.DECODE)
+    if args.simulate:
+        n, p = args.simulate
+        for source_path, decode_path in zip(SOURCE, DECODE):
+            source_len, channel_errors, decoded_errors = binomialSimulate(n, p, source_path, decode_path, args.seed)
+            print(f'Simulated "{os.path.basename(decode_path)}" (n={n}, p={p}):')
+            print(f'Channel Error Rate: {channel_errors / (source_len * 8 * n) if source_len else np.nan:.8f}')
+            print(f'Error Rate: {decoded_errors / (source_len * 8) if source_len else np.nan:.8f} '
+                  f'(theory {theoryCalcError(n, p):.8f})')
+        return
+    ENCODE = path_split(args.ENCODE)
 
     for source_path, encode_path, decode_path in zip(SOURCE, ENCODE, DECODE):
         if args.verbose:
@@ -93,9 +110,9 @@ def compare_files(source_path, encode_path, decode_path, result_path, heading=Fa
 
     compare_size = min(len(source), len(decoded))  # 取较小的文件大小作为比较大小
     if heading:
-        code_len = int(encoded[0])
+        code_len, _, header_size = parse_header(encoded[:HEADER_V2_SIZE])
         assert 3 <= code_len <= 9 and code_len % 2, code_len
-        encoded = encoded[5:]
+        encoded = encoded[header_size:]
     else:
         code_len = 0
 
@@ -189,6 +206,54 @@ def theoryCalcError(n, p):
     return Pe
 
 
+def binomialSimulate(n, p, source_path, decode_path, seed=None, clean=0, chunk=1 << 20):
+    """
+    二项分布捷径仿真：无记忆BSC上多数判决译码时，每个译码比特只取决于它的 n 个副本中翻转的个数，
+    该个数服从 Binomial(n, p)。直接为每个信源比特抽取翻转个数，超过 n//2 则翻转该比特，
+    得到与 编码 -> 信道 -> 译码 完整流程同分布的译码文件和错误统计，随机数少 n 倍，不读写编码流。
+
+    至少一个副本翻转的概率小于 1/32 时，按几何分布的间隔只抽取翻转个数非零的比特位置，
+    再按条件分布抽取其翻转个数，开销与翻转个数成正比。
+
+    n: int, repetition code length
+    p: float, bit error probability of the BSC
+    source_path: str, path to the source (channel encoder input) file
+    decode_path: str, path to the simulated decoded file
+    seed: int, seed of the random generator
+    clean: int, number of leading source bytes transmitted without noise
+    chunk: int, number of source bytes processed at a time
+
+    Returns: (source length in bytes, channel bit errors, decoded bit errors)
+    """
+    theoryCalcError(n, p)  # 检查参数
+    pmf = np.array([binomialCoef(n, k) * pow(p, k) * pow(1 - p, n - k) for k in range(n + 1)])
+    hit = 1. - pmf[0]  # 至少一个副本翻转的概率
+    rng = np.random.default_rng(seed)
+    source_len = os.path.getsize(source_path)
+    channel_errors = decoded_errors = 0
+
+    with open(source_path, 'rb') as source_file, open(decode_path, 'wb') as decode_file:
+        for begin in range(0, source_len, chunk):
+            decoded = np.frombuffer(source_file.read(min(chunk, source_len - begin)), dtype=np.uint8).copy()
+            body = decoded[min(max(clean - begin, 0), len(decoded)):]
+            if hit <= 0.:
+                positions = counts = np.zeros(0, dtype=np.int64)
+            elif hit < 1. / 32:
+                positions = np.concatenate([np.zeros(0, dtype=np.int64), *flip_positions(len(body) * 8, hit, rng)])
+                counts = rng.choice(np.arange(1, n + 1), size=len(positions), p=pmf[1:] / hit)
+            else:
+                counts = rng.binomial(n, p, size=len(body) * 8)
+                positions = np.flatnonzero(counts)
+                counts = counts[positions]
+            flips = positions[counts > n // 2]
+            np.bitwise_xor.at(body, flips >> 3, np.uint8(0x80) >> (flips & 7).astype(np.uint8))
+            decoded.tofile(decode_file)
+            channel_errors += int(counts.sum())
+            decoded_errors += len(flips)
+
+    return (source_len, channel_errors, decoded_errors)
+
+
 # 测试函数
 def test():
     import repetitionCoderTest
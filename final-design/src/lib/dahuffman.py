@@ -1,5 +1,11 @@
+import bisect
 import collections
+import hashlib
+import importlib
 import itertools
+import numbers
+import os
+import struct
 import sys
 from heapq import heappush, heappop, heapify
 
@@ -8,6 +14,8 @@ import pickle
 from pathlib import Path
 from typing import Union, Any
 
+import numpy as np
+
 _log = logging.getLogger(__name__)
 
 
@@ -40,6 +48,12 @@ class _EndOfFileSymbol:
 # Singleton-like "end of file" symbol
 _EOF = _EndOfFileSymbol()
 
+# Binary code table file: magic, format version, concat code, class path, symbols, code lengths, values.
+_BINARY_MAGIC = b'PFXC'
+_BINARY_HEAD = struct.Struct('<4sBBH')
+_BINARY_TABLE = struct.Struct('<IiH')
+_CONCATS = (list, bytes, u''.join)
+
 
 # TODO store/load code table from file
 # TODO Directly encode to and decode from file
@@ -62,6 +76,700 @@ def ensure_dir(path: Union[str, Path]) -> Path:
     return path
 
 
+def huffman_code_lengths(weights, batch=64):
+    """
+    Huffman code lengths in O(n log n) time: one sort of the weights, then the two-queue merge
+    (leaves in sorted order, merged nodes are created in non-decreasing order) on flat arrays,
+    without the per-merge copying of symbol lists done by the heap construction.
+    Depths are computed by pointer jumping over the parent array.
+
+    Merged nodes are never lighter than the sum of the two lightest items, so all items up to that sum
+    can be paired off in sorted order at once. This is done with array operations whenever it covers
+    more than `batch` items, e.g. for the many equal weights of an extended source.
+
+    :param weights: sequence of n non-negative symbol weights
+    :param batch: minimum number of items for a vectorized merge round
+    :return: int64 array of n code lengths, in the order of `weights`
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(weights)
+    if n < 2:
+        return np.zeros(n, dtype=np.int64)
+    order = np.argsort(weights, kind='stable')
+    inf = float('inf')
+    queue = _MergeQueue(weights[order], batch)
+    leaves, nodes, parent = queue.leaves, queue.nodes, queue.parent
+    i = j = m = 0
+    while m < n - 1:
+        # Take the two smallest heads of the leaf queue and the node queue.
+        a = leaves[i]
+        b = nodes[j]
+        # The sum of the two smallest is at least twice the smallest one.
+        bound = a + a if a <= b else b + b
+        if leaves[i + batch] <= bound or nodes[j + batch] <= bound:
+            i, j, m = queue.merge_round(i, j, m)
+            continue
+        if a <= b:
+            parent[i] = n + m
+            i += 1
+        else:
+            parent[n + j] = n + m
+            j += 1
+            a = b
+        c = leaves[i]
+        b = nodes[j]
+        if c <= b:
+            parent[i] = n + m
+            i += 1
+            nodes[m] = a + c
+        else:
+            parent[n + j] = n + m
+            j += 1
+            nodes[m] = a + b
+        m += 1
+    # Pointer jumping over the merged nodes: distance to the current ancestor, the root is at distance 0.
+    root = 2 * n - 2
+    ancestor = parent[n:] - n
+    ancestor[-1] = root - n
+    depth = np.ones(n - 1, dtype=np.int64)
+    depth[-1] = 0
+    while not (ancestor == root - n).all():
+        depth += depth[ancestor]
+        ancestor = ancestor[ancestor]
+    lengths = np.empty(n, dtype=np.int64)
+    lengths[order] = depth[parent[:n] - n] + 1
+    return lengths
+
+
+class _MergeQueue:
+    """
+    Leaf and node queues of `huffman_code_lengths`: Python lists for the step-by-step merge,
+    with array copies for the vectorized merge rounds, and the parent of every leaf and merged node.
+    """
+
+    def __init__(self, sorted_weights, batch):
+        n = len(sorted_weights)
+        self.n = n
+        self.sorted_weights = sorted_weights
+        # Queues are padded with inf, so that looking `batch` items ahead never runs out of the list.
+        self.leaves = sorted_weights.tolist() + [float('inf')] * (batch + 2)
+        self.nodes = [float('inf')] * (n + batch + 2)
+        self.node_array = np.empty(n, dtype=np.float64)
+        self.synced = 0  # nodes[:synced] are also in node_array
+        self.parent = np.zeros(2 * n - 1, dtype=np.int64)
+
+    def merge_round(self, i, j, m):
+        """
+        Pair off all queued leaves and nodes not heavier than the sum of the two lightest ones, in sorted order
+        (an odd last item stays queued). Return the new queue heads and node count (i, j, m).
+        """
+        n, leaves, nodes = self.n, self.leaves, self.nodes
+        self.node_array[self.synced:m] = nodes[self.synced:m]
+        smallest = sorted((leaves[i], leaves[i + 1], nodes[j], nodes[j + 1]))
+        bound = smallest[0] + smallest[1]
+        # Earlier merged nodes are never heavier than the next merge, so every queued node is taken.
+        leaf_stop = bisect.bisect_right(leaves, bound, i, n)
+        node_stop = bisect.bisect_right(nodes, bound, j, m)
+        items = np.concatenate((self.sorted_weights[i:leaf_stop], self.node_array[j:node_stop]))
+        ids = np.concatenate((np.arange(i, leaf_stop), np.arange(n + j, n + node_stop)))
+        index = np.argsort(items, kind='stable')
+        pairs = len(index) // 2
+        if len(index) % 2:
+            # The heaviest item stays, it is the last one of its queue.
+            if ids[index[-1]] >= n:
+                node_stop -= 1
+            else:
+                leaf_stop -= 1
+        index = index[:2 * pairs]
+        items = items[index]
+        self.parent[ids[index]] = np.repeat(np.arange(n + m, n + m + pairs), 2)
+        merged = items[0::2] + items[1::2]
+        self.node_array[m:m + pairs] = merged
+        nodes[m:m + pairs] = merged.tolist()
+        self.synced = m + pairs
+        return leaf_stop, node_stop, m + pairs
+
+
+def limited_code_lengths(weights, max_length):
+    """
+    Optimal prefix code lengths no longer than `max_length` (package-merge).
+    Level lists are built from the deepest level up: each is the sorted merge of the leaves
+    with the pairwise packages of the level below. The first 2n-2 items of the top list are selected;
+    a leaf's code length is the number of levels where it is among the selected items.
+
+    :param weights: sequence of n non-negative symbol weights
+    :param max_length: maximum code length, n must not exceed 2 ** max_length
+    :return: int64 array of n code lengths, in the order of `weights`
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(weights)
+    if n < 2:
+        return np.zeros(n, dtype=np.int64)
+    if max_length < 1 or n > 1 << max_length:
+        raise ValueError("Cannot code %d symbols with codes of at most %d bits." % (n, max_length))
+    order = np.argsort(weights, kind='stable')
+    leaves = weights[order]
+    # At most 2n-2 items of any level can be selected, longer lists are cut.
+    items = leaves
+    is_leaf = np.ones(n, dtype=bool)
+    levels = [is_leaf]
+    for _ in range(max_length - 1):
+        pairs = len(items) // 2
+        merged = np.concatenate((leaves, items[0:2 * pairs:2] + items[1:2 * pairs:2]))
+        index = np.argsort(merged, kind='stable')[:2 * n - 2]
+        items = merged[index]
+        is_leaf = index < n
+        levels.append(is_leaf)
+    # Selected leaves of a level are always the lightest ones, count them with a difference array.
+    ends = np.zeros(n + 1, dtype=np.int64)
+    selected = 2 * n - 2
+    for is_leaf in reversed(levels):
+        count = np.count_nonzero(is_leaf[:selected])
+        ends[count] += 1
+        selected = 2 * (selected - count)
+    lengths = np.empty(n, dtype=np.int64)
+    lengths[order] = np.cumsum(ends[::-1])[::-1][1:]
+    return lengths
+
+
+def limit_code_lengths(lengths, weights, max_length):
+    """
+    Shorten given (Huffman) code lengths to at most `max_length` bits without package-merge, for alphabets
+    too large for it: longer codes are cut to `max_length`, then codes one level at a time from the deepest
+    level up are made one bit longer until the Kraft sum fits, and remaining slack is used to shorten deep codes.
+    The resulting lengths are assigned again in order of weight (heaviest symbol gets the shortest code).
+
+    :param lengths: array of n code lengths (0 for symbols without code)
+    :param weights: array of n symbol weights
+    :param max_length: maximum code length
+    :return: int64 array of n code lengths
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    coded = np.flatnonzero(lengths)
+    if not len(coded) or lengths.max() <= max_length:
+        return lengths.copy()
+    if len(coded) > 1 << max_length:
+        raise ValueError("Cannot code %d symbols with codes of at most %d bits." % (len(coded), max_length))
+    counts = np.bincount(np.minimum(lengths[coded], max_length), minlength=max_length + 1).tolist()
+    # Kraft sum in units of 2 ** -max_length, minus the 2 ** max_length available.
+    excess = sum(c << (max_length - b) for b, c in enumerate(counts) if b) - (1 << max_length)
+    for b in range(max_length - 1, 0, -1):
+        if excess <= 0:
+            break
+        step = 1 << (max_length - b - 1)
+        moves = min(counts[b], -(-excess // step))
+        counts[b] -= moves
+        counts[b + 1] += moves
+        excess -= moves * step
+    for b in range(max_length, 1, -1):
+        step = 1 << (max_length - b)
+        moves = min(counts[b], -excess // step)
+        counts[b] -= moves
+        counts[b - 1] += moves
+        excess += moves * step
+    order = coded[np.argsort(-np.asarray(weights, dtype=np.float64)[coded], kind='stable')]
+    limited = np.zeros(len(lengths), dtype=np.int64)
+    limited[order] = np.repeat(np.arange(max_length + 1), counts)
+    return limited
+
+
+def canonical_code_values(lengths):
+    """
+    Canonical codeword values for an array of code lengths, computed with array operations:
+    shorter codes first, equal lengths get consecutive values in array order
+    (same assignment as `canonical_code_table`). Length 0 gets value 0.
+
+    :param lengths: sequence of code lengths
+    :return: array of codeword values (int64, or Python ints for codes longer than 62 bits)
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    values = np.zeros(len(lengths), dtype=np.int64)
+    if not len(lengths) or lengths.max() == 0:
+        return values
+    counts = np.bincount(lengths)
+    # Offsets of the first symbol of each length in the length-sorted order (symbols without code first).
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    counts[0] = 0
+    first = [0] * len(counts)
+    code = 0
+    for b in range(1, len(counts)):
+        code = (code + counts[b - 1].item()) << 1
+        first[b] = code
+    order = np.argsort(lengths, kind='stable')
+    sorted_lengths = lengths[order]
+    rank = np.arange(len(lengths)) - starts[sorted_lengths]
+    if len(counts) > 63:
+        first = np.array(first, dtype=object)
+        values = values.astype(object)
+        rank = rank.astype(object)
+    else:
+        first = np.array(first, dtype=np.int64)
+    values[order] = first[sorted_lengths] + rank
+    values[lengths == 0] = 0
+    return values
+
+
+def canonical_code_table(lengths):
+    """
+    Assign canonical codewords from code lengths: shorter codes first, symbols of equal length
+    get consecutive values in the order of `lengths`. Only the lengths are needed to rebuild the codes.
+
+    :param lengths: mapping of symbol to code length (symbols with length 0 are left out)
+    :return: dictionary mapping symbol to code tuple (bitsize, value), in the order of `lengths`
+    """
+    symbols = [s for s, b in lengths.items() if b > 0]
+    sizes = [lengths[s] for s in symbols]
+    return dict(zip(symbols, zip(sizes, canonical_code_values(sizes).tolist())))
+
+
+class TableDecoder:
+    """
+    Table-driven prefix code decoder.
+
+    The primary table is indexed by the next `bits` bits of the stream and gives all whole codewords
+    in that window at once: (consumed bits, symbols). Codewords longer than `bits` bits go through
+    secondary tables indexed by the following bits, one level per `bits` bits of codeword length.
+    """
+
+    def __init__(self, code_table, bits=12, eof=None):
+        """
+        :param code_table: mapping of symbol to code tuple (bitsize, value)
+        :param bits: number of bits per table lookup (1..16)
+        :param eof: "end of file" symbol, decoding stops there (None to decode till the end of data)
+        """
+        if not 1 <= bits <= 16:
+            raise ValueError('Table bits must be between 1 and 16.')
+        self.bits = bits
+        self._lengths = {s: b for s, (b, v) in code_table.items()}
+        self._max_bits = max(self._lengths.values())
+        # Symbols of byte value are collected in a bytearray, others in a list
+        self._byte_symbols = all(
+            isinstance(s, numbers.Integral) and 0 <= s < 256 for s in code_table if not self._is_eof(s, eof)
+        )
+        # A lone symbol has a 0-bit code: the data holds no bits, `count` gives the number of symbols
+        self._only = next(iter(code_table)) if self._max_bits == 0 else None
+        if self._only is not None:
+            self._table = None
+            return
+        codes = [(b, v, s, self._is_eof(s, eof)) for s, (b, v) in code_table.items()]
+        self._table = self._build(codes, 0)[1]
+        self._pack()
+
+    @staticmethod
+    def _is_eof(symbol, eof):
+        return eof is not None and (symbol is eof or symbol == eof)
+
+    def _build(self, codes, depth):
+        """
+        Build the (sub)table of the codes sharing a prefix of `depth` bits, return (width, table).
+        Entries are (consumed bits, symbols), (0, (width, subtable)) or (-1, None) for EOF.
+        """
+        width = self.bits if depth == 0 else min(self.bits, max(b for b, v, s, e in codes) - depth)
+        table = [None] * (1 << width)
+        groups = collections.defaultdict(list)
+        for b, v, s, e in codes:
+            rest = b - depth
+            tail = v & ((1 << rest) - 1)
+            if rest <= width:
+                start = tail << (width - rest)
+                entry = (-1, None) if e else (rest, self._symbols((s,)))
+                table[start:start + (1 << (width - rest))] = [entry] * (1 << (width - rest))
+            else:
+                groups[tail >> (rest - width)].append((b, v, s, e))
+        for index, group in groups.items():
+            table[index] = (0, self._build(group, depth + width))
+        return (width, table)
+
+    def _symbols(self, symbols):
+        return bytes(map(int, symbols)) if self._byte_symbols else tuple(symbols)
+
+    def _pack(self):
+        """
+        Extend every primary entry with the following whole codewords that still fit in the window,
+        so that one lookup decodes several short symbols.
+        """
+        k = self.bits
+        single = self._table
+        packed = []
+        for window, entry in enumerate(single):
+            consumed, symbols = entry
+            if consumed <= 0:
+                packed.append(entry)
+                continue
+            while True:
+                n, more = single[(window << consumed) & ((1 << k) - 1)]
+                if n <= 0 or consumed + n > k:
+                    break
+                symbols += more
+                consumed += n
+            packed.append((consumed, symbols))
+        self._table = packed
+
+    def decode(self, data, count=None, chunk=1 << 16):
+        """
+        Decode given data.
+
+        :param data: bytes-like object (or sequence of byte values)
+        :param count: stop after this many symbols (None to decode till EOF or the end of data)
+        :param chunk: number of input bytes prepared for lookup at a time
+        :return: bytearray of symbol values if all symbols are bytes, otherwise list of symbols
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview, np.ndarray)):
+            data = bytes(data)
+        data = np.frombuffer(data, dtype=np.uint8)
+        out = bytearray() if self._byte_symbols else []
+        if self._only is not None:
+            out += self._symbols((self._only,)) * (count or 0)
+            return out
+        self._decode_bits(data, 0, len(data) * 8, out, count, chunk)
+        return out if count is None else out[:count]
+
+    def decode_stream(self, chunks, count=None, chunk=1 << 16):
+        """
+        Decode data given in pieces, keeping only the undecoded bits of the current piece in memory.
+
+        :param chunks: iterable of bytes-like objects
+        :param count: stop after this many symbols (None to decode till EOF or the end of data)
+        :param chunk: number of input bytes prepared for lookup at a time
+        :return: generator of the symbols decoded from each piece (bytearray or list, as decode())
+        """
+        if self._only is not None:
+            yield self.decode(b'', count)
+            return
+        # Bytes after a position needed to decode any codeword there without running out of data.
+        extra = (self._max_bits + 7) // 8 + 1
+        tail = np.zeros(0, dtype=np.uint8)
+        pos = 0
+        pieces = iter(chunks)
+        data = next(pieces, None)
+        while data is not None and count != 0:
+            following = next(pieces, None)
+            data = np.concatenate((tail, np.frombuffer(data, dtype=np.uint8)))
+            # Only the last piece is decoded to its end, others stop where the lookup windows would run past.
+            limit = len(data) * 8 if following is None else (len(data) - extra) * 8
+            out = bytearray() if self._byte_symbols else []
+            if pos < limit:
+                pos = self._decode_bits(data, pos, limit, out, count, chunk)
+            if count is not None:
+                out = out[:count]
+                count -= len(out)
+            yield out
+            if pos is None:
+                return
+            tail = data[pos >> 3:]
+            pos &= 7
+            data = following
+
+    def _decode_bits(self, data, pos, limit, out, count=None, chunk=1 << 16):
+        """
+        Decode `data` (uint8 array) from bit `pos` until bit `limit`, EOF or `count` symbols, appending to `out`.
+        Return the next bit position, or None if decoding stopped at EOF or the end of data.
+        """
+        total = len(data) * 8
+        k = self.bits
+        mask = (1 << k) - 1
+        table = self._table
+        # 24-bit big-endian windows starting at every byte, enough for k + 7 <= 23 bits at any bit offset
+        extra = (self._max_bits + 7) // 8 + 1
+        padded = np.concatenate([data, np.zeros(extra + 2, dtype=np.uint8)]).astype(np.uint32)
+        for start in range(pos >> 3, (limit + 7) >> 3, chunk):
+            stop = min(start + chunk, len(data))
+            p = padded[start:stop + extra + 2]
+            windows = ((p[:-2] << 16) | (p[1:-1] << 8) | p[2:]).tolist()
+            base = start * 8
+            end = min(stop * 8, limit)
+            while pos < end:
+                rel = pos - base
+                n, symbols = table[(windows[rel >> 3] >> (24 - k - (rel & 7))) & mask]
+                if n > 0 and pos + n <= total:
+                    out += symbols
+                    pos += n
+                    continue
+                rel = self._decode_special(windows, n, symbols, rel, total - base, out)
+                if rel is None:
+                    return None
+                pos = base + rel
+            if count is not None and len(out) >= count:
+                break
+        return pos
+
+    def _decode_special(self, windows, n, symbols, at, total, out):
+        """
+        Decode the entry (n, symbols) at bit offset `at` that the fast path cannot: a codeword longer than
+        the table bits, EOF, or a window running past the end of data (`total` bits).
+        Return the next bit offset, or None to stop.
+        """
+        if n < 0:
+            return None
+        if n > 0:
+            # Keep only the whole codewords before the end of data
+            for symbol in symbols:
+                at += self._lengths[symbol]
+                if at > total:
+                    break
+                out.append(symbol)
+            return None
+        # Codeword longer than k bits: walk the secondary tables
+        depth = self.bits
+        width, sub = symbols
+        while True:
+            bit = at + depth
+            n, symbols = sub[(windows[bit >> 3] >> (24 - width - (bit & 7))) & ((1 << width) - 1)]
+            if n != 0:
+                break
+            depth += width
+            width, sub = symbols
+        if n < 0 or at + depth + n > total:
+            return None
+        out += symbols
+        return at + depth + n
+
+
+class ArrayEncoder:
+    """
+    Vectorized prefix code encoder for numpy arrays of integer symbols.
+
+    Code lengths and values are looked up per symbol, bit offsets come from a cumulative sum,
+    and every codeword is shifted to its offset inside the 64-bit output words; the codewords
+    starting in one word are or-reduced together, the part running into the next word is or-ed there.
+    Codewords longer than 56 bits are split into pieces of at most 56 bits.
+    """
+
+    PIECE_BITS = 56
+
+    def __init__(self, code_table, eof=None):
+        """
+        :param code_table: mapping of symbol to code tuple (bitsize, value)
+        :param eof: "end of file" symbol, whose codeword pads the last byte
+        """
+        # The EOF symbol can also be a data symbol (e.g. in dahuffman_no_EOF), only a non-integer EOF is left out
+        symbols = [s for s in code_table if isinstance(s, numbers.Integral) or not TableDecoder._is_eof(s, eof)]
+        if not all(isinstance(s, numbers.Integral) and s >= 0 for s in symbols):
+            raise ValueError('Array encoding needs non-negative integer symbols.')
+        self._eof_code = code_table[eof] if eof is not None and eof in code_table else None
+        size = int(max(symbols, default=-1)) + 1
+        # Pieces of every symbol's codeword: value, length, and the first piece and piece count per symbol
+        values, lengths = [], []
+        self._first = np.zeros(size, dtype=np.int64)
+        self._count = np.full(size, -1, dtype=np.int64)
+        for s in symbols:
+            b, v = code_table[s]
+            self._first[s] = len(values)
+            self._count[s] = 0
+            for at in range(0, b, self.PIECE_BITS):
+                n = min(self.PIECE_BITS, b - at)
+                values.append((v >> (b - at - n)) & ((1 << n) - 1))
+                lengths.append(n)
+                self._count[s] += 1
+        self._values = np.array(values, dtype=np.uint64)
+        self._lengths = np.array(lengths, dtype=np.int64)
+        self._single = bool(np.all(self._count[self._count >= 0] == 1))
+
+    @classmethod
+    def from_code_arrays(cls, lengths, values):
+        """
+        Build the encoder directly from arrays indexed by symbol (for large alphabets, no code table dict),
+        codes of at most PIECE_BITS bits; length 0 means the symbol has no code. The last byte is zero padded.
+
+        :param lengths: array of code lengths
+        :param values: array of codeword values
+        """
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if len(lengths) and lengths.max() > cls.PIECE_BITS:
+            raise ValueError('Code arrays only support codes of at most %d bits.' % cls.PIECE_BITS)
+        encoder = cls.__new__(cls)
+        encoder._eof_code = None
+        encoder._first = np.arange(len(lengths), dtype=np.int64)
+        encoder._count = np.where(lengths > 0, 1, -1)
+        encoder._values = np.asarray(values).astype(np.uint64)
+        encoder._lengths = lengths
+        encoder._single = True
+        return encoder
+
+    def encode(self, data, chunk=1 << 16):
+        """
+        Encode given data, giving the same bytes as PrefixCodec.encode().
+
+        :param data: numpy array (or sequence) of integer symbols
+        :param chunk: number of symbols encoded at a time
+        :return: byte string
+        """
+        return b''.join(self.encode_stream([data], chunk))
+
+    def encode_stream(self, chunks, chunk=1 << 16):
+        """
+        Encode data given in pieces; the bits of a partial last byte are carried over to the next piece.
+
+        :param chunks: iterable of numpy arrays (or sequences) of integer symbols
+        :param chunk: number of symbols encoded at a time (bounds the temporary arrays)
+        :return: generator of the whole bytes encoded from each piece, then the padded last byte if any
+        """
+        used = carry = 0
+        for symbols in chunks:
+            symbols = np.asarray(symbols).ravel()
+            out = bytearray()
+            for start in range(0, len(symbols), chunk):
+                used, carry = self._encode_chunk(symbols[start:start + chunk], used, carry, out)
+            yield bytes(out)
+        if used:
+            # Same final sub-byte handling as encode_streaming(): pad with the EOF codeword
+            buffer, size = carry >> (8 - used), used
+            if self._eof_code is not None:
+                b, v = self._eof_code
+                buffer, size = (buffer << b) + v, size + b
+            yield bytes((buffer >> (size - 8) if size >= 8 else (buffer << (8 - size)) & 0xFF,))
+
+    def _encode_chunk(self, symbols, used, carry, out):
+        """
+        Encode one chunk after `used` bits (left-aligned in `carry`) of a partial byte,
+        append the whole bytes to `out` and return the new partial byte (used, carry).
+        """
+        if len(symbols) and (symbols.min() < 0 or symbols.max() >= len(self._count)):
+            raise KeyError('Symbol out of code table.')
+        counts = self._count[symbols]
+        if np.any(counts < 0):
+            raise KeyError(symbols[counts < 0][0])
+        if not counts.any():
+            return (used, carry)  # only 0-bit codes (a one-symbol alphabet)
+        if self._single:
+            pieces = self._first[symbols]
+        else:
+            ends = np.cumsum(counts)
+            pieces = np.arange(ends[-1]) + np.repeat(self._first[symbols] - (ends - counts), counts)
+        values = self._values[pieces]
+        lengths = self._lengths[pieces]
+
+        offsets = np.cumsum(lengths) - lengths + used
+        total = used + int(lengths.sum())
+        word = offsets >> 6
+        spill = lengths - (64 - (offsets & 63))  # bits running into the next 64-bit word
+        high = np.where(spill > 0, values >> np.maximum(spill, 0).astype(np.uint64),
+                        values << np.maximum(-spill, 0).astype(np.uint64))
+        # Offsets are sorted, so the pieces starting in one word are consecutive and can be or-reduced
+        starts = np.flatnonzero(np.concatenate(([True], word[1:] != word[:-1])))
+        encoded = np.zeros((total + 63) >> 6, dtype=np.uint64)
+        encoded[word[starts]] = np.bitwise_or.reduceat(high, starts)
+        spans = spill > 0
+        encoded[word[spans] + 1] |= values[spans] << (64 - spill[spans]).astype(np.uint64)
+        encoded[0] |= np.uint64(carry << 56)
+        encoded = encoded.astype('>u8').view(np.uint8)
+        out += encoded[:total >> 3].tobytes()
+        return (total & 7, int(encoded[total >> 3]) if total & 7 else 0)
+
+
+class CanonicalDecoder:
+    """
+    Decoder for canonical codes over a large alphabet of integer symbols, built with array operations.
+
+    A table of the next `bits` bits gives all whole codewords in that window (consumed bits, symbols).
+    For longer codes the length is the first one whose left-aligned limit is above the next `max_length` bits
+    (canonical codes of one length are consecutive values), and the symbol follows from its rank in that length.
+    """
+
+    def __init__(self, lengths, values, bits=16):
+        """
+        :param lengths: array of code lengths indexed by symbol (0 for symbols without code), at most 56 bits
+        :param values: array of canonical codeword values (see `canonical_code_values`)
+        :param bits: number of bits per table lookup (1..16)
+        """
+        lengths = np.asarray(lengths, dtype=np.int64)
+        values = np.asarray(values, dtype=np.int64)
+        self.max_bits = max_bits = int(lengths.max())
+        if max_bits > 56:
+            raise ValueError('Canonical decoding supports codes of at most 56 bits.')
+        self.bits = bits = min(bits, max_bits)
+        coded = np.flatnonzero(lengths)
+        order = coded[np.argsort(lengths[coded], kind='stable')]
+        self._sorted = order  # symbols in canonical order, decoding works on ranks in this order
+        counts = np.bincount(lengths[coded], minlength=max_bits + 1)
+        counts[0] = 0
+        self._offset = (np.cumsum(counts) - counts).tolist()
+        first = np.zeros(max_bits + 1, dtype=np.int64)
+        first[counts > 0] = [values[order[offset]] for offset, count in zip(self._offset, counts) if count]
+        self._first = first.tolist()
+        # limit[b]: left-aligned end of the codes of length b, non-decreasing in b
+        limit = np.where(counts > 0, (first + counts) << (max_bits - np.arange(max_bits + 1)), 0)
+        limit = np.maximum.accumulate(limit)
+        self._limit = limit.tolist()
+        # Lookup table of the next `bits` bits, length 0 for longer codes
+        window = np.arange(1 << bits, dtype=np.int64) << (max_bits - bits)
+        size = np.searchsorted(limit, window, side='right')
+        short = size <= bits
+        rank = np.where(short, (window >> (max_bits - np.minimum(size, max_bits))) - first[np.minimum(size, max_bits)], 0)
+        symbol = np.where(short, np.asarray(self._offset)[np.minimum(size, max_bits)] + rank, 0)
+        # Extend every entry with the following whole codewords that still fit in the window.
+        mask = (1 << bits) - 1
+        single_lengths = np.where(short, size, 0)
+        total = single_lengths.copy()
+        columns = [np.where(short, symbol, -1)]
+        window = np.arange(1 << bits, dtype=np.int64)
+        while True:
+            following = (window << total) & mask
+            n = single_lengths[following]
+            fits = (total > 0) & (n > 0) & (total + n <= bits)
+            if not fits.any():
+                break
+            columns.append(np.where(fits, symbol[following], -1))
+            total += np.where(fits, n, 0)
+        self._table_lengths = total.tolist()
+        self._table_symbols = [tuple(s for s in row if s >= 0) for row in np.stack(columns, axis=1).tolist()]
+
+    def decode(self, data, count, chunk=1 << 16):
+        """
+        Decode `count` symbols from given data.
+
+        :param data: bytes-like object
+        :param count: number of symbols
+        :param chunk: number of input bytes prepared for lookup at a time
+        :return: int64 array of symbols
+        """
+        pieces = list(self.decode_chunks(data, count, chunk))
+        return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int64)
+
+    def decode_chunks(self, data, count, chunk=1 << 16):
+        """
+        Decode `count` symbols from given data, yield an int64 array of the symbols decoded from each input chunk.
+        """
+        data = np.frombuffer(data, dtype=np.uint8)
+        L = self.max_bits
+        k = self.bits
+        mask = (1 << L) - 1
+        table_lengths, table_symbols = self._table_lengths, self._table_symbols
+        limit, first, offset = self._limit, self._first, self._offset
+        bisect_right = bisect.bisect_right
+        # 64-bit big-endian windows starting at every byte, enough for L + 7 <= 63 bits at any bit offset
+        padded = np.concatenate([data, np.zeros(8 + (L + 7) // 8, dtype=np.uint8)]).astype(np.uint64)
+        pos = 0
+        total = len(data) * 8
+        for start in range(0, len(data), chunk):
+            if count <= 0:
+                return
+            stop = min(start + chunk, len(data))
+            p = padded[start:stop + 8 + (L + 7) // 8]
+            windows = p[:-7] << np.uint64(56)
+            for shift in range(1, 8):
+                windows |= p[shift:len(p) - 7 + shift] << np.uint64(56 - 8 * shift)
+            windows = windows.tolist()
+            base = start * 8
+            end = stop * 8
+            out = []
+            while pos < end and len(out) < count:
+                rel = pos - base
+                v = (windows[rel >> 3] >> (64 - L - (rel & 7))) & mask
+                u = v >> (L - k)
+                n = table_lengths[u]
+                if n:
+                    out.extend(table_symbols[u])
+                else:
+                    n = bisect_right(limit, v)
+                    out.append(offset[n] + (v >> (L - n)) - first[n])
+                pos += n
+            if len(out) > count:
+                del out[count:]  # table entries may run past the last codeword
+            count = 0 if pos > total else count - len(out)
+            yield self._sorted[np.array(out, dtype=np.int64)]
+
+
 class PrefixCodec:
     """
     Prefix code codec, using given code table.
@@ -80,6 +788,8 @@ class PrefixCodec:
         self._table = code_table
         self._concat = concat
         self._eof = eof
+        self._decoders = {}
+        self._encoders = {}
         if check:
             assert isinstance(self._table, dict) and all(
                 isinstance(b, int) and b >= 1 and isinstance(v, int) and v >= 0
@@ -196,40 +906,178 @@ class PrefixCodec:
                     buffer = 0
                     size = 0
 
-    def save(self, path: Union[str, Path], metadata: Any = None):
+    def get_array_encoder(self):
+        """
+        Get the vectorized encoder for the current code table and EOF symbol (built once and cached).
+        :return: ArrayEncoder
+        """
+        key = self._eof
+        if key not in self._encoders:
+            self._encoders[key] = ArrayEncoder(self._table, eof=self._eof)
+        return self._encoders[key]
+
+    def encode_array(self, data):
+        """
+        Encode a numpy array of integer symbols with vectorized table lookups, bit-identical to encode().
+
+        :param data: numpy array (or sequence) of integer symbols
+        :return: byte string
+        """
+        return self.get_array_encoder().encode(data)
+
+    def encode_array_stream(self, chunks):
+        """
+        Encode numpy arrays of integer symbols given in pieces, see ArrayEncoder.encode_stream().
+
+        :param chunks: iterable of numpy arrays (or sequences) of integer symbols
+        :return: generator of byte strings, together the same bytes as encode_array() of all pieces
+        """
+        return self.get_array_encoder().encode_stream(chunks)
+
+    def get_table_decoder(self, bits=12):
+        """
+        Get the table-driven decoder for the current code table and EOF symbol (built once and cached).
+        :param bits: number of bits per table lookup (1..16)
+        :return: TableDecoder
+        """
+        key = (bits, self._eof)
+        if key not in self._decoders:
+            self._decoders[key] = TableDecoder(self._table, bits=bits, eof=self._eof)
+        return self._decoders[key]
+
+    def decode_table(self, data, concat=None, bits=12, count=None):
+        """
+        Decode given data with multi-bit lookup tables, giving the same symbols as decode().
+
+        :param data: sequence of bytes (string, list or generator of bytes)
+        :param concat: optional override of function to concatenate the decoded symbols
+        :param bits: number of bits per table lookup (1..16)
+        :param count: stop after this many symbols
+        :return:
+        """
+        return (concat or self._concat)(self.get_table_decoder(bits).decode(data, count=count))
+
+    def decode_table_stream(self, chunks, bits=12, count=None):
+        """
+        Decode data given in pieces with multi-bit lookup tables, see TableDecoder.decode_stream().
+
+        :param chunks: iterable of bytes-like objects
+        :param bits: number of bits per table lookup (1..16)
+        :param count: stop after this many symbols
+        :return: generator of the symbols decoded from each piece
+        """
+        return self.get_table_decoder(bits).decode_stream(chunks, count=count)
+
+    def save(self, path: Union[str, Path], metadata: Any = None, binary=False):
         """
         Persist the code table to a file.
         :param path: file path to persist to
         :param metadata: additional metadata
+        :param binary: write the compact binary format (integer symbols, codes up to 64 bits, no metadata)
+            instead of a pickle
         :return:
         """
         code_table = self.get_code_table()
-        data = {
-            "code_table": code_table,
-            "type": type(self),
-            "concat": self._concat,
-        }
-        if metadata:
-            data['metadata'] = metadata
         path = Path(path)
         ensure_dir(path.parent)
-        with path.open(mode='wb') as f:
+        if binary:
+            if metadata:
+                raise ValueError("The binary format does not store metadata.")
+            data = self._to_binary()
+        else:
+            data = {
+                "code_table": code_table,
+                "type": type(self),
+                "concat": self._concat,
+            }
+            if metadata:
+                data['metadata'] = metadata
             # TODO also provide JSON option? Requires handling of _EOF and possibly other non-string code table keys.
-            pickle.dump(data, file=f)
+            data = pickle.dumps(data)
+        # Write to a temporary file first, so that a concurrent reader never sees a partial file.
+        temp = path.with_name(path.name + '.%d.tmp' % os.getpid())
+        with temp.open(mode='wb') as f:
+            f.write(data)
+        os.replace(temp, path)
         _log.info('Saved {c} code table ({l} items) to {p!r}'.format(
             c=type(self).__name__, l=len(code_table), p=str(path)
         ))
 
+    def _to_binary(self) -> bytes:
+        """
+        Pack the code table as arrays: symbols, code lengths (uint8) and codeword values (uint64).
+        The symbols are Python ints or numpy integers of one dtype; an _EOF symbol is stored by its position.
+        """
+        if self._concat not in _CONCATS:
+            raise ValueError("Cannot store concat function {c!r} in binary format.".format(c=self._concat))
+        symbols = list(self._table)
+        eof_index = next((i for i, s in enumerate(symbols) if s is _EOF), -1)
+        others = [s for s in symbols if s is not _EOF]
+        if all(type(s) is int for s in others):
+            dtype = 'int'
+            symbol_array = np.array(others, dtype=np.int64)
+        elif others and all(isinstance(s, np.integer) for s in others) and len({s.dtype for s in others}) == 1:
+            dtype = others[0].dtype.str
+            symbol_array = np.array(others, dtype=others[0].dtype)
+        else:
+            raise ValueError("Only integer symbols can be stored in binary format.")
+        codes = list(self._table.values())
+        lengths = np.array([b for b, v in codes], dtype=np.uint8)
+        if len(codes) and max(b for b, v in codes) > 64:
+            raise ValueError("Only codes up to 64 bits can be stored in binary format.")
+        values = np.array([v for b, v in codes], dtype=np.uint64)
+        cls = type(self)
+        name = ('%s:%s' % (cls.__module__, cls.__qualname__)).encode()
+        dtype = dtype.encode()
+        return b''.join((
+            _BINARY_HEAD.pack(_BINARY_MAGIC, 1, _CONCATS.index(self._concat), len(name)), name,
+            _BINARY_TABLE.pack(len(codes), eof_index, len(dtype)), dtype,
+            symbol_array.tobytes(), lengths.tobytes(), values.tobytes(),
+        ))
+
+    @staticmethod
+    def _from_binary(data: bytes) -> 'PrefixCodec':
+        magic, version, concat, name_len = _BINARY_HEAD.unpack_from(data)
+        if magic != _BINARY_MAGIC or version != 1:
+            raise ValueError("Not a binary code table (version 1).")
+        at = _BINARY_HEAD.size
+        module, _, qualname = data[at:at + name_len].decode().partition(':')
+        at += name_len
+        count, eof_index, dtype_len = _BINARY_TABLE.unpack_from(data, at)
+        at += _BINARY_TABLE.size
+        dtype = data[at:at + dtype_len].decode()
+        at += dtype_len
+        others = count - (eof_index >= 0)
+        symbol_array = np.frombuffer(data, dtype=np.int64 if dtype == 'int' else dtype, count=others, offset=at)
+        at += symbol_array.nbytes
+        lengths = np.frombuffer(data, dtype=np.uint8, count=count, offset=at)
+        values = np.frombuffer(data, dtype=np.uint64, count=count, offset=at + count)
+        symbols = symbol_array.tolist() if dtype == 'int' else list(symbol_array)
+        if eof_index >= 0:
+            symbols.insert(eof_index, _EOF)
+        cls = importlib.import_module(module)
+        for part in qualname.split('.'):
+            cls = getattr(cls, part)
+        assert issubclass(cls, PrefixCodec)
+        return cls(dict(zip(symbols, zip(lengths.tolist(), values.tolist()))), concat=_CONCATS[concat], check=False)
+
     @staticmethod
     def load(path: Union[str, Path]) -> 'PrefixCodec':
         """
-        Load a persisted PrefixCodec
+        Load a persisted PrefixCodec (pickle or binary format)
         :param path: path to serialized PrefixCodec code table data.
         :return:
         """
         path = Path(path)
         with path.open(mode='rb') as f:
-            data = pickle.load(f)
+            raw = f.read()
+        if raw.startswith(_BINARY_MAGIC):
+            codec = PrefixCodec._from_binary(raw)
+            _log.info('Loading {c} with {l} code table items from {p!r}'.format(
+                c=type(codec).__name__, l=len(codec.get_code_table()), p=str(path)
+            ))
+            return codec
+        data = pickle.loads(raw)
         cls = data['type']
         assert issubclass(cls, PrefixCodec)
         code_table = data['code_table']
@@ -239,6 +1087,88 @@ class PrefixCodec:
         return cls(code_table, concat=data['concat'])
 
 
+class CodecCache:
+    """
+    LRU cache of built codecs: in-process (the codecs keep their encode/decode tables)
+    and optionally on disk in the binary code table format, both with a bounded number of entries.
+    Keys are hashes of the content the codec is built from, see `content_key`.
+    """
+
+    def __init__(self, directory: Union[str, Path, None] = None, maxsize=32, max_files=256):
+        """
+        :param directory: directory for the on-disk cache, None for in-process only
+        :param maxsize: number of codecs kept in memory
+        :param max_files: number of code table files kept on disk (least recently used are removed)
+        """
+        self.directory = Path(directory) if directory is not None else None
+        self.maxsize = maxsize
+        self.max_files = max_files
+        self.hits = self.disk_hits = self.misses = 0
+        self._codecs = collections.OrderedDict()
+
+    @staticmethod
+    def content_key(*parts) -> str:
+        """
+        Hash the given bytes (or values, by their repr) into a cache key.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            digest.update(part if isinstance(part, (bytes, bytearray, memoryview)) else repr(part).encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key: str, build) -> PrefixCodec:
+        """
+        Get the codec stored under `key`, calling `build()` to make it on a miss.
+        """
+        if key in self._codecs:
+            self.hits += 1
+            self._codecs.move_to_end(key)
+            return self._codecs[key]
+        codec = None
+        path = self.directory / (key + '.codec') if self.directory is not None else None
+        if path is not None and path.exists():
+            try:
+                codec = load(path)
+                os.utime(path)
+                self.disk_hits += 1
+            except (OSError, ValueError, struct.error):
+                codec = None  # Evicted by another process or damaged, build again.
+        if codec is None:
+            self.misses += 1
+            codec = build()
+            if path is not None:
+                codec.save(path, binary=True)
+                self._evict_files()
+        self._codecs[key] = codec
+        if len(self._codecs) > self.maxsize:
+            self._codecs.popitem(last=False)
+        return codec
+
+    def _evict_files(self):
+        files = []
+        for path in self.directory.glob('*.codec'):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                pass
+        files.sort()
+        for _, path in files[:max(len(files) - self.max_files, 0)]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def clear(self, disk=False):
+        """
+        Empty the in-process cache, and the on-disk cache too if `disk`.
+        """
+        self._codecs.clear()
+        if disk and self.directory is not None:
+            for path in self.directory.glob('*.codec'):
+                path.unlink()
+
+
 class HuffmanCodec(PrefixCodec):
     """
     Huffman coder, with code table built from given symbol frequencies or raw data,
@@ -246,13 +1176,32 @@ class HuffmanCodec(PrefixCodec):
     """
 
     @classmethod
-    def from_frequencies(cls, frequencies, concat=None, eof=_EOF):
+    def from_frequencies(cls, frequencies, concat=None, eof=_EOF, canonical=False, method='heap', max_length=None):
         """
         Build Huffman code table from given symbol frequencies
         :param frequencies: symbol to frequency mapping
         :param concat: function to concatenate symbols
         :param eof: "end of file" symbol (customizable for advanced usage)
+        :param canonical: reassign the codewords canonically (see `canonical_code_table`)
+        :param method: 'heap' merges symbol lists on a heap,
+            'sort' computes the code lengths with `huffman_code_lengths` (for large alphabets, always canonical)
+        :param max_length: limit the code lengths with `limited_code_lengths` (always canonical),
+            so that a single-level decode table of `max_length` bits covers every codeword
         """
+        if method == 'sort' or max_length is not None:
+            symbols = list(frequencies)
+            weights = list(frequencies.values())
+            if eof not in frequencies:
+                symbols.append(eof)
+                weights.append(0.)
+            concat = concat or _guess_concat(symbols[0])
+            if max_length is None:
+                lengths = huffman_code_lengths(weights)
+            else:
+                lengths = limited_code_lengths(weights, max_length)
+            values = canonical_code_values(lengths)
+            table = dict(zip(symbols, zip(lengths.tolist(), values.tolist())))
+            return cls(table, concat=concat, check=False, eof=eof)
 
         # Heap consists of tuples: (frequency, [list of tuples: (symbol, (bitsize, value))])
         heap = [(f, [(s, (0, 0))]) for s, f in frequencies.items()]
@@ -280,9 +1229,22 @@ class HuffmanCodec(PrefixCodec):
 
         # Code table is dictionary mapping symbol to (bitsize, value)
         table = dict(heappop(heap)[1])
+        if canonical:
+            order = itertools.chain(frequencies, [] if eof in frequencies else [eof])
+            table = canonical_code_table({s: table[s][0] for s in order})
 
         return cls(table, concat=concat, check=False, eof=eof)
 
+    @classmethod
+    def from_lengths(cls, lengths, concat=list, eof=_EOF):
+        """
+        Build a canonical Huffman codec from code lengths only (e.g. read from a file header)
+        :param lengths: symbol to code length mapping, in the order used when the codes were assigned
+        :param concat: function to concatenate symbols
+        :param eof: "end of file" symbol (customizable for advanced usage)
+        """
+        return cls(canonical_code_table(lengths), concat=concat, check=False, eof=eof)
+
     @classmethod
     def from_data(cls, data):
         """
@@ -293,3 +1255,96 @@ class HuffmanCodec(PrefixCodec):
         """
         frequencies = collections.Counter(data)
         return cls.from_frequencies(frequencies, concat=_guess_concat(data))
+
+
+_CANONICAL_MAGIC = b'CANC'
+
+
+class CanonicalCodec:
+    """
+    Canonical prefix codec over the integer symbols 0..n-1 given by an array of code lengths,
+    for alphabets too large for a code table dict (e.g. the 2 ** 24 symbols of 3-byte blocks).
+    Encoding and decoding work on numpy arrays of symbols.
+    """
+
+    def __init__(self, lengths):
+        """
+        :param lengths: array of code lengths indexed by symbol, 0 for symbols without code (at most 56 bits)
+        """
+        self.lengths = np.asarray(lengths, dtype=np.uint8)
+        self.values = canonical_code_values(self.lengths)
+        self._encoder = None
+        self._decoders = {}
+
+    @classmethod
+    def from_weights(cls, weights, max_length=None):
+        """
+        Build the Huffman code (see `huffman_code_lengths`) of the symbols with non-zero weight.
+        :param weights: array of symbol weights, indexed by symbol
+        :param max_length: maximum code length (see `limit_code_lengths`)
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        coded = np.flatnonzero(weights > 0)
+        lengths = np.zeros(len(weights), dtype=np.int64)
+        lengths[coded] = huffman_code_lengths(weights[coded]) if len(coded) > 1 else 1
+        if max_length is not None:
+            lengths = limit_code_lengths(lengths, weights, max_length)
+        return cls(lengths)
+
+    def get_array_encoder(self):
+        if self._encoder is None:
+            self._encoder = ArrayEncoder.from_code_arrays(self.lengths, self.values)
+        return self._encoder
+
+    def encode_array(self, data):
+        """
+        Encode a numpy array of integer symbols, the last byte is zero padded.
+        :return: byte string
+        """
+        return self.get_array_encoder().encode(data)
+
+    def get_decoder(self, bits=16):
+        if bits not in self._decoders:
+            self._decoders[bits] = CanonicalDecoder(self.lengths, self.values, bits=bits)
+        return self._decoders[bits]
+
+    def decode_array(self, data, count, bits=16):
+        """
+        Decode `count` symbols.
+        :return: int64 array of symbols
+        """
+        return self.get_decoder(bits).decode(data, count)
+
+    def save(self, path: Union[str, Path], metadata: Any = None, binary=True):
+        """
+        Persist the code lengths to a file (binary format only).
+        """
+        if metadata or not binary:
+            raise ValueError("Canonical codecs are only stored in binary format, without metadata.")
+        path = Path(path)
+        ensure_dir(path.parent)
+        temp = path.with_name(path.name + '.%d.tmp' % os.getpid())
+        with temp.open(mode='wb') as f:
+            f.write(_CANONICAL_MAGIC + struct.pack('<Q', len(self.lengths)))
+            f.write(self.lengths.tobytes())
+        os.replace(temp, path)
+
+    @staticmethod
+    def load(path: Union[str, Path]) -> 'CanonicalCodec':
+        with Path(path).open(mode='rb') as f:
+            raw = f.read()
+        if not raw.startswith(_CANONICAL_MAGIC):
+            raise ValueError("Not a canonical code lengths file.")
+        size, = struct.unpack_from('<Q', raw, len(_CANONICAL_MAGIC))
+        return CanonicalCodec(np.frombuffer(raw, dtype=np.uint8, count=size, offset=len(_CANONICAL_MAGIC) + 8))
+
+
+def load(path: Union[str, Path]):
+    """
+    Load a persisted PrefixCodec or CanonicalCodec.
+    """
+    with Path(path).open(mode='rb') as f:
+        magic = f.read(len(_CANONICAL_MAGIC))
+    if magic == _CANONICAL_MAGIC:
+        return CanonicalCodec.load(path)
+    return PrefixCodec.load(path)
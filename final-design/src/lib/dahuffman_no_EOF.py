@@ -27,10 +27,10 @@ class HuffmanCodec(dahuffman.HuffmanCodec):
         super().__init__(code_table, concat=concat, check=check, eof=eof)
 
     @classmethod
-    def from_frequencies(cls, frequencies, concat=None):
+    def from_frequencies(cls, frequencies, concat=None, canonical=False, method='heap', max_length=None):
         # Set EOF symbol to be the first symbol in `frequencies`, so that `dahuffman` will not add a new EOF symbol while building a Huffman tree. 
         eof = next(iter(frequencies.keys()))
-        return super().from_frequencies(frequencies, concat, eof=eof)
+        return super().from_frequencies(frequencies, concat, eof=eof, canonical=canonical, method=method, max_length=max_length)
 
     def decode(self, data, concat=None):
         # Temporarily set EOF symbol to `None`, so that `dahuffman` will decode till the end of the `data`. 
@@ -42,3 +42,23 @@ class HuffmanCodec(dahuffman.HuffmanCodec):
         # Restore the EOF symbol, otherwise calling encode() again will fail.
         self._eof = eof
         return decoded
+
+    def decode_table(self, data, concat=None, bits=12, count=None):
+        # Same as decode(), decode till the end of the `data` (or `count` symbols) with lookup tables.
+        eof = self._eof
+        self._eof = None
+
+        decoded = super().decode_table(data, concat=concat, bits=bits, count=count)
+
+        self._eof = eof
+        return decoded
+
+    def decode_table_stream(self, chunks, bits=12, count=None):
+        # Same as decode_table(), the decoder is taken without EOF symbol before the generator runs.
+        eof = self._eof
+        self._eof = None
+
+        decoder = self.get_table_decoder(bits)
+
+        self._eof = eof
+        return decoder.decode_stream(chunks, count=count)
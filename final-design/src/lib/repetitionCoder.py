@@ -9,23 +9,41 @@ Header  |LEN  : uint8, code length n, must be odd number and 2 < n < 10
 Payload |codeword sequence : many uint
 End |pad : some bits as 0
 
+Version 2 header (used when the source length does not fit in uint32, or on request):
+
+Header  |magic : uint8, 0x82 (high bit marks a versioned header, low bits are the version)
+        |LEN  : uint8, code length n
+        |source length : uint64, number of symbols in source divided by 8
+
+The first byte of a version 1 header is always 3..9, so both versions are told apart by it.
+
 Note: This program is intended for use in course, Principle of Information and Coding Theory.
 
 """
 
 import os
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 # import bitstring
 
 # Non-standard library
 import numpy as np
+import byteChannel
+
+HEADER_V1_SIZE = 5
+HEADER_V2_SIZE = 10
+HEADER_V2_MAGIC = 0x82
+NOISE_MODES = ('philox', 'sparse')
+
+bit_counts = np.uint8(bytearray(map(int.bit_count, range(256))))
 
 __author__ = "Zhang, Pengyang; Chen, Jin; "
 __email__ = "miracle@stu2022.jnu.edu.cn"
 __version__ = "20241212.2220"
 
 
-def main(command, *, LEN=None, INPUT=None, OUTPUT=None, verbose=False):
+def main(command, *, LEN=None, INPUT=None, OUTPUT=None, verbose=False, header=None, chunk=1 << 20, workers=1,
+         span=(0, None), p=0., seed=0, mode='philox', clean=0):
     INPUT = path_split(INPUT)
     OUTPUT = path_split(OUTPUT)
 
@@ -34,7 +52,7 @@ def main(command, *, LEN=None, INPUT=None, OUTPUT=None, verbose=False):
         for INPUT, OUTPUT in zip(INPUT, OUTPUT):
             if verbose:
                 print('Encoding %s (repeats=%d) ...' % (os.path.basename(INPUT), LEN))
-            (source_len, encoded_len) = encode(LEN, INPUT, OUTPUT)
+            (source_len, encoded_len) = encode(LEN, INPUT, OUTPUT, version=header, chunk=chunk, workers=workers)
             if verbose:
                 print(f'\t Source len: {source_len} B')
                 print(f'\tEncoded len: {encoded_len} B')
@@ -44,11 +62,23 @@ def main(command, *, LEN=None, INPUT=None, OUTPUT=None, verbose=False):
         for INPUT, OUTPUT in zip(INPUT, OUTPUT):
             if verbose:
                 print('Decoding %s ...' % os.path.basename(INPUT))
-            (encoded_len, decoded_len) = decode(INPUT, OUTPUT)
+            (encoded_len, decoded_len) = decode(INPUT, OUTPUT, chunk=chunk, workers=workers, start=span[0], stop=span[1])
             if verbose:
                 print(f'\tEncoded len: {encoded_len} B')
                 print(f'\tDecoded len: {decoded_len} B')
 
+    elif command == 'simulate':
+        for INPUT, OUTPUT in zip(INPUT, OUTPUT):
+            if verbose:
+                print('Simulating %s (repeats=%d, p=%g) ...' % (os.path.basename(INPUT), LEN, p))
+            (source_len, channel_errors, decoded_errors) = simulate(LEN, INPUT, OUTPUT, p, seed=seed, mode=mode,
+                                                                    clean=clean, chunk=chunk)
+            if verbose:
+                channel_bits = max(source_len - clean, 0) * LEN * 8
+                print(f'\t Source len: {source_len} B')
+                print(f'\tChannel error rate: {channel_errors / channel_bits if channel_bits else np.nan:.6g}')
+                print(f'\tDecoded error rate: {decoded_errors / (source_len * 8) if source_len else np.nan:.6g}')
+
 
 
 def path_split(path):
@@ -56,16 +86,22 @@ def path_split(path):
 
 
 # 编码函数
-def encode(len_code, input_path, output_path):
+def encode(len_code, input_path, output_path, method='table', chunk=1 << 20, version=None, workers=1):
     """
     Encodes the input file using repetition code of length len_code.
 
     len_code: int, repetition code length (must be an odd number and 2 < len_code < 10)
     input_path: str, path to the input file
     output_path: str, path to the output file
+    method: str, 'table' (expansion table lookup) or 'unpack' (bit unpacking)
+    chunk: int, number of source bytes encoded at a time
+    version: int, header version (1 or 2), None for 1 unless the source is 4 GB or larger
+    workers: int, number of processes coding aligned ranges concurrently, 0 or None for all cores
     """
     if len_code <= 2 or len_code >= 10 or len_code % 2 == 0:
         raise ValueError("Code length must be an odd number and 2 < len_code < 10.")
+    if method not in ('table', 'unpack'):
+        raise ValueError("Unknown encode method: %s." % method)
 
     # # Create a BitStream to represent the encoded data
     # stream = bitstring.ConstBitStream(filename=input_path)
@@ -77,33 +113,143 @@ def encode(len_code, input_path, output_path):
     #
     #     encoded.tofile(f)
 
-    # Read the input file as binary
-    source = np.fromfile(input_path, dtype=np.uint8)
+    source_len = os.path.getsize(input_path)
+    header = make_header(len_code, source_len, version)
+
+    # 每个信源字节恰好对应 len_code 个输出字节，先按最终大小建好输出文件，各区间写入各自的位置
+    with open(output_path, 'wb') as output_file:
+        output_file.write(header)
+        output_file.truncate(len(header) + source_len * len_code)
+    run_ranges(encode_range, 0, source_len, workers,
+               len_code, input_path, output_path, len(header), method, chunk)
+    encoded_len = source_len * len_code
+
+    return (source_len, encoded_len)  # 返回源数据的长度和编码后的数据长度
+
+
+def encode_range(start, stop, len_code, input_path, output_path, header_size, method='table', chunk=1 << 20):
+    """
+    编码信源字节 [start, stop)，逐块读取并写入输出文件中对应的位置，内存只与 chunk 有关。
+
+    start, stop: int, source byte range
+    header_size: int, header size of the (preallocated) output file
+    """
+    table = encode_table(len_code)
+    with open(input_path, 'rb') as input_file, open(output_path, 'r+b') as output_file:
+        input_file.seek(start)
+        output_file.seek(header_size + start * len_code)
+        for begin in range(start, stop, chunk):
+            source = np.frombuffer(input_file.read(min(chunk, stop - begin)), dtype=np.uint8)
+            if method == 'table':
+                data = encode_chunk(source, table)
+            else:
+                data = encode_unpack(source, len_code)
+            data.tofile(output_file)
+
+
+def run_ranges(func, start, stop, workers, *args):
+    """
+    将 [start, stop) 均分为 workers 个区间，依次或用进程池并行调用 func(begin, end, *args)。
+    区间以信源字节为单位，因此总是与码字对齐，各进程互不重叠地写同一个输出文件。
+
+    workers: int, number of processes, 0 or None for all cores
+    """
+    length = stop - start
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, length))
+    bounds = [start + length * i // workers for i in range(workers + 1)]
+    if workers == 1:
+        func(start, stop, *args)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(func, begin, end, *args) for begin, end in zip(bounds[:-1], bounds[1:])]
+        for future in futures:
+            future.result()
+
+
+def make_header(len_code, msg_length, version=None) -> bytes:
+    """
+    生成文件头。version 为 None 时，长度放得下 uint32 则用版本1（5字节，兼容旧文件），否则用版本2（10字节）。
+
+    len_code: int, repetition code length
+    msg_length: int, source length in bytes
+    version: int, 1, 2 or None
+    """
+    if version is None:
+        version = 1 if msg_length < 1 << 32 else 2
+    if version == 1:
+        if msg_length >= 1 << 32:
+            raise ValueError("Source of %d bytes needs a version 2 header." % msg_length)
+        return len_code.to_bytes(1, 'big') + msg_length.to_bytes(4, 'big')
+    if version == 2:
+        return bytes([HEADER_V2_MAGIC, len_code]) + msg_length.to_bytes(8, 'big')
+    raise ValueError("Unknown header version: %s." % version)
+
+
+def parse_header(head) -> tuple:
+    """
+    解析文件头，返回 (len_code, msg_length, header_size)。
+
+    head: bytes, at least the first HEADER_V2_SIZE bytes of the file (or the whole file if shorter)
+    """
+    head = bytes(head)
+    if len(head) and head[0] == HEADER_V2_MAGIC:
+        if len(head) < HEADER_V2_SIZE:
+            raise TypeError("Haven't a Header.")
+        return (head[1], int.from_bytes(head[2:10], 'big'), HEADER_V2_SIZE)
+    if len(head) < HEADER_V1_SIZE:
+        raise TypeError("Haven't a Header.")
+    return (head[0], int.from_bytes(head[1:5], 'big'), HEADER_V1_SIZE)
+
+
+def encode_table(len_code) -> np.ndarray:
+    """
+    预先计算256个字节的重复码字，第 b 行即字节 b 编码后的 len_code 个字节。
+
+    len_code: int, repetition code length
+    """
+    symbols = np.arange(256, dtype=np.uint8)
+    bits = np.repeat(np.unpackbits(symbols[:, None], axis=1), len_code, axis=1)
+    return np.packbits(bits, axis=1)
+
+
+def encode_chunk(source, table) -> np.ndarray:
+    """
+    查表编码：每个信源字节恰好对应 len_code 个输出字节，一次花式索引完成，
+    临时内存约为每信源字节 len_code 字节。
+
+    source: numpy.ndarray, uint8 source bytes
+    table: numpy.ndarray, (256, len_code) table from encode_table()
+    """
+    return table[source].ravel()
+
+
+def encode_unpack(source, len_code) -> np.ndarray:
+    """
+    逐比特展开后重复再打包的编码方法（原实现），临时内存约为每信源字节 8·len_code 字节。
 
-    # Encode each bit using repetition code
+    source: numpy.ndarray, uint8 source bytes
+    len_code: int, repetition code length
+    """
     data = np.unpackbits(source).astype(np.uint8)
     data = np.repeat(data, len_code)
     if data.size % 8:
         data = np.pad(data, (0, 8 - (data.size % 8)))
     data.resize((data.size // 8, 8))
-    data = np.packbits(data, axis=1)
-
-    # Write the encoded data to the output file
-    with open(output_path, 'wb') as output_file:
-        output_file.write(len_code.to_bytes(1, 'big'))
-        output_file.write(len(source).to_bytes(4, 'big'))
-        data.tofile(output_file)
-
-    return (len(source), len(data)-5)  # 返回源数据的长度和编码后的数据长度
+    return np.packbits(data, axis=1).ravel()
 
 
 # 解码函数
-def decode(input_path, output_path):
+def decode(input_path, output_path, method='popcount', chunk=1 << 20, workers=1, start=0, stop=None):
     """
     Decodes the repetition code from the input file.
 
     input_path: str, path to the encoded input file
     output_path: str, path to the decoded output file
+    method: str, 'popcount' (packed byte counting), 'lut' (2**24 table, len_code == 3 only) or 'unpack'
+    chunk: int, number of source bytes decoded at a time
+    workers: int, number of processes decoding aligned ranges concurrently, 0 or None for all cores
+    start, stop: int, decode only source bytes [start, stop), stop None for the end of the message
     """
     # # Read the encoded file as a BitStream
     # encoded_stream = bitstring.ConstBitStream(filename=input_path)
@@ -119,29 +265,231 @@ def decode(input_path, output_path):
     #         decoded_stream.append(one if encoded_stream.read(len_code).count(1) > threshord else 1)
     #
     #     decoded_stream.tofile(f)
-    try:
-        source = np.fromfile(input_path, dtype=np.uint8)
-    except ValueError:
+    encoder_length = os.path.getsize(input_path)
+    if encoder_length == 0:
         raise ValueError("Decoding a File Empty.")
-    len_code = int(source[0])
-    encoder_length = len(source)
-    if encoder_length < 5:
-        raise TypeError("Haven't a Header.")
-    msg_length = int.from_bytes(source[1:5].tobytes(), 'big')
+    with open(input_path, 'rb') as input_file:
+        len_code, msg_length, header_size = parse_header(input_file.read(HEADER_V2_SIZE))
     # print(len_code, msg_length)
-    if encoder_length - 5 < msg_length * len_code:
+    if encoder_length - header_size < msg_length * len_code:
         raise TypeError("Payload doesn't follow the rules of Header.")
-    data = np.unpackbits(source[5:]).astype(np.uint8)
-    code_length = msg_length * 8 * len_code
-    threshord = len_code // 2
-    data = data[:code_length]
+    if method not in ('popcount', 'lut', 'unpack'):
+        raise ValueError("Unknown decode method: %s." % method)
+    stop = msg_length if stop is None else stop
+    check_range(start, stop, msg_length)
+
+    with open(output_path, 'wb') as output_file:
+        output_file.truncate(stop - start)
+    run_ranges(decode_range, start, stop, workers,
+               len_code, input_path, output_path, header_size, method, chunk, start)
+
+    encoded_len = encoder_length - header_size if (start, stop) == (0, msg_length) else (stop - start) * len_code
+    return (encoded_len, stop - start)  # 返回（所读取的）编码数据的长度和解码后的数据长度
+
+
+def simulate(len_code, input_path, output_path, p, seed=0, mode='philox', clean=0, chunk=1 << 20, version=None):
+    """
+    融合的仿真内核：逐块完成 重复编码 -> BSC 噪声异或 -> 多数判决译码，只写出译码结果并统计错误比特数，
+    n 倍扩展的编码流和噪声只在块内存在，不写入磁盘。
+
+    'philox' 模式下噪声按编码文件中的字节偏移由 byteChannel.philox_noise 生成，结果与
+    encode -> byteChannel philox:SEED:p (pad 为文件头和 clean 部分) -> decode 的文件流程逐比特相同。
+
+    len_code: int, repetition code length
+    input_path: str, path to the source (channel encoder input) file
+    output_path: str, path to the decoded output file
+    p: float, bit error probability of the BSC
+    seed: int, key of the philox noise, or seed of the sparse noise generator
+    mode: str, 'philox' (counter-based, reproducible by offset) or 'sparse' (geometric flip positions)
+    clean: int, number of leading source bytes transmitted without noise (e.g. the source coder header)
+    chunk: int, number of source bytes processed at a time
+    version: int, header version of the equivalent encoded file (affects philox offsets only)
+
+    Returns: (source length in bytes, channel bit errors, decoded bit errors)
+    """
+    if len_code <= 2 or len_code >= 10 or len_code % 2 == 0:
+        raise ValueError("Code length must be an odd number and 2 < len_code < 10.")
+    if mode not in NOISE_MODES:
+        raise ValueError("Unknown noise mode: %s." % mode)
+
+    source_len = os.path.getsize(input_path)
+    header_size = len(make_header(len_code, source_len, version))
+    table = encode_table(len_code)
+    rng = np.random.default_rng(seed)
+    channel_errors = decoded_errors = 0
+
+    with open(input_path, 'rb') as input_file, open(output_path, 'wb') as output_file:
+        for begin in range(0, source_len, chunk):
+            source = np.frombuffer(input_file.read(min(chunk, source_len - begin)), dtype=np.uint8)
+            coded = encode_chunk(source, table)
+            skip = min(max(clean - begin, 0), len(source)) * len_code
+            if mode == 'philox':
+                noise = byteChannel.philox_noise(seed, p, header_size + begin * len_code + skip, len(coded) - skip)
+            else:
+                noise = byteChannel.sparse_error_channel(np.zeros(len(coded) - skip, dtype=np.uint8), p, rng=rng)
+            coded[skip:] ^= noise
+            decoded = decode_chunk(coded, len_code)
+            decoded.tofile(output_file)
+            channel_errors += int(bit_counts.take(noise).sum(dtype=np.int64))
+            decoded_errors += int(bit_counts.take(decoded ^ source).sum(dtype=np.int64))
+
+    return (source_len, channel_errors, decoded_errors)
+
+
+def decode_range(start, stop, len_code, input_path, output_path, header_size, method='popcount', chunk=1 << 20,
+                 origin=0):
+    """
+    解码信源字节 [start, stop)：直接定位到对应码字，逐块读取并写入输出文件中对应的位置，内存只与 chunk 有关。
+
+    start, stop: int, source byte range
+    header_size: int, header size of the encoded input file
+    origin: int, source byte stored at the beginning of the output file
+    """
+    with open(input_path, 'rb') as input_file, open(output_path, 'r+b') as output_file:
+        input_file.seek(header_size + start * len_code)
+        output_file.seek(start - origin)
+        for begin in range(start, stop, chunk):
+            payload = np.frombuffer(input_file.read(min(chunk, stop - begin) * len_code), dtype=np.uint8)
+            decode_chunk(payload, len_code, method).tofile(output_file)
+
+
+def decode_slice(input_path, start, stop=None, method='popcount') -> np.ndarray:
+    """
+    随机访问解码：只读取文件头和信源字节 [start, stop) 对应的码字，返回这一段解码结果，不读取文件的其余部分。
+
+    input_path: str, path to the encoded input file
+    start, stop: int, source byte range, stop None for the end of the message
+    method: str, 'popcount', 'lut' (len_code == 3 only) or 'unpack'
+    """
+    with open(input_path, 'rb') as input_file:
+        len_code, msg_length, header_size = parse_header(input_file.read(HEADER_V2_SIZE))
+        stop = msg_length if stop is None else stop
+        check_range(start, stop, msg_length)
+        input_file.seek(header_size + start * len_code)
+        payload = np.frombuffer(input_file.read((stop - start) * len_code), dtype=np.uint8)
+    if len(payload) < (stop - start) * len_code:
+        raise TypeError("Payload doesn't follow the rules of Header.")
+    return decode_chunk(payload, len_code, method)
+
+
+def check_range(start, stop, msg_length):
+    """
+    检查信源字节区间 [start, stop) 位于信息之内。
+    """
+    if not 0 <= start <= stop <= msg_length:
+        raise ValueError("Range [%d, %d) is outside the message of %d bytes." % (start, stop, msg_length))
+
+
+def parse_range(text) -> tuple:
+    """
+    解析命令行区间 'a:b'，a 省略为 0，b 省略为 None（到信息末尾）。
+    """
+    start, _, stop = text.partition(':')
+    return (int(start) if start.strip() else 0, int(stop) if stop.strip() else None)
+
+
+def decode_unpack(payload, len_code) -> np.ndarray:
+    """
+    逐比特展开后按行求和的多数判决（原实现），临时内存约为每信源字节 8·len_code 字节。
+
+    payload: numpy.ndarray, uint8 codewords, len_code bytes per source byte
+    len_code: int, repetition code length
+    """
+    msg_length = len(payload) // len_code
+    data = np.unpackbits(payload).astype(np.uint8)
     data.resize((msg_length * 8, len_code))
-    data = (data.sum(axis=1) > threshord).view(np.uint8)
+    data = (data.sum(axis=1) > len_code // 2).view(np.uint8)
     data.resize((msg_length, 8))
-    data = np.packbits(data, axis=1)
-    data.tofile(output_path)
+    return np.packbits(data, axis=1).ravel()
 
-    return (len(source)-5, len(data))  # 返回编码数据的长度和解码后的数据长度
+
+def count_tables(len_code) -> np.ndarray:
+    """
+    每个信源字节对应 len_code 个对齐的编码字节。第 m 个编码字节取值 v 时，
+    count_tables(len_code)[m][v] 是一个64位整数，其第 j 个字节为 v 中属于信源第 j 比特（高位在前）的1的个数。
+    len_code 个查表结果相加，即得到8个信源比特各自的1的个数（最多9，不会进位）。
+
+    len_code: int, repetition code length
+    """
+    bits = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.uint64)
+    tables = np.zeros((len_code, 256), dtype='<u8')
+    for m in range(len_code):
+        for t in range(8):
+            j = (8 * m + t) // len_code
+            tables[m] += bits[:, t] << np.uint64(8 * j)
+    return tables
+
+
+_pair_tables = {}
+
+
+def pair_count_tables(len_code) -> list:
+    """
+    将相邻两个编码字节合并为16位索引的计数表（每张 65536 项），查表次数减半；len_code 为奇数，最后一个字节单独查表。
+    """
+    if len_code not in _pair_tables:
+        tables = count_tables(len_code)
+        pairs = [(tables[m][:, None] + tables[m + 1][None, :]).ravel() for m in range(0, len_code - 1, 2)]
+        _pair_tables[len_code] = pairs + [tables[-1]]
+    return _pair_tables[len_code]
+
+
+_lut3 = None
+
+
+def majority_lut3() -> np.ndarray:
+    """
+    len_code == 3 时的 2**24 项查找表（16 MB），以3个编码字节（大端拼接）为索引直接得到信源字节，首次调用时构建。
+    """
+    global _lut3
+    if _lut3 is None:
+        index = np.arange(1 << 24, dtype='>u4').view(np.uint8).reshape(-1, 4)[:, 1:]
+        _lut3 = decode_chunk(index.ravel(), 3)
+    return _lut3
+
+
+def decode_chunk(payload, len_code, method='popcount') -> np.ndarray:
+    """
+    对一段对齐的编码数据做多数判决，直接在打包的字节上计数，不展开比特，临时内存约为每信源字节 17 字节。
+
+    每两个编码字节以16位索引查一次计数表并累加，得到8个信源比特的计数（每字节一个）；
+    再给每个计数加上偏置，使计数超过门限时该字节最高位为1，最后用一次乘法把8个最高位收集为1个字节。
+
+    payload: numpy.ndarray, uint8 codewords, len_code bytes per source byte
+    len_code: int, repetition code length
+    method: str, 'popcount', 'lut' (len_code == 3 only) or 'unpack'
+    """
+    if method == 'unpack':
+        return decode_unpack(payload, len_code)
+    payload = np.ascontiguousarray(payload, dtype=np.uint8)
+    msg_length = len(payload) // len_code
+    if msg_length == 0:
+        return np.zeros(0, dtype=np.uint8)
+
+    def pair_view(m):
+        # 每个信源字节的第 m、m+1 个编码字节组成的大端16位整数，不复制数据（允许非对齐）
+        return np.ndarray(shape=(msg_length,), dtype='>u2', buffer=payload, offset=m, strides=(len_code,))
+
+    if method == 'lut':
+        if len_code != 3:
+            raise ValueError("Lookup table decoder only supports len_code == 3.")
+        index = pair_view(0).astype(np.uint32)
+        index <<= 8
+        index |= payload[2::3]
+        return majority_lut3()[index]
+    if method != 'popcount':
+        raise ValueError("Unknown decode method: %s." % method)
+
+    tables = pair_count_tables(len_code)
+    counts = tables[-1].take(payload[len_code - 1::len_code])
+    for k, m in enumerate(range(0, len_code - 1, 2)):
+        counts += tables[k].take(pair_view(m))
+    counts += np.uint64(0x0101010101010101 * (127 - len_code // 2))
+    counts >>= np.uint64(7)
+    counts &= np.uint64(0x0101010101010101)
+    counts *= np.uint64(0x8040201008040201)
+    counts >>= np.uint64(56)
+    return counts.astype(np.uint8)
 
 
 # 测试函数
@@ -151,6 +499,12 @@ def test_flow():
     unittest.main(repetitionCoderTest, argv=['repetitionCoderTest'], exit=True)
 
 
+def bench_flow():
+    import repetitionCoderTest
+    repetitionCoderTest.benchmark()
+    exit(0)
+
+
 def parse_cmd_args():
     parser = argparse.ArgumentParser(description="Lossless source coder for encoding and decoding.")
     subparsers = parser.add_subparsers(dest='command', help='Sub-command to run (encode or decode)')
@@ -160,25 +514,55 @@ def parse_cmd_args():
     parser_encode.add_argument('LEN', type=int, nargs='?', help='int, code length n, must be odd number and 2 < n < 10')
     parser_encode.add_argument('INPUT', nargs='?', help='Path to the encoder input file')
     parser_encode.add_argument('OUTPUT', nargs='?', help='Path to the encoder output file')
+    parser_encode.add_argument('--header', type=int, choices=(1, 2), default=None,
+                               help='Header version, 2 stores a 64-bit source length (default: 1 unless source >= 4 GB)')
 
     # Decode sub-command
     parser_decode = subparsers.add_parser('decode', help='Decode an encoded file')
     parser_decode.add_argument('INPUT', nargs='?', help='Path to the decoder input file')
     parser_decode.add_argument('OUTPUT', nargs='?', help='Path to the decoder output file')
-
+    parser_decode.add_argument('--range', type=parse_range, default=(0, None), metavar='A:B', dest='span',
+                               help='Decode only source bytes [A, B), seeking straight to their codewords')
+
+    # Simulate sub-command
+    parser_simulate = subparsers.add_parser('simulate', help='Encode, transmit through a BSC and decode in memory')
+    parser_simulate.add_argument('LEN', type=int, nargs='?', help='int, code length n, must be odd number and 2 < n < 10')
+    parser_simulate.add_argument('INPUT', nargs='?', help='Path to the source file')
+    parser_simulate.add_argument('p', type=float, nargs='?', help='Bit error probability of the BSC')
+    parser_simulate.add_argument('OUTPUT', nargs='?', help='Path to the decoded output file')
+    parser_simulate.add_argument('--seed', type=int, default=0, help='Noise key or seed (default: 0)')
+    parser_simulate.add_argument('-m', '--mode', choices=NOISE_MODES, default='philox',
+                                 help='Noise mode, philox matches byteChannel philox:SEED:p on the encoded file')
+    parser_simulate.add_argument('--clean', type=int, default=0,
+                                 help='Number of leading source bytes transmitted without noise (e.g. source coder header)')
+
+    parser.add_argument('--chunk', type=int, default=1 << 20, help='Number of source bytes coded at a time')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='Number of processes coding aligned ranges concurrently (0 for all cores)')
     parser.add_argument('-t', '--test', action='store_true', help='Check test flow and state')
+    parser.add_argument('-b', '--bench', action='store_true', help='Compare throughput of coding methods')
     parser.add_argument('-v', '--verbose', action='store_true', help='Show message')
 
     args = parser.parse_args()
     if args.test:
         return test_flow()
+    if args.bench:
+        return bench_flow()
 
     return dict(
         command=args.command,
-        LEN=args.LEN,
+        LEN=getattr(args, 'LEN', None),
         INPUT=args.INPUT,
         OUTPUT=args.OUTPUT,
-        verbose=args.verbose
+        verbose=args.verbose,
+        header=getattr(args, 'header', None),
+        chunk=args.chunk,
+        workers=args.workers,
+        span=getattr(args, 'span', (0, None)),
+        p=getattr(args, 'p', 0.),
+        seed=getattr(args, 'seed', 0),
+        mode=getattr(args, 'mode', 'philox'),
+        clean=getattr(args, 'clean', 0)
     )
 
 
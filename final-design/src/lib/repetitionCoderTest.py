@@ -1,6 +1,9 @@
 import os
+import time
 import unittest
 import bitstring
+import numpy as np
+import repetitionCoder
 from repetitionCoder import encode, decode
 import calcErrorRate
 
@@ -163,6 +166,167 @@ class TestRepetitionCoder(unittest.TestCase):
         print()
 
 
+    def test_encode_table_matches_unpack(self):
+        """
+        测试查表编码与逐比特展开编码的输出完全相同。
+        """
+        test_number = 7
+        test_description = "Table encoder matches unpack encoder."
+        print(f"Test {test_number}: {test_description}")
+
+        source = np.random.randint(0, 256, size=10000, dtype=np.uint8)
+        source.tofile(self.input_path)
+        for len_code in (3, 5, 7, 9):
+            self.assertEqual(encode(len_code, self.input_path, self.encoded_path, method='table'),
+                             (len(source), len(source) * len_code))
+            with open(self.encoded_path, 'rb') as f:
+                table_encoded = f.read()
+            encode(len_code, self.input_path, self.encoded_path, method='unpack')
+            with open(self.encoded_path, 'rb') as f:
+                self.assertEqual(table_encoded, f.read())
+        print(f"Test {test_number} passed: {test_description}")
+        print()
+
+
+    def test_decode_methods_match_unpack(self):
+        """
+        测试打包计数和查表多数判决与逐比特展开的解码结果完全相同（含错误比特）。
+        """
+        test_number = 8
+        test_description = "Packed majority decoders match unpack decoder."
+        print(f"Test {test_number}: {test_description}")
+
+        source = np.random.randint(0, 256, size=10000, dtype=np.uint8)
+        for len_code in (3, 5, 7, 9):
+            payload = repetitionCoder.encode_chunk(source, repetitionCoder.encode_table(len_code))
+            noisy = payload ^ np.packbits(np.random.uniform(size=len(payload) * 8) < 0.2)
+            expected = repetitionCoder.decode_unpack(noisy, len_code)
+            methods = ('popcount', 'lut') if len_code == 3 else ('popcount',)
+            for method in methods:
+                np.testing.assert_array_equal(repetitionCoder.decode_chunk(noisy, len_code, method), expected)
+            np.testing.assert_array_equal(repetitionCoder.decode_chunk(payload, len_code), source)
+        print(f"Test {test_number} passed: {test_description}")
+        print()
+
+
+    def test_header_v2_streaming(self):
+        """
+        测试版本2文件头（64位长度）与分块流式编解码：结果与整块处理一致，旧版本1文件仍可解码。
+        """
+        test_number = 9
+        test_description = "Version 2 header and chunked streaming coding."
+        print(f"Test {test_number}: {test_description}")
+
+        source = np.random.randint(0, 256, size=10000, dtype=np.uint8)
+        source.tofile(self.input_path)
+        for version in (1, 2):
+            encode(5, self.input_path, self.encoded_path, chunk=1000, version=version)
+            with open(self.encoded_path, 'rb') as f:
+                encoded = f.read()
+            header = repetitionCoder.make_header(5, len(source), version)
+            self.assertEqual(encoded[:len(header)], header)
+            self.assertEqual(encoded[len(header):],
+                             repetitionCoder.encode_chunk(source, repetitionCoder.encode_table(5)).tobytes())
+            for chunk in (7, 1 << 20):
+                self.assertEqual(decode(self.encoded_path, self.decoded_path, chunk=chunk),
+                                 (len(source) * 5, len(source)))
+                np.testing.assert_array_equal(np.fromfile(self.decoded_path, dtype=np.uint8), source)
+
+        # 超过 uint32 的长度只能用版本2表示
+        self.assertEqual(repetitionCoder.parse_header(repetitionCoder.make_header(3, 1 << 33)),
+                         (3, 1 << 33, repetitionCoder.HEADER_V2_SIZE))
+        with self.assertRaises(ValueError):
+            repetitionCoder.make_header(3, 1 << 33, version=1)
+        print(f"Test {test_number} passed: {test_description}")
+        print()
+
+
+    def test_parallel_ranges(self):
+        """
+        测试多进程按对齐区间编解码的输出与单进程完全相同。
+        """
+        test_number = 10
+        test_description = "Multi-process coding matches single process."
+        print(f"Test {test_number}: {test_description}")
+
+        source = np.random.randint(0, 256, size=10001, dtype=np.uint8)
+        source.tofile(self.input_path)
+        encode(7, self.input_path, self.encoded_path)
+        with open(self.encoded_path, 'rb') as f:
+            expected = f.read()
+        encode(7, self.input_path, self.encoded_path, chunk=1000, workers=3)
+        with open(self.encoded_path, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(decode(self.encoded_path, self.decoded_path, chunk=1000, workers=3),
+                         (len(source) * 7, len(source)))
+        np.testing.assert_array_equal(np.fromfile(self.decoded_path, dtype=np.uint8), source)
+        print(f"Test {test_number} passed: {test_description}")
+        print()
+
+
+    def test_decode_range(self):
+        """
+        测试随机访问解码：任意区间 [a, b) 的解码结果等于完整解码结果的对应片段。
+        """
+        test_number = 11
+        test_description = "Random-access decoding of a byte range."
+        print(f"Test {test_number}: {test_description}")
+
+        source = np.random.randint(0, 256, size=10000, dtype=np.uint8)
+        source.tofile(self.input_path)
+        encode(9, self.input_path, self.encoded_path, version=2)
+        for start, stop in ((0, 10000), (1234, 5678), (9999, 10000), (42, 42)):
+            np.testing.assert_array_equal(repetitionCoder.decode_slice(self.encoded_path, start, stop),
+                                          source[start:stop])
+            self.assertEqual(decode(self.encoded_path, self.decoded_path, chunk=1000, workers=2,
+                                    start=start, stop=stop), ((stop - start) * 9, stop - start))
+            np.testing.assert_array_equal(np.fromfile(self.decoded_path, dtype=np.uint8), source[start:stop])
+        self.assertEqual(repetitionCoder.parse_range('100:'), (100, None))
+        with self.assertRaises(ValueError):
+            repetitionCoder.decode_slice(self.encoded_path, 5000, 10001)
+        print(f"Test {test_number} passed: {test_description}")
+        print()
+
+
+    def test_simulate_matches_file_flow(self):
+        """
+        测试融合仿真内核与 encode -> byteChannel(philox) -> decode 文件流程的译码结果逐比特相同，错误计数正确。
+        """
+        test_number = 12
+        test_description = "Fused simulation kernel matches the file pipeline."
+        print(f"Test {test_number}: {test_description}")
+        import byteChannel
+
+        channel_path = "test_channel.bin"
+        source = np.random.randint(0, 256, size=10000, dtype=np.uint8)
+        source.tofile(self.input_path)
+        try:
+            # p=0.03 的 philox 阈值对浮点误差敏感，检查等价性不依赖于 p 的取值
+            for len_code, clean, p in ((3, 0, 0.1), (5, 100, 0.1), (3, 0, 0.03), (5, 100, 0.03)):
+                encode(len_code, self.input_path, self.encoded_path)
+                byteChannel.main(self.encoded_path, channel_path, 'philox:7:%g' % p,
+                                 pad=(repetitionCoder.HEADER_V1_SIZE + len_code * clean, 0, 0, 0))
+                decode(channel_path, self.decoded_path)
+                expected = np.fromfile(self.decoded_path, dtype=np.uint8)
+                channel_errors = np.unpackbits(np.fromfile(channel_path, dtype=np.uint8)
+                                               ^ np.fromfile(self.encoded_path, dtype=np.uint8)).sum()
+
+                result = repetitionCoder.simulate(len_code, self.input_path, self.decoded_path, p, seed=7,
+                                                  clean=clean, chunk=999)
+                np.testing.assert_array_equal(np.fromfile(self.decoded_path, dtype=np.uint8), expected)
+                self.assertEqual(result, (len(source), channel_errors, np.unpackbits(expected ^ source).sum()))
+                self.assertTrue(np.all(expected[:clean] == source[:clean]))
+
+            # 稀疏噪声模式：信道错误率接近 p
+            _, channel_errors, _ = repetitionCoder.simulate(3, self.input_path, self.decoded_path, 0.1, mode='sparse')
+            self.assertAlmostEqual(channel_errors / (len(source) * 3 * 8), 0.1, delta=0.005)
+        finally:
+            if os.path.exists(channel_path):
+                os.remove(channel_path)
+        print(f"Test {test_number} passed: {test_description}")
+        print()
+
+
 class TestCalculateErrorRate(unittest.TestCase):
     def setUp(self):
         """
@@ -328,5 +492,63 @@ class TestCalculateErrorRate(unittest.TestCase):
         print()
 
 
+    def test_binomial_simulate(self):
+        """
+        测试二项分布捷径仿真：信道和译码误码率与理论值一致（稠密和稀疏两种抽样），clean 部分不变。
+        """
+        print("Test 7: Binomial-shortcut simulation.")
+        source = np.random.randint(0, 256, size=100000, dtype=np.uint8)
+        source.tofile(self.source_path)
+        for n, p in ((3, 0.2), (5, 0.004)):
+            length, channel_errors, decoded_errors = calcErrorRate.binomialSimulate(
+                n, p, self.source_path, self.decode_path, seed=1, clean=10, chunk=30000)
+            decoded = np.fromfile(self.decode_path, dtype=np.uint8)
+            bits = (length - 10) * 8
+            self.assertEqual(length, len(source))
+            self.assertEqual(decoded_errors, np.unpackbits(decoded ^ source).sum())
+            np.testing.assert_array_equal(decoded[:10], source[:10])
+            self.assertLess(abs(channel_errors - bits * n * p), 5 * np.sqrt(bits * n * p))
+            theory = calcErrorRate.theoryCalcError(n, p)
+            self.assertLess(abs(decoded_errors - bits * theory), 5 * np.sqrt(bits * theory) + 1)
+        self.assertEqual(calcErrorRate.binomialSimulate(3, 0., self.source_path, self.decode_path)[1:], (0, 0))
+        print("Test 7 passed: Binomial-shortcut simulation.")
+        print()
+
+
+def benchmark(msg_len=1 << 22, repeat=3):
+    """
+    比较编码方法的吞吐量（信源 MB/s），不含文件读写。
+    """
+    source = np.random.randint(0, 256, size=msg_len, dtype=np.uint8)
+    for len_code in (3, 9):
+        methods = {
+            'unpack': lambda: repetitionCoder.encode_unpack(source, len_code),
+            'table': lambda: repetitionCoder.encode_chunk(source, repetitionCoder.encode_table(len_code)),
+        }
+        for name, run in methods.items():
+            best = np.inf
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - start)
+            print("encode n=%d %-8s %8.1f MB/s" % (len_code, name, msg_len / best / 2**20))
+
+        payload = repetitionCoder.encode_chunk(source, repetitionCoder.encode_table(len_code))
+        methods = {
+            'unpack': lambda: repetitionCoder.decode_unpack(payload, len_code),
+            'popcount': lambda: repetitionCoder.decode_chunk(payload, len_code),
+        }
+        if len_code == 3:
+            repetitionCoder.majority_lut3()
+            methods['lut'] = lambda: repetitionCoder.decode_chunk(payload, len_code, 'lut')
+        for name, run in methods.items():
+            best = np.inf
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - start)
+            print("decode n=%d %-8s %8.1f MB/s" % (len_code, name, msg_len / best / 2**20))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -40,6 +40,7 @@ cmd_calc_theory = r'python lib\calcInfo.py '
 msg_length = 102400
 repeat_length = 3
 repeat_header_size = 5
+noise_seed = 2024
 rs = 1.0
 data_dir = '..\\data'
 case_dir = os.path.join(data_dir, 'case_{:d}')
@@ -119,18 +120,15 @@ for i,case in enumerate(cases):
     else:
         channel_codec_header = 0
         channel_codec_path = source_codec_path
-    channel_codec_length = read_file_size(channel_codec_path) - (channel_codec_header + repeat_length * source_codec_header)
+    channel_codec_pad = channel_codec_header + repeat_length * source_codec_header
 
-    # 噪声
+    # 噪声：由 (noise_seed, p, 字节偏移) 重新生成，不再单独生成噪声文件
     error_rate = case['error_rate']
-    noise_csv_path = os.path.join(case_path, 'BSC.p=%.3f.csv' % error_rate)
-    noise_path = os.path.join(case_path, 'BSC.p=%.3f.len=%d.dat' % (error_rate, channel_codec_length))
-    check_call(cmd_DMS_create + ' {:.3f} {:s}'.format(error_rate, noise_csv_path))
-    check_call(cmd_source + ' "{:s}" "{:s}" {:d} -p ({},0,0,0)'.format(
-        noise_csv_path, noise_path, channel_codec_length, (channel_codec_header + repeat_length * source_codec_header)))
+    noise_spec = 'philox:%d:%.3f' % (noise_seed + i, error_rate)
     # 信道传输
     channel_path = os.path.join(case_path, 'BSC.p0=%.3f.p=%.3f.dat' % (case['prob0'], error_rate))
-    check_call(cmd_channel + ' "{}" "{}" "{}" -O'.format(channel_codec_path, noise_path, channel_path))
+    check_call(cmd_channel + ' "{}" "{}" "{}" -p ({},0,0,0) -O'.format(
+        channel_codec_path, noise_spec, channel_path, channel_codec_pad))
 
     # 信道解码
     if case['channel_codec']: